@@ -2,78 +2,66 @@
 # -*- coding: utf-8 -*-
 """
 Extension Changer main entry point
+
+Only the standard library is imported at module level; Qt and the main
+window are loaded inside :func:`main`. Set ``EXTENSION_CHANGER_STARTUP_REPORT``
+to print startup timings as JSON once the first window is up and exit, which
+is what ``python -m extension_changer.benchmark --stages startup`` measures.
 """
 
-import sys
+import functools
+import json
 import os
-import importlib.resources
-from pathlib import Path
-from PySide6.QtWidgets import QApplication
+import sys
+import time
+
+_STARTED = time.perf_counter()
+
+STARTUP_REPORT_VARIABLE = 'EXTENSION_CHANGER_STARTUP_REPORT'
+
+ICON_NAMES = {
+    'darwin': 'icon.icns',
+    'win32': 'icon.ico',
+}
+
 
-from .extension_changer import ExtensionChanger
+@functools.lru_cache(maxsize=None)
+def find_icon():
+    """Return the path of the application icon for this platform, or ``None``"""
+    resource_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources')
+    icon_path = os.path.join(resource_dir, ICON_NAMES.get(sys.platform, 'icon.png'))
+    return icon_path if os.path.exists(icon_path) else None
 
 
 def main():
     """Main entry point for the application"""
+    # Qt is imported here rather than at module level: process pool workers
+    # started with "spawn" re-import this module and must stay lightweight
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+    from .extension_changer import ExtensionChanger
+    imported = time.perf_counter()
+    
     app = QApplication(sys.argv)
     app.setStyle("Fusion")  # Use Fusion style for a consistent look
     
-    # Get resource paths - multiple approaches to ensure icon is found
-    icon_path = None
-    
-    # Approach 1: Using importlib.resources (Python 3.7+)
-    try:
-        # For Python 3.9+
-        if hasattr(importlib.resources, 'files'):
-            if sys.platform == 'darwin':
-                icon_path = importlib.resources.files('extension_changer.resources').joinpath('icon.icns')
-            elif sys.platform == 'win32':
-                icon_path = importlib.resources.files('extension_changer.resources').joinpath('icon.ico')
-            else:
-                icon_path = importlib.resources.files('extension_changer.resources').joinpath('icon.png')
-        # For Python 3.7-3.8
-        else:
-            if sys.platform == 'darwin':
-                with importlib.resources.path('extension_changer.resources', 'icon.icns') as path:
-                    icon_path = path
-            elif sys.platform == 'win32':
-                with importlib.resources.path('extension_changer.resources', 'icon.ico') as path:
-                    icon_path = path
-            else:
-                with importlib.resources.path('extension_changer.resources', 'icon.png') as path:
-                    icon_path = path
-    except (ModuleNotFoundError, ImportError, FileNotFoundError) as e:
-        print(f"Could not load icon using importlib.resources: {e}")
-    
-    # Approach 2: Check in current package directory
-    if not icon_path or not os.path.exists(str(icon_path)):
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        resource_dir = os.path.join(current_dir, 'resources')
-        
-        if sys.platform == 'darwin' and os.path.exists(os.path.join(resource_dir, 'icon.icns')):
-            icon_path = os.path.join(resource_dir, 'icon.icns')
-        elif sys.platform == 'win32' and os.path.exists(os.path.join(resource_dir, 'icon.ico')):
-            icon_path = os.path.join(resource_dir, 'icon.ico')
-        elif os.path.exists(os.path.join(resource_dir, 'icon.png')):
-            icon_path = os.path.join(resource_dir, 'icon.png')
-        else:
-            # Try any icon format as last resort
-            for icon_name in ['icon.ico', 'icon.png', 'icon.icns']:
-                if os.path.exists(os.path.join(resource_dir, icon_name)):
-                    icon_path = os.path.join(resource_dir, icon_name)
-                    break
-    
-    # Debug info
-    if icon_path:
-        print(f"Using icon: {icon_path}")
-    else:
-        print("No icon found")
-    
-    window = ExtensionChanger(icon_path)
+    window = ExtensionChanger(find_icon())
     window.show()
+    constructed = time.perf_counter()
+    
+    if os.environ.get(STARTUP_REPORT_VARIABLE):
+        def report_startup():
+            # Runs once the event loop has handled the show and first paint
+            print(json.dumps({
+                'import': imported - _STARTED,
+                'window': constructed - _STARTED,
+                'first_window': time.perf_counter() - _STARTED,
+            }), flush=True)
+            app.quit()
+        QTimer.singleShot(0, report_startup)
     
     return app.exec()
 
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer benchmarks
+
+Generates a synthetic folder tree and times the scan, index, plan, rename and
+copy stages for every requested execution backend and worker count::
+
+    python -m extension_changer.benchmark --files 20000 --output run.json
+    python -m extension_changer.benchmark --compare run.json
+
+The startup stage times module imports and the GUI's first window in fresh
+interpreters and fails when they exceed their budgets::
+
+    python -m extension_changer.benchmark --stages startup
+
+The durable-rename and durable-copy stages repeat rename and copy in
+durable mode, so the cost of syncing to disk can be read off against them.
+They are not run by default::
+
+    python -m extension_changer.benchmark --stages rename,durable-rename
+
+Each measurement is repeated and the fastest run is kept, which filters out
+most scheduling noise (and the process pool start-up, which only the first
+run pays). Results are written as JSON; with ``--compare`` they are checked
+against a stored baseline and the exit status is 1 if any stage regressed.
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import __version__
+from . import engine
+from . import executors
+from . import planner
+from . import scanner
+from .__main__ import STARTUP_REPORT_VARIABLE
+from .index import ExtensionIndex
+
+
+STAGES = ('scan', 'index', 'plan', 'rename', 'copy', 'durable-rename', 'durable-copy',
+          'startup')
+
+# Stages run when none are given; durable mode can be very slow on some disks
+DEFAULT_STAGES = ('scan', 'index', 'plan', 'rename', 'copy', 'startup')
+
+# Stages that need a generated tree
+TREE_STAGES = ('scan', 'index', 'plan', 'rename', 'copy', 'durable-rename', 'durable-copy')
+
+# Modules whose import time is measured by the startup stage
+STARTUP_IMPORTS = (
+    ('startup-import-cli', 'extension_changer.cli'),
+    ('startup-import-gui', 'extension_changer.extension_changer'),
+)
+
+# Startup budgets in seconds
+DEFAULT_IMPORT_BUDGET = 0.3
+DEFAULT_WINDOW_BUDGET = 1.5
+
+# Stages that run once per backend and worker count
+EXECUTION_STAGES = ('rename', 'copy', 'durable-rename', 'durable-copy')
+
+# Named file size distributions for generated trees
+SIZE_DISTRIBUTIONS = ('empty', 'small', 'mixed')
+
+# Extension given to generated files, and the one they are converted to
+SOURCE_EXT = '.txt'
+TARGET_EXT = '.md'
+
+# A stage regresses when it gets slower than this fraction of its baseline
+DEFAULT_THRESHOLD = 0.10
+
+RESULT_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# Synthetic trees
+# ---------------------------------------------------------------------------
+
+def file_size(rng, distribution):
+    """Draw one file size from a named distribution or a fixed byte count"""
+    if distribution == 'empty':
+        return 0
+    if distribution == 'small':
+        return rng.randint(1, 4096)
+    if distribution == 'mixed':
+        # Mostly small files with a long tail of large ones, like a photo dump
+        return min(int(rng.lognormvariate(9, 2)), 64 * 1024 * 1024)
+    return int(distribution)
+
+
+def make_tree(root, files=10000, depth=2, fanout=8, sizes='small', seed=0):
+    """Create ``files`` files spread over a tree and return their total size
+
+    Directories are ``fanout`` wide and ``depth`` levels deep; files are dealt
+    round-robin over every directory, so the tree is the same for a given
+    set of arguments and ``seed``.
+    """
+    rng = random.Random(seed)
+    directories = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(parent, f"d{i}") for parent in level for i in range(fanout)]
+        directories.extend(level)
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    block = bytes(rng.getrandbits(8) for _ in range(64 * 1024))
+    total = 0
+    for i in range(files):
+        size = file_size(rng, sizes)
+        path = os.path.join(directories[i % len(directories)], f"file{i:07d}{SOURCE_EXT}")
+        with open(path, 'wb') as fileobj:
+            remaining = size
+            while remaining > 0:
+                written = fileobj.write(block[:remaining])
+                remaining -= written
+        total += size
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+class Measurement:
+    """Timings of one stage under one configuration"""
+
+    def __init__(self, stage, backend=None, workers=None):
+        self.stage = stage
+        self.backend = backend
+        self.workers = workers
+        self.times = []
+        self.files = 0
+        self.bytes = 0
+        self.sync_seconds = []  # time spent in directory syncs, per run
+
+    @property
+    def key(self):
+        return result_key(self.to_dict())
+
+    def to_dict(self):
+        best = min(self.times) if self.times else 0.0
+        return {
+            'stage': self.stage,
+            'backend': self.backend,
+            'workers': self.workers,
+            'files': self.files,
+            'bytes': self.bytes,
+            'seconds': best,
+            'median': statistics.median(self.times) if self.times else 0.0,
+            'runs': len(self.times),
+            'files_per_second': self.files / best if best else 0.0,
+            'sync_seconds': min(self.sync_seconds) if self.sync_seconds else 0.0,
+        }
+
+
+def result_key(result):
+    """Identify a result across runs, e.g. ``rename/thread/8``"""
+    parts = [result['stage']]
+    if result.get('backend'):
+        parts.extend([result['backend'], str(result['workers'])])
+    return '/'.join(parts)
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    value = func(*args, **kwargs)
+    return time.perf_counter() - started, value
+
+
+def _execute(operations, keep_original, backend, workers, durable=False):
+    report = engine.execute_plan(operations, keep_original=keep_original,
+                                 backend=backend, workers=workers, durable=durable)
+    if report.failures:
+        path, error = report.failures[0]
+        raise RuntimeError(f"Benchmark operation failed on {path}: {error}")
+    return report
+
+
+def _restore(operations, keep_original):
+    """Undo a timed run so the next one starts from the same tree"""
+    if keep_original:
+        undo = [engine.Operation(operation.dst, None) for operation in operations]
+    else:
+        undo = [engine.Operation(operation.dst, operation.src) for operation in operations]
+    _execute(undo, False, 'thread', None)
+
+
+def backend_configs(backends, worker_counts):
+    """Expand backends and worker counts into ``(backend, workers)`` pairs"""
+    configs = []
+    for backend in backends:
+        if backend == 'serial':
+            configs.append((backend, 1))
+        elif backend == 'auto':
+            configs.append((backend, None))
+        else:
+            configs.extend((backend, workers) for workers in worker_counts)
+    return configs
+
+
+def run_benchmarks(root, stages=DEFAULT_STAGES, backends=('serial', 'thread', 'process'),
+                   worker_counts=(1, 4), repeat=3, scan_threads=1, progress=None):
+    """Time each stage on the tree under ``root`` and return result dicts"""
+    measurements = []
+
+    def measure(stage, backend=None, workers=None):
+        measurement = Measurement(stage, backend, workers)
+        measurements.append(measurement)
+        if progress:
+            progress(measurement.key)
+        return measurement
+
+    # Scan, index and plan do not depend on the execution backend
+    entries = list(scanner.scan(root, recursive=True, with_size=True, threads=scan_threads))
+    files = [entry.path for entry in entries if entry.path.endswith(SOURCE_EXT)]
+    total_bytes = sum(entry.size for entry in entries)
+
+    if 'scan' in stages:
+        measurement = measure('scan')
+        for _ in range(repeat):
+            seconds, found = _timed(
+                lambda: list(scanner.scan(root, recursive=True, with_size=True,
+                                          threads=scan_threads)))
+            measurement.times.append(seconds)
+            measurement.files = len(found)
+
+    if 'index' in stages:
+        measurement = measure('index')
+        measurement.files = len(entries)
+        for _ in range(repeat):
+            seconds, _index = _timed(ExtensionIndex, entries)
+            measurement.times.append(seconds)
+
+    operations = engine.plan_operations(files, SOURCE_EXT, TARGET_EXT)
+    if 'plan' in stages:
+        measurement = measure('plan')
+        measurement.files = len(operations)
+        for _ in range(repeat):
+            seconds, _plan = _timed(
+                lambda: planner.build_plan(engine.plan_operations(files, SOURCE_EXT, TARGET_EXT)))
+            measurement.times.append(seconds)
+
+    for stage in EXECUTION_STAGES:
+        if stage not in stages:
+            continue
+        keep_original = stage.endswith('copy')
+        durable = stage.startswith('durable')
+        for backend, workers in backend_configs(backends, worker_counts):
+            measurement = measure(stage, backend, workers)
+            measurement.files = len(operations)
+            measurement.bytes = total_bytes if keep_original else 0
+            for _ in range(repeat):
+                seconds, report = _timed(_execute, operations, keep_original, backend, workers,
+                                         durable)
+                _restore(operations, keep_original)
+                measurement.times.append(seconds)
+                if durable:
+                    measurement.sync_seconds.append(report.metrics.sync_time)
+                if backend == 'auto':
+                    measurement.workers = f"{report.backend}:{report.workers}"
+
+    executors.warm_pool.shutdown()
+    return [measurement.to_dict() for measurement in measurements]
+
+
+def _child_environment():
+    """Environment for a fresh interpreter that imports this same package"""
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = [package_root] + [path for path in env.get('PYTHONPATH', '').split(os.pathsep) if path]
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    return env
+
+
+def time_import(module):
+    """Import a module in a fresh interpreter; return the seconds taken or ``None``"""
+    code = ("import time; started = time.perf_counter(); "
+            f"import {module}; print(time.perf_counter() - started)")
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True,
+                            env=_child_environment())
+    if result.returncode:
+        return None
+    return float(result.stdout.split()[-1])
+
+
+def time_first_window(timeout=60):
+    """Start the GUI until its first window is up; return the seconds taken or ``None``
+
+    Uses the offscreen Qt platform unless another one is configured.
+    """
+    env = _child_environment()
+    env[STARTUP_REPORT_VARIABLE] = '1'
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        result = subprocess.run([sys.executable, '-m', 'extension_changer'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, env=env, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    if result.returncode:
+        return None
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)['first_window']
+    return None
+
+
+def run_startup_benchmarks(repeat=3, progress=None):
+    """Time imports and the first window, skipping what cannot start here"""
+    measurements = []
+    probes = [(stage, functools.partial(time_import, module))
+              for stage, module in STARTUP_IMPORTS]
+    probes.append(('startup-first-window', time_first_window))
+    for stage, probe in probes:
+        if progress:
+            progress(stage)
+        measurement = Measurement(stage)
+        for _ in range(repeat):
+            seconds = probe()
+            if seconds is None:
+                print(f"  {stage} skipped: it could not start (is PySide6 installed?)",
+                      file=sys.stderr)
+                break
+            measurement.times.append(seconds)
+        if measurement.times:
+            measurements.append(measurement)
+    return [measurement.to_dict() for measurement in measurements]
+
+
+def over_budget(results, import_budget, window_budget):
+    """Return ``(key, seconds, budget)`` for startup results over their budget"""
+    exceeded = []
+    for result in results:
+        stage = result['stage']
+        if stage.startswith('startup-import'):
+            budget = import_budget
+        elif stage == 'startup-first-window':
+            budget = window_budget
+        else:
+            continue
+        if result['seconds'] > budget:
+            exceeded.append((result_key(result), result['seconds'], budget))
+    return exceeded
+
+
+# ---------------------------------------------------------------------------
+# Results and baselines
+# ---------------------------------------------------------------------------
+
+def environment():
+    """Describe the machine and interpreter the benchmark ran on"""
+    return {
+        'extension_changer': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': multiprocessing.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare results with a baseline
+
+    Returns a list of ``(key, baseline_seconds, seconds, change)`` rows for
+    every result present in both, where ``change`` is the relative slowdown
+    (negative when faster), and the list of keys that regressed by more
+    than ``threshold``.
+    """
+    previous = {result_key(result): result for result in baseline}
+    rows = []
+    regressions = []
+    for result in results:
+        key = result_key(result)
+        old = previous.get(key)
+        if old is None or not old['seconds']:
+            continue
+        change = result['seconds'] / old['seconds'] - 1
+        rows.append((key, old['seconds'], result['seconds'], change))
+        if change > threshold:
+            regressions.append(key)
+    return rows, regressions
+
+
+def print_results(results, fileobj=sys.stdout):
+    print(f"{'stage':<28} {'best':>10} {'median':>10} {'files/s':>12}", file=fileobj)
+    for result in results:
+        sync = result.get('sync_seconds')
+        sync = f"  ({sync:.4f}s syncing)" if sync else ""
+        print(f"{result_key(result):<28} {result['seconds']:>9.4f}s {result['median']:>9.4f}s"
+              f" {result['files_per_second']:>12,.0f}{sync}", file=fileobj)
+
+
+def print_comparison(rows, regressions, threshold, fileobj=sys.stdout):
+    print(f"{'stage':<28} {'baseline':>10} {'current':>10} {'change':>8}", file=fileobj)
+    for key, old, new, change in rows:
+        flag = "  REGRESSION" if key in regressions else ""
+        print(f"{key:<28} {old:>9.4f}s {new:>9.4f}s {change:>+7.1%}{flag}", file=fileobj)
+    if regressions:
+        print(f"{len(regressions)} stage(s) slower than baseline by more than {threshold:.0%}",
+              file=fileobj)
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def build_parser():
+    """Build the benchmark argument parser"""
+    parser = argparse.ArgumentParser(
+        prog='python -m extension_changer.benchmark',
+        description='Time scan, index, plan, rename and copy on a synthetic tree',
+    )
+    parser.add_argument('--files', type=int, default=10000,
+                        help='number of files to generate (default: %(default)s)')
+    parser.add_argument('--depth', type=int, default=2,
+                        help='directory levels below the root (default: %(default)s)')
+    parser.add_argument('--fanout', type=int, default=8,
+                        help='subdirectories per directory (default: %(default)s)')
+    parser.add_argument('--sizes', default='small',
+                        help='file sizes: empty, small, mixed or a byte count (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed for the generated tree (default: %(default)s)')
+    parser.add_argument('--dir', metavar='PATH',
+                        help='where to create the tree, e.g. a tmpfs mount (default: system temp dir)')
+    parser.add_argument('--stages', type=_split, default=list(DEFAULT_STAGES),
+                        help=f"comma-separated stages to run: {', '.join(STAGES)} "
+                             f"(default: all but the durable ones)")
+    parser.add_argument('--backends', type=_split, default=['serial', 'thread', 'process'],
+                        help='comma-separated execution backends (default: serial,thread,process)')
+    parser.add_argument('--workers', type=lambda value: [int(n) for n in _split(value)],
+                        default=[1, 4],
+                        help='comma-separated worker counts for pool backends (default: 1,4)')
+    parser.add_argument('--scan-threads', type=int, default=1,
+                        help='threads used by the scan stage (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per measurement; the fastest is kept (default: %(default)s)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write results as JSON')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare with a previous results file and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown before a stage counts as regressed '
+                             '(default: %(default)s)')
+    parser.add_argument('--import-budget', type=float, default=DEFAULT_IMPORT_BUDGET,
+                        metavar='SECONDS',
+                        help='most time a startup import may take (default: %(default)s)')
+    parser.add_argument('--window-budget', type=float, default=DEFAULT_WINDOW_BUDGET,
+                        metavar='SECONDS',
+                        help='most time until the first window is up (default: %(default)s)')
+    return parser
+
+
+def main(argv=None):
+    """Benchmark entry point"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage: {', '.join(sorted(unknown))}")
+    unknown = set(args.backends) - set(executors.BACKENDS)
+    if unknown:
+        parser.error(f"unknown backend: {', '.join(sorted(unknown))}")
+    if args.sizes not in SIZE_DISTRIBUTIONS and not args.sizes.isdigit():
+        parser.error(f"--sizes must be one of {', '.join(SIZE_DISTRIBUTIONS)} or a byte count")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fileobj:
+            baseline = json.load(fileobj)
+
+    def progress(key):
+        print(f"  {key}", file=sys.stderr)
+
+    results = []
+    total_bytes = 0
+    if set(args.stages) & set(TREE_STAGES):
+        root = tempfile.mkdtemp(prefix='extension_changer-bench-', dir=args.dir)
+        try:
+            print(f"Generating {args.files} files in {root}", file=sys.stderr)
+            total_bytes = make_tree(root, args.files, args.depth, args.fanout,
+                                    args.sizes, args.seed)
+            results.extend(run_benchmarks(
+                root,
+                stages=args.stages,
+                backends=args.backends,
+                worker_counts=args.workers,
+                repeat=args.repeat,
+                scan_threads=args.scan_threads,
+                progress=progress,
+            ))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    if 'startup' in args.stages:
+        results.extend(run_startup_benchmarks(args.repeat, progress))
+
+    document = {
+        'version': RESULT_VERSION,
+        'created': time.time(),
+        'environment': environment(),
+        'tree': {
+            'files': args.files,
+            'depth': args.depth,
+            'fanout': args.fanout,
+            'sizes': args.sizes,
+            'seed': args.seed,
+            'bytes': total_bytes,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fileobj:
+            json.dump(document, fileobj, indent=2)
+
+    print_results(results)
+    status = 0
+    exceeded = over_budget(results, args.import_budget, args.window_budget)
+    for key, seconds, budget in exceeded:
+        print(f"{key} took {seconds:.3f}s, over its {budget:.3f}s budget")
+        status = 1
+    if baseline is None:
+        return status
+
+    if baseline.get('tree') != document['tree']:
+        print("Warning: the baseline was measured on a different tree", file=sys.stderr)
+    rows, regressions = compare(results, baseline.get('results', []), args.threshold)
+    print()
+    print_comparison(rows, regressions, args.threshold)
+    return 1 if regressions else status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer headless command line entry point
+
+Runs the same scan, plan and execute stages as the GUI without importing Qt,
+so it is cheap to start from cron jobs and CI machines.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+from . import __version__
+from . import durability
+from . import engine
+from . import executors
+from . import export
+from . import journal
+from . import planner
+from . import results
+from . import scanner
+from .fileset import FileSet
+from .rules import Rule, RuleError, RuleSet
+
+
+def shard_spec(text):
+    """argparse type for --shard"""
+    from . import manifest
+    try:
+        return manifest.parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_parser():
+    """Build the command line argument parser"""
+    parser = argparse.ArgumentParser(
+        prog='extension_changer-cli',
+        description='Batch change file extensions without starting the GUI',
+    )
+    parser.add_argument('paths', nargs='*',
+                        help='folder to scan, or individual files to convert')
+    parser.add_argument('-f', '--from', dest='from_ext',
+                        help='extension to change (e.g. .txt)')
+    parser.add_argument('-t', '--to', dest='to_ext',
+                        help='new extension (e.g. .md)')
+    parser.add_argument('--rule', action='append', dest='rules', metavar='SPEC',
+                        help='extra mapping as [i:][glob:|re:]PATTERN=TARGET, e.g. .jpeg=.jpg; '
+                             'may be repeated, and the first matching rule wins')
+    parser.add_argument('-d', '--detect', action='store_true',
+                        help='give files the extension their content calls for, found from '
+                             'their first bytes; with --from only those files are checked')
+    parser.add_argument('-i', '--ignore-case', action='store_true',
+                        help='match --from and --rule patterns regardless of case')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='scan subfolders as well')
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help='limit how many folder levels are scanned with --recursive')
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help='only consider file names matching this pattern (repeatable)')
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help='skip file and folder names matching this pattern (repeatable)')
+    parser.add_argument('--scan-threads', type=int, default=1,
+                        help='list subfolders in parallel on this many threads')
+    parser.add_argument('--scan-cache', action='store_true',
+                        help='reuse folder listings from earlier runs for folders that have '
+                             'not changed since')
+    parser.add_argument('--rescan', action='store_true',
+                        help='with --scan-cache, forget the cached listings of the given '
+                             'folders first')
+    parser.add_argument('--scan-cache-limit', type=float, metavar='MB',
+                        help='size limit of the scan cache (default: 256)')
+    parser.add_argument('-k', '--keep-original', action='store_true',
+                        help='keep original files and create copies')
+    parser.add_argument('-p', '--preserve-metadata', action='store_true',
+                        help='copy permissions and timestamps along with the data')
+    parser.add_argument('-c', '--on-conflict', choices=planner.POLICIES, default='skip',
+                        help='what to do when a target already exists: skip it, '
+                             'add a number to the new name, or overwrite (default: skip)')
+    parser.add_argument('-b', '--backend', choices=executors.BACKENDS, default='auto',
+                        help='how files are processed in parallel (default: auto)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker threads or processes')
+    parser.add_argument('--max-large-copies', type=int, default=executors.LARGE_COPY_WORKERS,
+                        metavar='N',
+                        help='with --keep-original, most files of 8 MB or more copied at once; '
+                             '0 for no limit (default: %(default)s)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='files sent to a worker per batch (default: automatic)')
+    parser.add_argument('--durable', action='store_true',
+                        help='sync copied data and the changed folders to disk so completed '
+                             'changes survive a power failure')
+    parser.add_argument('--durable-batch-size', type=int, default=durability.DEFAULT_BATCH_SIZE,
+                        metavar='N',
+                        help='with --durable, completed files per round of folder syncs '
+                             '(default: %(default)s)')
+    parser.add_argument('--durable-interval', type=float, default=durability.DEFAULT_INTERVAL,
+                        metavar='SECONDS',
+                        help='with --durable, longest wait before the changed folders are '
+                             'synced (default: %(default)s)')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='print the planned changes without applying them')
+    parser.add_argument('--export-plan', metavar='FILE',
+                        help='write the full plan to a .csv or .jsonl file')
+    parser.add_argument('--export-manifest', metavar='FILE',
+                        help='write the runnable operations to a compact manifest (.jsonl.gz) '
+                             'for --manifest and stop')
+    parser.add_argument('--manifest', metavar='FILE',
+                        help='run the operations of a manifest instead of scanning')
+    parser.add_argument('--shard', type=shard_spec, default=(1, 1), metavar='I/N',
+                        help='with --manifest, run only shard I of N; the folders of the '
+                             'manifest are split between shards by a hash of their path')
+    parser.add_argument('--shard-result', metavar='FILE',
+                        help='with --manifest, where to save the shard\'s report '
+                             '(default: next to the manifest)')
+    parser.add_argument('--merge-results', nargs='+', metavar='FILE',
+                        help='combine the result files of every shard into one report')
+    parser.add_argument('--journal', metavar='FILE',
+                        help='record completed operations in FILE so the job can be '
+                             'resumed or undone (with --undo: where to write the undo journal)')
+    parser.add_argument('--resume', metavar='FILE',
+                        help='finish an interrupted job from its journal')
+    parser.add_argument('--undo', metavar='FILE',
+                        help='revert the completed operations recorded in a journal')
+    parser.add_argument('--sync-interval', type=float, default=journal.DEFAULT_SYNC_INTERVAL,
+                        metavar='SECONDS',
+                        help='how often the journal is flushed to disk (default: %(default)s)')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='keep running and convert files as they arrive in the folder')
+    parser.add_argument('--settle', type=float, metavar='SECONDS',
+                        help='with --watch, how long a file must go unmodified before it is '
+                             'converted (default: 2)')
+    parser.add_argument('--batch-size', type=int,
+                        help='with --watch, most files converted at once (default: 100)')
+    parser.add_argument('--poll', action='store_true',
+                        help='with --watch, poll for changes instead of using inotify')
+    parser.add_argument('--report', metavar='FILE',
+                        help='stream the outcome of every operation to a JSON Lines file')
+    parser.add_argument('--retry-failed', metavar='REPORT',
+                        help='run the operations that failed in a --report file again, '
+                             'without scanning')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='write the report with throughput and latency metrics to a JSON file')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='only print errors')
+    parser.add_argument('--version', action='version',
+                        version=f'%(prog)s {__version__}')
+    return parser
+
+
+def collect_files(paths, cache=None, rescan=False, threads=1, **scan_options):
+    """Expand folders into their files and keep explicit files as they are
+
+    Returns a :class:`fileset.FileSet`, which stores each directory once.
+    With a :class:`scancache.ScanCache`, unchanged folders are read from the
+    cache instead of being listed again.
+    """
+    files = FileSet()
+    for path in paths:
+        if os.path.isdir(path):
+            if cache is not None:
+                if rescan:
+                    cache.invalidate(path)
+                files.add_entries(cache.scan(path, **scan_options))
+            else:
+                scanner.collect(path, files, threads=threads, **scan_options)
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+    return files
+
+
+def execute(args, operations, keep_original, overwrite, journal=None, sizes=None):
+    """Run operations with the execution options from the command line
+
+    The first Ctrl+C cancels cleanly: nothing new is started and the files
+    in progress are finished. A second Ctrl+C aborts immediately.
+    """
+    interrupted = []
+
+    def on_interrupt(signum, frame):
+        if interrupted:
+            raise KeyboardInterrupt
+        interrupted.append(signum)
+        print("Cancelling - finishing files in progress (Ctrl+C again to abort)",
+              file=sys.stderr)
+
+    report_writer = None
+    if args.report:
+        try:
+            report_writer = results.ReportWriter(args.report, operations, keep_original, overwrite)
+        except OSError as e:
+            print(f"Error: could not write report, continuing without it: {e}", file=sys.stderr)
+
+    report = None
+    previous_handler = signal.signal(signal.SIGINT, on_interrupt)
+    try:
+        report = engine.execute_plan(
+            operations,
+            keep_original=keep_original,
+            backend=args.backend,
+            workers=args.workers,
+            preserve_metadata=args.preserve_metadata,
+            chunksize=args.chunksize,
+            overwrite=overwrite,
+            journal=journal,
+            should_cancel=lambda: bool(interrupted),
+            sizes=sizes,
+            max_large_copies=args.max_large_copies,
+            durable=args.durable,
+            sync_batch_size=args.durable_batch_size,
+            sync_interval=args.durable_interval,
+            report_writer=report_writer,
+        )
+    except BaseException:
+        if journal is not None:
+            journal.close()  # Leave the job resumable
+        raise
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if report_writer is not None:
+            report_writer.finish(report)
+    if journal is not None:
+        journal.finish(cancelled=report.cancelled)
+    return report
+
+
+def print_report(args, report):
+    """Print a report and return the process exit status"""
+    if args.metrics:
+        try:
+            with open(args.metrics, 'w', encoding='utf-8') as fileobj:
+                json.dump(report.to_dict(), fileobj, indent=2)
+        except OSError as e:
+            print(f"Error: could not write metrics: {e}", file=sys.stderr)
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        for path, error in report.failures:
+            print(f"Error processing {path}: {error}", file=sys.stderr)
+        if not args.quiet:
+            print(report.summary())
+
+    if report.cancelled:
+        return 130
+    return 1 if report.failures else 0
+
+
+def build_rules(args):
+    """Build the rule set from --from/--to followed by every --rule"""
+    rules = []
+    if args.from_ext and args.to_ext:
+        rules.append(Rule(args.from_ext, args.to_ext, ignore_case=args.ignore_case))
+    rules.extend(Rule.parse(spec, args.ignore_case) for spec in args.rules or ())
+    return RuleSet(rules)
+
+
+def detect_operations(args, files, cache=None):
+    """Plan renames for files whose content does not match their extension
+
+    With a :class:`scancache.ScanCache`, types detected by earlier runs are
+    reused for files that have not changed.
+    """
+    from . import sniffer
+    if args.from_ext:
+        files = files.with_extension(engine.normalize_extension(args.from_ext))
+    sniff_cache = cache.sniff_cache() if cache is not None else None
+    detected = sniffer.detect_types(files, args.backend, args.workers, cache=sniff_cache)
+    return sniffer.plan_detected(files, detected)
+
+
+def run_watch(args, rules):
+    """Convert files in a folder as they arrive, until interrupted"""
+    if len(args.paths) != 1 or not os.path.isdir(args.paths[0]):
+        print("Error: --watch needs exactly one folder", file=sys.stderr)
+        return 2
+    from . import watcher
+    options = {}
+    if args.settle is not None:
+        options['settle'] = args.settle
+    if args.batch_size is not None:
+        options['batch_size'] = args.batch_size
+
+    def on_batch(plan, report):
+        if args.json:
+            print(json.dumps(report.to_dict()), flush=True)
+            return
+        for path, error in report.failures:
+            print(f"Error processing {path}: {error}", file=sys.stderr)
+        if not args.quiet:
+            skipped = f", {plan.skipped_count} skipped" if plan.skipped_count else ""
+            print(f"{report.summary()}{skipped}", flush=True)
+
+    folder_watcher = watcher.FolderWatcher(
+        args.paths[0],
+        rules,
+        recursive=args.recursive,
+        keep_original=args.keep_original,
+        policy=args.on_conflict,
+        backend=args.backend,
+        workers=args.workers,
+        preserve_metadata=args.preserve_metadata,
+        durable=args.durable,
+        poll=args.poll,
+        on_batch=on_batch,
+        **options
+    )
+
+    def on_signal(signum, frame):
+        folder_watcher.stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, on_signal)
+    if not args.quiet and not args.json:
+        source = type(folder_watcher.source).__name__.replace('Source', '').lower()
+        print(f"Watching {args.paths[0]} for {rules.describe()} ({source}, Ctrl+C to stop)",
+              file=sys.stderr)
+    try:
+        folder_watcher.run()
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def run_journal(args):
+    """Resume or undo a journaled job"""
+    options = {'sync_interval': args.sync_interval}
+    try:
+        if args.resume:
+            job = journal.Journal.resume(args.resume, **options)
+        else:
+            job = journal.Journal.undo(args.undo, args.journal, **options)
+    except (OSError, journal.JournalError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if not args.quiet and not args.json:
+        action = "Resuming" if args.resume else "Undoing"
+        print(f"{action} {len(job.operations)} operations (journal: {job.path})")
+    report = execute(args, job.operations, job.keep_original, job.overwrite, job)
+    return print_report(args, report)
+
+
+def run_manifest(args):
+    """Run one shard of a manifest and save its result file"""
+    from . import manifest
+    shard, shards = args.shard
+    try:
+        job_manifest = manifest.read_manifest(args.manifest, shard, shards)
+    except (OSError, manifest.ManifestError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    operations = job_manifest.operations
+
+    if args.dry_run:
+        for operation in operations:
+            print(f"{operation.src} -> {operation.dst}")
+        return 0
+
+    job = None
+    if args.journal:
+        try:
+            job = journal.Journal.create(
+                args.journal, operations, job_manifest.keep_original, job_manifest.overwrite,
+                sync_interval=args.sync_interval,
+            )
+        except OSError as e:
+            print(f"Error: could not create journal: {e}", file=sys.stderr)
+            return 2
+
+    if not args.quiet and not args.json:
+        print(f"Running shard {shard}/{shards}: {len(operations)} of "
+              f"{job_manifest.total} operations")
+    sizes = job_manifest.sizes if job_manifest.keep_original else None
+    report = execute(args, operations, job_manifest.keep_original, job_manifest.overwrite,
+                     job, sizes)
+    status = print_report(args, report)
+
+    result_path = args.shard_result or manifest.default_result_path(args.manifest, shard, shards)
+    try:
+        manifest.write_result(result_path, job_manifest, report)
+    except OSError as e:
+        print(f"Error: could not save shard result: {e}", file=sys.stderr)
+        return 2
+    return status
+
+
+def run_retry(args):
+    """Run the failed operations of an earlier report again, without scanning"""
+    try:
+        header, operations = results.read_failed(args.retry_failed)
+    except (OSError, results.ReportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not operations:
+        if not args.quiet and not args.json:
+            print(f"No failed operations in {args.retry_failed}")
+        return 0
+
+    if args.dry_run:
+        for operation in operations:
+            print(f"{operation.src} -> {operation.dst}")
+        return 0
+
+    if not args.quiet and not args.json:
+        print(f"Retrying {len(operations)} failed operations from {args.retry_failed}")
+    report = execute(args, operations, header.get('keep_original', False),
+                     header.get('overwrite', False))
+    return print_report(args, report)
+
+
+def run_merge(args):
+    """Combine shard result files into the report of the whole job"""
+    from . import manifest
+    try:
+        report = manifest.merge_results(args.merge_results)
+    except (OSError, manifest.ManifestError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    return print_report(args, report)
+
+
+def export_manifest(args, operations, overwrite, files):
+    """Write runnable operations to --export-manifest and return the exit status"""
+    from . import manifest
+    sizes = [files.size_of(operation.src) for operation in operations] if args.keep_original else None
+    try:
+        manifest.write_manifest(args.export_manifest, operations, args.keep_original,
+                                overwrite, sizes)
+    except OSError as e:
+        print(f"Error: could not write manifest: {e}", file=sys.stderr)
+        return 2
+    if not args.quiet and not args.json:
+        print(f"Wrote {len(operations)} operations to {args.export_manifest}")
+    return 0
+
+
+def main(argv=None):
+    """Main entry point for the command line tool"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.resume and args.undo:
+        parser.error("--resume and --undo cannot be combined")
+    if args.resume or args.undo:
+        return run_journal(args)
+    if args.merge_results:
+        return run_merge(args)
+    if args.retry_failed:
+        if args.paths:
+            parser.error("--retry-failed cannot be combined with paths")
+        return run_retry(args)
+    if args.manifest:
+        if args.paths:
+            parser.error("--manifest cannot be combined with paths")
+        return run_manifest(args)
+    if args.shard != (1, 1) or args.shard_result:
+        parser.error("--shard and --shard-result need --manifest")
+    if not args.paths:
+        parser.error("paths are required")
+    if args.detect:
+        if args.to_ext or args.rules or args.watch:
+            parser.error("--detect cannot be combined with --to, --rule or --watch")
+    elif bool(args.from_ext) != bool(args.to_ext):
+        parser.error("--from and --to must be given together")
+    elif not args.from_ext and not args.rules:
+        parser.error("--from and --to, at least one --rule, or --detect are required")
+    try:
+        rules = build_rules(args)
+    except RuleError as e:
+        parser.error(str(e))
+
+    if args.watch:
+        one_shot = [option for option, value in (
+            ('--journal', args.journal),
+            ('--report', args.report),
+            ('--scan-cache', args.scan_cache),
+            ('--dry-run', args.dry_run),
+            ('--export-plan', args.export_plan),
+            ('--export-manifest', args.export_manifest),
+            ('--metrics', args.metrics),
+        ) if value]
+        if one_shot:
+            parser.error(f"--watch cannot be combined with {', '.join(one_shot)}")
+        return run_watch(args, rules)
+
+    cache = None
+    scan_errors = OSError
+    try:
+        if args.scan_cache:
+            # Loaded only when asked for, so plain runs do not import sqlite3
+            from . import scancache
+            scan_errors = scancache.CACHE_ERRORS
+            cache_options = {}
+            if args.scan_cache_limit is not None:
+                cache_options['max_bytes'] = int(args.scan_cache_limit * 2**20)
+            cache = scancache.ScanCache(**cache_options)
+        files = collect_files(
+            args.paths,
+            cache=cache,
+            rescan=args.rescan,
+            recursive=args.recursive,
+            max_depth=args.max_depth,
+            include=args.include,
+            exclude=args.exclude,
+            threads=args.scan_threads,
+            # Copies are scheduled by size, so learn sizes while listing
+            with_size=args.keep_original,
+        )
+        if args.detect:
+            # With --scan-cache the detected types are kept next to the listings
+            operations = detect_operations(args, files, cache)
+        else:
+            operations = rules.plan(files)
+    except scan_errors as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if cache is not None:
+            cache.close()
+
+    plan = planner.build_plan(operations, args.on_conflict)
+
+    if args.export_plan:
+        try:
+            rows = export.iter_plan_rows(plan.operations, status_of=plan.statuses.__getitem__)
+            export.export_plan(args.export_plan, rows)
+        except OSError as e:
+            print(f"Error: could not export plan: {e}", file=sys.stderr)
+            return 2
+
+    if args.dry_run:
+        for operation, status in zip(plan.operations, plan.statuses):
+            if status == planner.STATUS_OK:
+                print(f"{operation.src} -> {operation.dst}")
+            else:
+                print(f"{operation.src} -> {operation.dst} [{planner.STATUS_LABELS[status]}]")
+        return 0
+
+    if plan.conflict_count and not args.quiet and not args.json:
+        print(plan.summary())
+
+    operations = plan.runnable()
+    if args.export_manifest:
+        return export_manifest(args, operations, plan.overwrite, files)
+    job = None
+    if args.journal:
+        try:
+            job = journal.Journal.create(
+                args.journal, operations, args.keep_original, plan.overwrite,
+                sync_interval=args.sync_interval,
+            )
+        except OSError as e:
+            print(f"Error: could not create journal: {e}", file=sys.stderr)
+            return 2
+
+    sizes = [files.size_of(operation.src) for operation in operations] if args.keep_original else None
+    report = execute(args, operations, args.keep_original, plan.overwrite, job, sizes)
+    return print_report(args, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer copy engine
+
+Streams file contents for "Keep original files" mode without ever holding a
+whole file in memory. Kernel-side copies (``os.copy_file_range`` and, on
+Linux, ``os.sendfile``) are tried first; a bounded-buffer loop is used when
+neither is available for the pair of files being copied.
+
+Data is written to a hidden temporary file next to the target and only moved
+into place once complete, so an interrupted copy never leaves a truncated
+file under the target name.
+"""
+
+import errno
+import os
+import shutil
+import sys
+import uuid
+
+
+# Size of the userspace buffer used by the chunked fallback
+COPY_BUFSIZE = 1024 * 1024
+
+# Largest request handed to the kernel in a single call
+KERNEL_CHUNK = 1024 * 1024 * 1024
+
+# Errors meaning "this copy method does not work for these files"
+_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+    getattr(errno, 'EOPNOTSUPP', errno.EINVAL),
+    getattr(errno, 'ENOTSUP', errno.EINVAL),
+    getattr(errno, 'ETXTBSY', errno.EINVAL),
+}
+
+
+class _Unsupported(Exception):
+    """Raised when a kernel copy method cannot be used for a file pair"""
+
+
+def _kernel_copy(copy_call, infd, outfd):
+    copied = 0
+    while True:
+        try:
+            sent = copy_call(infd, outfd, KERNEL_CHUNK)
+        except OSError as e:
+            # Only fall back if nothing was written yet, otherwise the
+            # destination would be left with a silently truncated prefix
+            if copied == 0 and e.errno in _FALLBACK_ERRNOS:
+                raise _Unsupported() from e
+            raise
+        if sent == 0:
+            return copied
+        copied += sent
+
+
+def _copy_file_range(infd, outfd, count):
+    return os.copy_file_range(infd, outfd, count)
+
+
+def _sendfile(infd, outfd, count):
+    return os.sendfile(outfd, infd, None, count)
+
+
+def _kernel_methods():
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(_copy_file_range)
+    # sendfile() only accepts regular files as the destination on Linux
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        methods.append(_sendfile)
+    return methods
+
+
+def _chunked_copy(fsrc, fdst, bufsize):
+    copied = 0
+    buffer = bytearray(bufsize)
+    view = memoryview(buffer)
+    while True:
+        read = fsrc.readinto(buffer)
+        if not read:
+            return copied
+        fdst.write(view[:read])
+        copied += read
+
+
+def copy_fileobj(fsrc, fdst, bufsize=COPY_BUFSIZE):
+    """Copy between two open binary files and return the number of bytes copied"""
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    for method in _kernel_methods():
+        try:
+            return _kernel_copy(method, infd, outfd)
+        except _Unsupported:
+            continue
+    return _chunked_copy(fsrc, fdst, bufsize)
+
+
+def temp_path(dst):
+    """Return a unique hidden name next to ``dst`` for an in-progress copy"""
+    directory, name = os.path.split(dst)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.partial")
+
+
+def _exists_error(path):
+    return FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+
+
+def _publish(tmp, dst, overwrite):
+    """Move a finished temporary copy to its final name"""
+    if overwrite:
+        os.replace(tmp, dst)
+        return
+    if _rename_noreplace(tmp, dst):
+        return
+    try:
+        # link() fails if dst exists, which rename() would silently replace
+        os.link(tmp, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links on this file system; accept a small race instead
+        if os.path.lexists(dst):
+            raise _exists_error(dst) from None
+        os.rename(tmp, dst)
+        return
+    try:
+        os.unlink(tmp)
+    except OSError:
+        pass  # The copy is in place; only a stray hidden name remains
+
+
+# link() can create the new name without following a symlink source here
+_LINK_NO_FOLLOW = os.link in os.supports_follow_symlinks
+
+# renameat2() flag that makes it fail with EEXIST rather than replace
+RENAME_NOREPLACE = 1
+
+# Directory fd standing for the working directory in the *at() calls
+_AT_FDCWD = -100
+
+# Errors meaning the kernel or the file system lacks RENAME_NOREPLACE
+_NOREPLACE_UNSUPPORTED = {
+    errno.EINVAL, errno.ENOSYS,
+    getattr(errno, 'EOPNOTSUPP', errno.EINVAL),
+    getattr(errno, 'ENOTSUP', errno.EINVAL),
+}
+
+# ``(renameat2, get_errno)`` once loaded, False where it is missing
+_renameat2 = None
+
+
+def _load_renameat2():
+    """Return libc's renameat2 and ctypes' get_errno, or ``None``
+
+    ctypes is only imported on first use, so the cost stays out of startup
+    and of platforms that never need it.
+    """
+    global _renameat2
+    if _renameat2 is None:
+        _renameat2 = False
+        if sys.platform.startswith('linux'):
+            import ctypes
+            try:
+                function = ctypes.CDLL(None, use_errno=True).renameat2
+            except (OSError, AttributeError):
+                pass  # libc older than glibc 2.28, or not glibc
+            else:
+                function.argtypes = (ctypes.c_int, ctypes.c_char_p,
+                                     ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+                function.restype = ctypes.c_int
+                _renameat2 = (function, ctypes.get_errno)
+    return _renameat2 or None
+
+
+def _rename_noreplace(src, dst, src_dir_fd=None, dst_dir_fd=None):
+    """Rename with one ``renameat2(RENAME_NOREPLACE)`` call
+
+    Returns False, without touching either name, where the call is not
+    available or the target exists; the caller then takes the slower path,
+    which also tells a taken name from a change of case.
+    """
+    global _renameat2
+    loaded = _load_renameat2()
+    if loaded is None:
+        return False
+    function, get_errno = loaded
+    result = function(_AT_FDCWD if src_dir_fd is None else src_dir_fd, os.fsencode(src),
+                      _AT_FDCWD if dst_dir_fd is None else dst_dir_fd, os.fsencode(dst),
+                      RENAME_NOREPLACE)
+    if result == 0:
+        return True
+    error = get_errno()
+    if error == errno.EEXIST:
+        return False
+    if error in _NOREPLACE_UNSUPPORTED:
+        if error == errno.ENOSYS:
+            _renameat2 = False  # the kernel predates it; stop asking
+        return False
+    raise OSError(error, os.strerror(error), src, None, dst)
+
+
+def _lstat(path, dir_fd=None):
+    try:
+        return os.lstat(path, dir_fd=dir_fd) if dir_fd is not None else os.lstat(path)
+    except FileNotFoundError:
+        return None
+
+
+def rename_no_replace(src, dst, src_dir_fd=None, dst_dir_fd=None):
+    """Rename ``src`` to ``dst``, raising ``FileExistsError`` if ``dst`` exists
+
+    ``rename()`` silently replaces an existing target on POSIX. On Linux a
+    single ``renameat2(RENAME_NOREPLACE)`` does the job. Elsewhere, or on
+    file systems without it, the new name is made with ``link()``, which
+    fails if it is taken, and the old one is unlinked afterwards: two
+    metadata updates instead of one, which roughly doubles the cost of a
+    rename. Where hard links are not available either, a ``lexists`` check
+    guards a plain rename, with a small race. Names may be relative to open
+    directories, as with :func:`os.rename`.
+    """
+    dir_fds = {}
+    if src_dir_fd is not None:
+        dir_fds = {'src_dir_fd': src_dir_fd, 'dst_dir_fd': dst_dir_fd}
+    if os.name == 'nt':
+        # Windows refuses to rename onto an existing file by itself
+        os.rename(src, dst, **dir_fds)
+        return
+    if _rename_noreplace(src, dst, src_dir_fd, dst_dir_fd):
+        return
+    try:
+        if not _LINK_NO_FOLLOW:
+            raise OSError(errno.ENOTSUP, "link() would follow symlinks")
+        os.link(src, dst, follow_symlinks=False, **dir_fds)
+    except FileExistsError:
+        src_stat = _lstat(src, src_dir_fd)
+        dst_stat = _lstat(dst, dst_dir_fd)
+        if (src_stat is None or dst_stat is None or src_stat.st_ino != dst_stat.st_ino
+                or src_stat.st_dev != dst_stat.st_dev):
+            raise
+        # The same file under another name, e.g. a change of case on a
+        # case-insensitive file system, which rename() handles
+        os.rename(src, dst, **dir_fds)
+        return
+    except OSError:
+        # No hard links here (or src is a directory); accept a small race
+        if _lstat(dst, dst_dir_fd) is not None:
+            raise _exists_error(dst) from None
+        os.rename(src, dst, **dir_fds)
+        return
+    try:
+        os.unlink(src, dir_fd=src_dir_fd)
+    except OSError:
+        # Leave things as they were rather than with two names
+        os.unlink(dst, dir_fd=dst_dir_fd)
+        raise
+
+
+def copy_file(src, dst, preserve_metadata=False, bufsize=COPY_BUFSIZE, overwrite=True,
+              fsync=False):
+    """Copy ``src`` to ``dst`` and return the number of bytes copied
+
+    When ``preserve_metadata`` is set, permission bits and timestamps are
+    copied as well (like :func:`shutil.copy2`). Without ``overwrite`` an
+    existing ``dst`` raises ``FileExistsError`` instead of being replaced.
+    The target appears only once the copy is complete. With ``fsync`` the
+    copied data is flushed to disk before it is published; syncing the
+    directory entry is left to the caller.
+    """
+    if not overwrite and os.path.lexists(dst):
+        raise _exists_error(dst)
+    tmp = temp_path(dst)
+    try:
+        with open(src, 'rb') as fsrc:
+            with open(tmp, 'xb') as fdst:
+                copied = copy_fileobj(fsrc, fdst, bufsize)
+                if fsync:
+                    fdst.flush()
+                    os.fsync(fdst.fileno())
+        if preserve_metadata:
+            shutil.copystat(src, tmp)
+        _publish(tmp, dst, overwrite)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return copied
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer durable mode
+
+A rename or a newly published copy only survives a power failure once the
+directory entry itself has reached the disk, which takes an ``fsync`` of
+the parent directory. Syncing after every file would make large batches
+crawl, so :class:`DirectorySyncer` collects the directories touched by
+completed operations and syncs each of them once per batch: after
+``batch_size`` operations or ``interval`` seconds, whichever comes first.
+Copied file data is synced by the copier before the copy is published.
+
+Operations are only reported as durable (e.g. to the journal) after the
+batch holding them has been synced. When a directory fails to sync, the
+operations that touched it stay pending and their directories are synced
+again with the next batch; whatever is still pending when the run ends is
+never reported as durable.
+"""
+
+import errno
+import os
+import time
+
+from . import metrics
+
+
+# Completed operations per directory sync batch
+DEFAULT_BATCH_SIZE = 1000
+
+# Longest time, in seconds, a completed operation waits for its directory sync
+DEFAULT_INTERVAL = 1.0
+
+# Directory fsync is not supported everywhere (e.g. some network file systems)
+_UNSUPPORTED_ERRNOS = {errno.EINVAL, errno.EBADF, getattr(errno, 'ENOTSUP', errno.EINVAL)}
+
+
+def fsync_directory(path):
+    """Flush a directory's entries to disk
+
+    Returns ``False`` where directories cannot be synced, such as on
+    Windows (whose file systems journal renames themselves) or file systems
+    that reject it.
+    """
+    if os.name == 'nt':
+        return False
+    fd = os.open(path or os.curdir, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+    finally:
+        os.close(fd)
+    return True
+
+
+class DirectorySyncer:
+    """Sync the parent directories of completed operations in batches
+
+    ``on_durable(index)`` is called for every operation once all of its
+    directories have been synced. Sync times and failures are recorded in
+    ``run_metrics``.
+    """
+
+    def __init__(self, keep_original=False, batch_size=DEFAULT_BATCH_SIZE,
+                 interval=DEFAULT_INTERVAL, on_durable=None, run_metrics=None):
+        self.keep_original = keep_original
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_durable = on_durable
+        self.run_metrics = run_metrics
+        self._directories = set()
+        self._pending = []  # (index, directories) of operations not yet durable
+        self._last_sync = time.monotonic()
+
+    @property
+    def pending(self):
+        """Indices of completed operations not yet known to be durable"""
+        return [index for index, _ in self._pending]
+
+    def add(self, index, operation):
+        """Record a completed operation, syncing if the batch is due"""
+        dirname = os.path.dirname
+        directories = []
+        if operation.dst is not None:
+            directories.append(dirname(operation.dst))
+        if not self.keep_original:
+            # The source entry was renamed away or removed
+            directories.append(dirname(operation.src))
+        self._directories.update(directories)
+        self._pending.append((index, directories))
+        if len(self._pending) >= self.batch_size or (
+                self.interval is not None
+                and time.monotonic() - self._last_sync >= self.interval):
+            self.sync()
+
+    def sync(self):
+        """Sync every directory touched since the last batch
+
+        Operations whose directories all synced are reported durable; the
+        others stay pending for the next batch.
+        """
+        self._last_sync = time.monotonic()
+        if not self._pending:
+            return
+        started = time.perf_counter()
+        synced = 0
+        failed = set()
+        for directory in self._directories:
+            try:
+                if fsync_directory(directory):
+                    synced += 1
+            except OSError as e:
+                failed.add(directory)
+                if self.run_metrics is not None:
+                    self.run_metrics.errors.append(
+                        metrics.error_record(directory, metrics.KIND_SYNC, e))
+        if self.run_metrics is not None:
+            self.run_metrics.record_sync(synced, time.perf_counter() - started)
+        pending = self._pending
+        self._directories = failed
+        self._pending = []
+        for index, directories in pending:
+            if failed and not failed.isdisjoint(directories):
+                self._pending.append((index, directories))
+            elif self.on_durable is not None:
+                self.on_durable(index)
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer core engine
+
+Pure-Python scan, plan, execute and report stages shared by the Qt interface
+and the headless command line tool. Nothing in this module imports Qt, so it
+can be used from cron jobs and CI machines without loading PySide6.
+"""
+
+import functools
+import itertools
+import os
+import pathlib
+import sys
+import time
+from collections import Counter, namedtuple
+
+from . import durability
+from . import executors
+from . import metrics
+from . import results
+from . import scanner
+from . import scheduler
+from .copier import copy_file, rename_no_replace
+from .index import ExtensionIndex, extension_of
+
+
+# A single planned change: rename (or copy) ``src`` to ``dst``
+Operation = namedtuple('Operation', ['src', 'dst'])
+
+
+def format_size(num_bytes):
+    """Format a byte count for display"""
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            break
+        num_bytes /= 1024
+    if unit == 'bytes':
+        return f"{int(num_bytes)} bytes"
+    return f"{num_bytes:.1f} {unit}"
+
+
+def user_cache_dir():
+    """Return the per-user cache directory for Extension Changer"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'extension_changer')
+
+
+def normalize_extension(extension):
+    """Return the extension with a leading dot"""
+    if extension and not extension.startswith('.'):
+        return '.' + extension
+    return extension
+
+
+# ---------------------------------------------------------------------------
+# Scan
+# ---------------------------------------------------------------------------
+
+def iter_folder(folder_path, **scan_options):
+    """Yield file paths under a folder as they are found
+
+    ``scan_options`` are passed to :func:`scanner.scan` (``recursive``,
+    ``max_depth``, ``include``, ``exclude``, ``threads``...).
+    """
+    for entry in scanner.scan(folder_path, **scan_options):
+        yield entry.path
+
+
+def scan_folder(folder_path, **scan_options):
+    """Return the regular files inside a folder as a :class:`fileset.FileSet`"""
+    return scanner.collect(folder_path, **scan_options)
+
+
+def build_index(folder_path, **scan_options):
+    """Scan a folder straight into an :class:`index.ExtensionIndex`"""
+    return ExtensionIndex(scanner.scan(folder_path, **scan_options))
+
+
+def count_extensions(files, counts=None):
+    """Count files per extension, optionally adding to an existing ``Counter``"""
+    if counts is None:
+        counts = Counter()
+    for file in files:
+        ext = extension_of(file)
+        if ext:
+            counts[ext] += 1
+    return counts
+
+
+def collect_extensions(files):
+    """Return the sorted list of extensions found in a list of files"""
+    return sorted(count_extensions(files))
+
+
+def filter_by_extension(files, extension):
+    """Filter files by extension (as grouped by :func:`index.extension_of`)"""
+    return [f for f in files if extension_of(f) == extension]
+
+
+# ---------------------------------------------------------------------------
+# Plan
+# ---------------------------------------------------------------------------
+
+def target_path(file_path, to_ext, from_ext=None):
+    """Return the path a file will have once its extension is changed
+
+    When ``from_ext`` is given and the file ends with it, the whole of it is
+    replaced, so compound extensions like ``.tar.gz`` are swapped as one.
+    Otherwise only the last suffix is replaced, like ``Path.with_suffix``.
+    """
+    to_ext = normalize_extension(to_ext)
+    if from_ext and file_path.endswith(from_ext):
+        stem = file_path[:-len(from_ext)]
+        if stem and not stem.endswith(('/', os.sep)):
+            return stem + to_ext
+    return str(pathlib.Path(file_path).with_suffix(to_ext))
+
+
+def plan_operations(files, from_ext, to_ext):
+    """Build operations for files already known to have ``from_ext``
+
+    ``files`` may be any iterable of paths, including a
+    :class:`fileset.FileView`, which builds each path only as it is used.
+    """
+    to_ext = normalize_extension(to_ext)
+    return [Operation(file, target_path(file, to_ext, from_ext)) for file in files]
+
+
+def plan_conversion(files, from_ext, to_ext):
+    """Build the list of operations needed to change ``from_ext`` to ``to_ext``"""
+    return plan_operations(filter_by_extension(files, from_ext), from_ext, to_ext)
+
+
+# ---------------------------------------------------------------------------
+# Execute
+# ---------------------------------------------------------------------------
+
+def operation_kind(operation, keep_original):
+    """Return the :mod:`metrics` kind of an operation"""
+    if operation.dst is None:
+        return metrics.KIND_REMOVE
+    return metrics.KIND_COPY if keep_original else metrics.KIND_RENAME
+
+
+def _run_operation(operation, keep_original, preserve_metadata, overwrite, durable=False):
+    """Apply an operation, raising on failure, and return the bytes copied
+
+    With ``durable`` copied data is synced to disk before it is published.
+    """
+    if operation.dst is None:
+        os.remove(operation.src)
+        return 0
+    if keep_original:
+        # Create a copy instead of renaming
+        return copy_file(operation.src, operation.dst, preserve_metadata,
+                         overwrite=overwrite, fsync=durable)
+    if overwrite:
+        # os.replace also overwrites on Windows, where os.rename fails
+        os.replace(operation.src, operation.dst)
+    else:
+        # Never replace a target that appeared after planning
+        rename_no_replace(operation.src, operation.dst)
+    return 0
+
+
+def apply_operation(operation, keep_original, preserve_metadata=False, overwrite=False):
+    """Apply a single planned operation
+
+    Returns a ``(success, error, bytes_copied)`` tuple where ``error`` is
+    ``None`` on success and ``bytes_copied`` is 0 for plain renames. Renames
+    and copies refuse to replace an existing target unless ``overwrite`` is
+    set.
+    Operations without a target delete their source; they are only produced
+    when undoing copies.
+    """
+    try:
+        return True, None, _run_operation(operation, keep_original, preserve_metadata, overwrite)
+    except Exception as e:
+        return False, str(e), 0
+
+
+def rename_file(file_path, from_ext, to_ext, keep_original, errors=None):
+    """Rename a single file's extension and return a :class:`results.ResultRecord`
+
+    The record's ``outcome`` tells whether it worked, and a failure carries
+    its errno and message. It is also appended to ``errors`` as a
+    :class:`metrics.ErrorRecord` when a list is given.
+    """
+    operation = Operation(file_path, target_path(file_path, to_ext, from_ext))
+    log = results.ResultLog()
+    log.extend([_apply_indexed((0, operation), keep_original, False, False)])
+    record = log.record(0)
+    if record.outcome == results.OUTCOME_FAILED and errors is not None:
+        error_type, message = log.errors[0]
+        errors.append(metrics.ErrorRecord(
+            file_path, operation_kind(operation, keep_original), record.errno, error_type, message))
+    return record
+
+
+def _apply_indexed(item, keep_original, preserve_metadata, overwrite, durable=False):
+    """Executor task: apply ``(index, operation)`` and time it
+
+    Returns ``(index, error, bytes_copied, duration, worker)`` where
+    ``error`` is ``None`` or an ``(errno, type name, message)`` tuple. With a
+    process pool only the index travels back to the parent, not the paths.
+    """
+    index, operation = item
+    started = time.perf_counter()
+    try:
+        copied = _run_operation(operation, keep_original, preserve_metadata, overwrite,
+                                durable)
+        error = None
+    except Exception as e:
+        copied = 0
+        error = (getattr(e, 'errno', None), type(e).__name__, str(e))
+    return index, error, copied, time.perf_counter() - started, metrics.worker_name()
+
+
+# Renames and removals can be issued relative to an open directory here
+DIR_FD_SUPPORTED = (
+    os.rename in os.supports_dir_fd
+    and os.link in os.supports_dir_fd
+    and os.unlink in os.supports_dir_fd
+    and hasattr(os, 'O_DIRECTORY')
+)
+
+
+def _open_directory(path):
+    return os.open(path or os.curdir, os.O_RDONLY | os.O_DIRECTORY)
+
+
+def _dir_fd_error(error, src_dir, src_name, dst_dir, dst_name):
+    """Describe a failed relative rename with full paths, like ``os.rename`` does"""
+    message = f"[Errno {error.errno}] {error.strerror}: {os.path.join(src_dir, src_name)!r}"
+    if dst_name is not None:
+        message += f" -> {os.path.join(dst_dir, dst_name)!r}"
+    return message
+
+
+def _apply_directory_task(task, overwrite):
+    """Executor task: apply renames grouped by directory
+
+    ``task`` is a list of ``(src_dir, dst_dir, entries)`` groups, where
+    ``entries`` holds ``(index, src_name, dst_name)`` tuples. Each directory
+    is opened once and every rename in it works on bare names relative to
+    that descriptor, so the kernel never walks the full path again. Returns
+    results shaped like :func:`_apply_indexed`.
+    """
+    results = []
+    append = results.append
+    rename = os.replace if overwrite else rename_no_replace
+    worker = metrics.worker_name()
+    clock = time.perf_counter
+    for src_dir, dst_dir, entries in task:
+        opened = clock()
+        try:
+            src_fd = dst_fd = _open_directory(src_dir)
+            if dst_dir is not None and dst_dir != src_dir:
+                try:
+                    dst_fd = _open_directory(dst_dir)
+                except OSError:
+                    os.close(src_fd)
+                    raise
+        except OSError as e:
+            error = (e.errno, type(e).__name__, str(e))
+            duration = (clock() - opened) / len(entries)
+            for entry in entries:
+                append((entry[0], error, 0, duration, worker))
+            continue
+        try:
+            for index, src_name, dst_name in entries:
+                started = clock()
+                try:
+                    if dst_name is None:
+                        os.unlink(src_name, dir_fd=src_fd)
+                    else:
+                        rename(src_name, dst_name, src_dir_fd=src_fd, dst_dir_fd=dst_fd)
+                    error = None
+                except OSError as e:
+                    error = (e.errno, type(e).__name__,
+                             _dir_fd_error(e, src_dir, src_name, dst_dir, dst_name))
+                append((index, error, 0, clock() - started, worker))
+        finally:
+            if dst_fd != src_fd:
+                os.close(dst_fd)
+            os.close(src_fd)
+    return results
+
+
+def directory_tasks(operations, chunksize):
+    """Group operations by parent directory into tasks of about ``chunksize``
+
+    Operations sharing a source and target directory become one group, split
+    so no group is larger than ``chunksize``; small groups are packed
+    together so directories holding a single file do not each cost a task.
+    """
+    split = os.path.split
+    groups = {}
+    for index, operation in enumerate(operations):
+        src_dir, src_name = split(operation.src)
+        if operation.dst is None:
+            dst_dir, dst_name = None, None
+        else:
+            dst_dir, dst_name = split(operation.dst)
+        key = (src_dir, dst_dir)
+        entries = groups.get(key)
+        if entries is None:
+            entries = groups[key] = []
+        entries.append((index, src_name, dst_name))
+
+    task = []
+    size = 0
+    for (src_dir, dst_dir), entries in groups.items():
+        for start in range(0, len(entries), chunksize):
+            part = entries[start:start + chunksize]
+            task.append((src_dir, dst_dir, part))
+            size += len(part)
+            if size >= chunksize:
+                yield task
+                task = []
+                size = 0
+    if task:
+        yield task
+
+
+# Upper bound on files per chunk, which also bounds how long a cancel waits
+MAX_CHUNKSIZE = 256
+
+
+def auto_chunksize(task_count, workers):
+    """Pick a chunksize giving each worker about four batches
+
+    Same heuristic as ``Pool.map``: large enough to amortise IPC, small
+    enough that the work still balances and progress keeps moving. Capped at
+    :data:`MAX_CHUNKSIZE` so cancelling never waits on huge batches.
+    """
+    chunksize, extra = divmod(task_count, workers * 4)
+    return min(MAX_CHUNKSIZE, max(1, chunksize + bool(extra)))
+
+
+class ConversionReport:
+    """Outcome of an executed plan"""
+
+    def __init__(self, total_count, operations=None):
+        self.total_count = total_count
+        self.operations = operations
+        self.results = results.ResultLog()
+        self.success_count = 0
+        self.failures = []  # (path, error) pairs
+        self.bytes_copied = 0
+        self.cancelled = False
+        self.elapsed = 0.0
+        self.backend = None
+        self.workers = 0
+        self.metrics = metrics.RunMetrics()
+
+    def record_batch(self, batch):
+        """Fold a batch of worker results, shaped like :func:`_apply_indexed`'s, in"""
+        log = self.results
+        start = len(log)
+        failed = log.extend(batch)
+        self.bytes_copied += sum(log.bytes[start:])
+        self.success_count += len(batch) - len(failed)
+        operations = self.operations
+        for position in failed:
+            self.failures.append((operations[log.indices[position]].src, log.errors[position][1]))
+
+    def withdraw(self, positions):
+        """Take the failed results at ``positions`` out of the report
+
+        The operations no longer count towards the totals, the failure list
+        or the failure metrics, as if they had never been part of the plan.
+        The time spent on them still shows in the latency and worker figures.
+        """
+        log = self.results
+        positions = [position for position in positions if position in log.errors]
+        if not positions:
+            return
+        paths = {self.operations[log.indices[position]].src for position in positions}
+        log.discard(positions)
+        self.failures = [failure for failure in self.failures if failure[0] not in paths]
+        self.total_count -= len(positions)
+        run_metrics = self.metrics
+        run_metrics.files -= len(positions)
+        run_metrics.failed -= len(positions)
+        run_metrics.errors = [record for record in run_metrics.errors
+                              if record.path not in paths]
+
+    @property
+    def completed(self):
+        """Operations that succeeded, in completion order"""
+        if self.operations is None:
+            return []
+        operations = self.operations
+        return [operations[index] for index in self.results.indices_with(results.OUTCOME_DONE)]
+
+    def failed_operations(self):
+        """Operations that failed, in plan order, e.g. to retry them"""
+        if self.operations is None:
+            return []
+        operations = self.operations
+        return [operations[index]
+                for index in sorted(self.results.indices_with(results.OUTCOME_FAILED))]
+
+    @property
+    def processed_count(self):
+        return self.success_count + len(self.failures)
+
+    @property
+    def not_started_count(self):
+        """Operations never attempted because the run was cancelled"""
+        return self.total_count - self.processed_count
+
+    @property
+    def files_per_second(self):
+        return self.processed_count / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_copied / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        if self.cancelled:
+            return (f"Cancelled - {self.processed_count}/{self.total_count} files processed"
+                    f" ({self.success_count} succeeded), {self.not_started_count} not started")
+        summary = f"Completed - {self.success_count}/{self.total_count} files processed successfully"
+        details = []
+        if self.elapsed:
+            details.append(f"{self.files_per_second:,.0f} files/s")
+        if self.bytes_copied:
+            details.append(f"{format_size(self.bytes_copied)} copied,"
+                           f" {format_size(self.bytes_per_second)}/s")
+        if self.metrics.sync_batches:
+            details.append(f"{self.metrics.synced_directories:,} directory syncs"
+                           f" in {self.metrics.sync_time:.2f}s")
+        if details:
+            summary += f" ({', '.join(details)})"
+        return summary
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a report from :meth:`to_dict` output
+
+        Completed operations are not part of the saved form, so
+        :attr:`completed` stays empty.
+        """
+        report = cls(data['total'])
+        report.success_count = data['succeeded']
+        report.failures = [(failure['path'], failure['error']) for failure in data['failed']]
+        report.bytes_copied = data['bytes_copied']
+        report.cancelled = data['cancelled']
+        report.elapsed = data['elapsed']
+        report.backend = data['backend']
+        report.workers = data['workers']
+        report.metrics = metrics.RunMetrics.from_dict(data['metrics'])
+        return report
+
+    def to_dict(self):
+        return {
+            'total': self.total_count,
+            'succeeded': self.success_count,
+            'failed': [{'path': path, 'error': error} for path, error in self.failures],
+            'not_started': self.not_started_count,
+            'bytes_copied': self.bytes_copied,
+            'bytes_per_second': self.bytes_per_second,
+            'files_per_second': self.files_per_second,
+            'cancelled': self.cancelled,
+            'elapsed': self.elapsed,
+            'backend': self.backend,
+            'workers': self.workers,
+            'metrics': self.metrics.to_dict(),
+        }
+
+
+def execute_plan(operations, keep_original=False, backend='auto', workers=None,
+                 progress=None, should_cancel=None, preserve_metadata=False,
+                 chunksize=None, total_bytes=None, overwrite=False, journal=None,
+                 progress_interval=None, sizes=None,
+                 max_large_copies=executors.LARGE_COPY_WORKERS, durable=False,
+                 sync_batch_size=durability.DEFAULT_BATCH_SIZE,
+                 sync_interval=durability.DEFAULT_INTERVAL, report_writer=None):
+    """Execute planned operations and return a :class:`ConversionReport`
+
+    ``backend`` is one of :data:`executors.BACKENDS`; with ``'auto'`` the
+    backend and worker count are chosen from the file count, ``total_bytes``
+    (if known) and whether files are copied or renamed.
+
+    ``progress`` is called as ``progress(current, total)`` each time a batch
+    of files completes, or at most once per ``progress_interval`` seconds
+    when that is set, and ``should_cancel`` is polled before each batch is handed to
+    a worker; both are optional. Cancelling stops new work from starting and
+    waits for the batches already running, so the report lists exactly the
+    files that were processed. ``chunksize`` sets how many files are sent to
+    a worker at once (picked automatically when ``None``). ``overwrite``
+    lets operations replace existing targets, as chosen by the preflight
+    planner. Renames are grouped by directory and applied relative to an
+    open directory descriptor where the platform supports it.
+
+    Copies are scheduled by size with a :class:`scheduler.CopySchedule`:
+    large files go first, longest first, and no more than
+    ``max_large_copies`` of them run at once. ``sizes`` lists the size of
+    each operation's source as found at scan time (``None`` where unknown,
+    in which case the file is stat-ed).
+
+    When a :class:`journal.Journal` is given, every completed operation is
+    recorded in it so an interrupted run can be resumed; the caller is
+    responsible for finishing the journal. Likewise every batch of results
+    is written to ``report_writer``, a :class:`results.ReportWriter`, as it
+    arrives, and the caller finishes it. The report keeps the result of
+    every operation in its :class:`results.ResultLog`.
+
+    In ``durable`` mode copied data is synced before it is published, and
+    the directories touched by completed operations are synced by a
+    :class:`durability.DirectorySyncer` once per ``sync_batch_size``
+    operations or ``sync_interval`` seconds. Operations only reach the
+    journal once their directories have been synced; if a directory cannot
+    be synced, its operations are left out of the journal and the error is
+    listed in the run metrics with the sync counts and times.
+    """
+    file_count = len(operations)
+    report = ConversionReport(file_count, operations)
+    run_metrics = report.metrics
+    started = time.perf_counter()
+
+    throttle = None
+    if progress and progress_interval:
+        progress = throttle = metrics.ProgressThrottle(progress, progress_interval)
+    kind = metrics.KIND_COPY if keep_original else metrics.KIND_RENAME
+
+    schedule = None
+    if keep_original:
+        schedule = scheduler.CopySchedule(operations, keep_original, sizes,
+                                          max_large=max_large_copies)
+        if total_bytes is None:
+            total_bytes = schedule.bytes
+
+    if backend == 'auto':
+        backend, workers = executors.select_backend(
+            file_count, total_bytes, keep_original, workers
+        )
+    elif file_count <= 1:
+        backend = 'serial'
+
+    syncer = None
+    if durable:
+        syncer = durability.DirectorySyncer(
+            keep_original, sync_batch_size, sync_interval,
+            on_durable=journal.record_done if journal is not None else None,
+            run_metrics=run_metrics,
+        )
+
+    by_directory = DIR_FD_SUPPORTED and not keep_original
+    with executors.create_executor(backend, workers) as executor:
+        report.backend = executor.name
+        report.workers = executor.workers
+        if not chunksize:
+            # A copy costs far more than handing it to a worker, and single
+            # files keep the wait after a cancel down to the copies running
+            chunksize = 1 if keep_original else auto_chunksize(file_count, executor.workers)
+
+        if by_directory:
+            # Each task is already a batch of directory groups
+            task = functools.partial(_apply_directory_task, overwrite=overwrite)
+            tasks = directory_tasks(operations, chunksize)
+            task_chunksize = 1
+        else:
+            task = functools.partial(
+                _apply_indexed,
+                keep_original=keep_original,
+                preserve_metadata=preserve_metadata,
+                overwrite=overwrite,
+                durable=durable,
+            )
+            tasks = schedule if schedule is not None else enumerate(operations)
+            task_chunksize = chunksize
+
+        def should_stop():
+            if not report.cancelled and should_cancel and should_cancel():
+                report.cancelled = True
+            return report.cancelled
+
+        # Results stream back in completion order, one batch per chunk.
+        # After a cancel the executor keeps yielding until in-flight work
+        # has drained, so every started operation gets recorded.
+        batches = executor.imap_batches(task, tasks, task_chunksize, should_stop)
+        if by_directory:
+            # Every directory task already returns a list of results
+            batches = (list(itertools.chain.from_iterable(batch)) for batch in batches)
+        try:
+            for batch in batches:
+                start = len(report.results)
+                report.record_batch(batch)
+                if report_writer is not None:
+                    report_writer.write(report.results, start)
+                for index, error, copied, duration, worker in batch:
+                    operation = operations[index]
+                    if schedule is not None:
+                        schedule.finished(index)
+                    if error is None:
+                        run_metrics.record(kind if operation.dst else metrics.KIND_REMOVE,
+                                           duration, copied, worker)
+                        if syncer is not None:
+                            syncer.add(index, operation)
+                        elif journal is not None:
+                            journal.record_done(index)
+                    else:
+                        error_kind = operation_kind(operation, keep_original)
+                        run_metrics.record(error_kind, duration, copied, worker,
+                                           metrics.ErrorRecord(operation.src, error_kind, *error))
+
+                # Update progress
+                if progress:
+                    progress(report.processed_count, file_count)
+        finally:
+            if syncer is not None:
+                # Sync whatever completed, even when the run is interrupted
+                syncer.sync()
+
+    if throttle is not None:
+        # A cancelled run never reaches the final update, so send the last one
+        throttle.flush()
+    report.elapsed = time.perf_counter() - started
+    run_metrics.stop()
+    return report
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer execution backends
+
+Renames and copies spend almost all of their time in system calls, so a
+process pool is rarely worth its start-up and pickling costs. This module
+offers serial, thread-pool and process-pool backends behind one small
+interface, and an "auto" mode that picks between them.
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+BACKENDS = ('auto', 'serial', 'thread', 'process')
+
+# Below this many files the cost of starting workers outweighs any gain
+SERIAL_THRESHOLD = 64
+
+# Rename counts at which a forked process pool starts to pay off, because
+# the per-file Python overhead (which holds the GIL) dominates
+PROCESS_THRESHOLD = 100000
+
+# Average file size above which copies are disk bound and extra threads only
+# add seeking
+LARGE_COPY_SIZE = 8 * 1024 * 1024
+LARGE_COPY_WORKERS = 4
+
+# Chunks allowed in flight per worker. Submission blocks beyond this, so
+# memory stays flat however many tasks there are, and a cancelled run only
+# has to wait for this much work to drain.
+PENDING_PER_WORKER = 2
+
+# Yielded by a task iterable to hold back dispatch until a chunk in flight
+# completes, e.g. while a cap on concurrent large copies is reached. With
+# nothing in flight there is nothing to wait for and it is skipped.
+WAIT = object()
+
+
+def default_workers(backend):
+    """Return the default worker count for a backend"""
+    cpus = multiprocessing.cpu_count()
+    if backend == 'thread':
+        # Same default as concurrent.futures for I/O bound work
+        return min(32, cpus + 4)
+    if backend == 'process':
+        return cpus
+    return 1
+
+
+def select_backend(file_count, total_bytes=None, keep_original=False, workers=None):
+    """Choose a backend and worker count for a job
+
+    Returns a ``(backend, workers)`` tuple. ``total_bytes`` is only used for
+    copies and may be ``None`` when sizes are unknown.
+    """
+    if file_count < SERIAL_THRESHOLD:
+        return 'serial', 1
+
+    if keep_original:
+        workers = workers or default_workers('thread')
+        if total_bytes and total_bytes / file_count >= LARGE_COPY_SIZE:
+            workers = min(workers, LARGE_COPY_WORKERS)
+        return 'thread', workers
+
+    if (file_count >= PROCESS_THRESHOLD
+            and multiprocessing.get_start_method(allow_none=True) in (None, 'fork')
+            and hasattr(os, 'fork')):
+        return 'process', workers or default_workers('process')
+
+    return 'thread', workers or default_workers('thread')
+
+
+def _run_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def _chunks(iterable, chunksize):
+    chunk = []
+    for item in iterable:
+        if item is WAIT:
+            if chunk:
+                yield chunk
+                chunk = []
+            yield WAIT
+            continue
+        chunk.append(item)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class SerialExecutor:
+    """Runs every task in the calling thread
+
+    Every executor offers ``imap_batches(func, iterable, chunksize,
+    should_stop)``, which yields the list of results of each chunk as it
+    completes, and ``imap_unordered`` with the same arguments, which yields
+    the results one at a time. ``should_stop`` is polled before each chunk
+    is handed out; once it returns true nothing new is started, the chunks
+    already running finish, and their results are still yielded. Iterating
+    to the end therefore always accounts for every task that was started.
+    """
+    name = 'serial'
+
+    def __init__(self, workers=1):
+        self.workers = 1
+
+    def max_pending(self):
+        """Return how many chunks may be in flight at once"""
+        return self.workers * PENDING_PER_WORKER
+
+    def imap_unordered(self, func, iterable, chunksize=1, should_stop=None):
+        for batch in self.imap_batches(func, iterable, chunksize, should_stop):
+            yield from batch
+
+    def imap_batches(self, func, iterable, chunksize=1, should_stop=None):
+        # Single results, so progress and cancelling stay per task. The stop
+        # check comes before the next task is taken, so none is dropped
+        if should_stop and should_stop():
+            return
+        for item in iterable:
+            if item is WAIT:
+                # Nothing runs in parallel here, so there is nothing to wait for
+                continue
+            yield [func(item)]
+            if should_stop and should_stop():
+                return
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ThreadExecutor(SerialExecutor):
+    """Runs chunks of tasks on a thread pool"""
+    name = 'thread'
+
+    def __init__(self, workers=None):
+        self.workers = workers or default_workers('thread')
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def imap_batches(self, func, iterable, chunksize=1, should_stop=None):
+        chunks = _chunks(iterable, chunksize)
+        limit = self.max_pending()
+        pending = set()
+        try:
+            while True:
+                # Top the window up, unless a stop was requested
+                while len(pending) < limit and not (should_stop and should_stop()):
+                    chunk = next(chunks, None)
+                    if chunk is WAIT:
+                        if pending:
+                            break
+                        continue
+                    if chunk is None:
+                        break
+                    pending.add(self._pool.submit(_run_chunk, func, chunk))
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def _init_worker():
+    """Process pool initializer
+
+    Workers only need the Qt-free engine; importing it here up front means
+    the first task does not pay for it. Ctrl+C is left to the parent, which
+    decides whether to cancel.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from . import engine  # noqa: F401
+
+
+class WarmPool:
+    """A process pool started on first use and kept alive between jobs
+
+    Starting processes and re-importing modules dominates short jobs, so the
+    pool is reused until the requested worker count changes or it is shut
+    down. Access is serialised so one job uses the pool at a time.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._workers = 0
+        self._lock = threading.RLock()
+
+    @property
+    def workers(self):
+        return self._workers if self._pool is not None else 0
+
+    def acquire(self, workers):
+        """Lock the pool for one job and return it, (re)starting it if needed"""
+        self._lock.acquire()
+        try:
+            if self._pool is not None and workers != self._workers:
+                self._stop()
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(processes=workers, initializer=_init_worker)
+                self._workers = workers
+            return self._pool
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def release(self, discard=False):
+        """Give the pool back; ``discard`` kills it if work may still be queued"""
+        try:
+            if discard:
+                self._stop()
+        finally:
+            self._lock.release()
+
+    def _stop(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._workers = 0
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            self._stop()
+
+
+# Shared by every process-backed job in this interpreter
+warm_pool = WarmPool()
+atexit.register(warm_pool.shutdown)
+
+
+class ProcessExecutor(SerialExecutor):
+    """Runs chunks of tasks on the shared warm process pool"""
+    name = 'process'
+
+    def __init__(self, workers=None, pool=None):
+        self.workers = workers or default_workers('process')
+        self._warm_pool = pool or warm_pool
+        self._pool = self._warm_pool.acquire(self.workers)
+        self._finished = True
+
+    def imap_batches(self, func, iterable, chunksize=1, should_stop=None):
+        # Chunks go out through apply_async so no more than the window is
+        # ever queued on the pool; a stop then simply lets the workers run
+        # dry instead of terminating them mid-copy
+        self._finished = False
+        chunks = _chunks(iterable, chunksize)
+        limit = self.max_pending()
+        results = queue.SimpleQueue()
+        in_flight = 0
+        while True:
+            while in_flight < limit and not (should_stop and should_stop()):
+                chunk = next(chunks, None)
+                if chunk is WAIT:
+                    if in_flight:
+                        break
+                    continue
+                if chunk is None:
+                    break
+                self._pool.apply_async(_run_chunk, (func, chunk),
+                                       callback=results.put, error_callback=results.put)
+                in_flight += 1
+            if not in_flight:
+                break
+            result = results.get()
+            in_flight -= 1
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+        self._finished = True
+
+    def close(self):
+        if self._pool is not None:
+            # An abandoned run would leave its queued chunks on the shared
+            # pool, so throw that pool away rather than reuse it
+            self._warm_pool.release(discard=not self._finished)
+            self._pool = None
+
+
+_EXECUTORS = {
+    'serial': SerialExecutor,
+    'thread': ThreadExecutor,
+    'process': ProcessExecutor,
+}
+
+
+def create_executor(backend, workers=None):
+    """Create an executor for a concrete (non-auto) backend name"""
+    try:
+        executor_class = _EXECUTORS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown execution backend: {backend}") from None
+    return executor_class(workers)
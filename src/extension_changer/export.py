@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer plan export
+
+Streams a planned conversion to CSV or JSON Lines one row at a time, so the
+full plan can be written out no matter how many files it covers.
+"""
+
+import csv
+import json
+import os
+
+
+PLAN_FIELDS = ('source', 'target', 'size', 'status')
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def format_for_path(path):
+    """Guess the export format from a file name (defaults to CSV)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_plan_rows(operations, size_of=None, status_of=None):
+    """Yield one ``(source, target, size, status)`` tuple per operation
+
+    ``size_of`` maps a source path to its size and ``status_of`` maps an
+    operation index to its status; both are optional.
+    """
+    for i, operation in enumerate(operations):
+        size = size_of(operation.src) if size_of else None
+        status = status_of(i) if status_of else ''
+        yield operation.src, operation.dst, size, status
+
+
+def write_plan(fileobj, rows, fmt='csv'):
+    """Write plan rows to an open text file and return how many were written"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(fileobj)
+        writer.writerow(PLAN_FIELDS)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+            count += 1
+    elif fmt == 'jsonl':
+        for row in rows:
+            fileobj.write(json.dumps(dict(zip(PLAN_FIELDS, row))))
+            fileobj.write('\n')
+            count += 1
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return count
+
+
+def export_plan(path, rows, fmt=None):
+    """Write plan rows to ``path`` and return how many were written"""
+    fmt = fmt or format_for_path(path)
+    with open(path, 'w', newline='', encoding='utf-8') as fileobj:
+        return write_plan(fileobj, rows, fmt)
@@ -6,27 +6,31 @@ Enhanced Extension Changer
 Created by Naveen Vasudevan <naveenovan@gmail.com>
 GitHub: https://github.com/kuroonai/exchange
 
-A cross-platform utility for batch changing file extensions with multiprocessing support.
+A cross-platform utility for batch changing file extensions with parallel processing support.
 """
 
 import os
-import sys
-import pathlib
-import multiprocessing
-from contextlib import contextmanager
-import threading
 import time
 
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
+    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QLabel, QLineEdit, QPushButton, QProgressBar, QFileDialog, 
-    QComboBox, QCheckBox, QGroupBox, QSlider, QTableWidget, 
-    QTableWidgetItem, QDialog, QScrollArea, QSizePolicy, QFrame,
+    QComboBox, QCheckBox, QGroupBox, QSlider, QFrame,
     QMessageBox
 )
-from PySide6.QtCore import Qt, QThread, Signal, Slot, QSize
+from PySide6.QtCore import Qt, QThread, QTimer, Signal, Slot
 from PySide6.QtGui import QIcon
 
+from . import engine
+from . import executors
+from . import journal
+from . import metrics
+from . import planner
+from . import results
+from . import sniffer
+from .index import ExtensionIndex
+from .rules import Rule, RuleError, RuleSet
+
 
 class ConversionThread(QThread):
     """Worker thread for file conversion operations"""
@@ -34,131 +38,199 @@ class ConversionThread(QThread):
     status_updated = Signal(str)
     conversion_finished = Signal(int, int)  # success_count, total_count
     
-    def __init__(self, files, from_ext, to_ext, keep_original, use_mp, cpu_cores, rename_func):
+    def __init__(self, operations, keep_original, backend, workers,
+                 preserve_metadata=False, total_bytes=None, overwrite=False,
+                 journal_path=None, job=None, sizes=None, durable=False):
         super().__init__()
-        self.files = files
-        self.from_ext = from_ext
-        self.to_ext = to_ext
+        self.operations = operations
+        self.sizes = sizes  # scan-time size of each source, for copy scheduling
         self.keep_original = keep_original
-        self.use_mp = use_mp
-        self.cpu_cores = cpu_cores
-        self.rename_func = rename_func
+        self.preserve_metadata = preserve_metadata
+        self.durable = durable  # sync data and folders to disk as files complete
+        self.backend = backend
+        self.workers = workers
+        self.total_bytes = total_bytes
+        self.overwrite = overwrite
+        self.journal_path = journal_path
+        self.job = job  # an open journal when resuming or undoing
         self.cancel = False
-        
-    @contextmanager
-    def poolcontext(self, *args, **kwargs):
-        pool = multiprocessing.Pool(*args, **kwargs)
-        yield pool
-        pool.terminate()
+        self.report = None
         
     def run(self):
-        """Convert files in background thread"""
-        if not self.to_ext.startswith('.'):
-            self.to_ext = '.' + self.to_ext
-            
-        success_count = 0
-        file_count = len(self.files)
-        
-        self.status_updated.emit("Processing files...")
-        
-        if self.use_mp and file_count > 1:
-            # Use multiprocessing for multiple files
-            with self.poolcontext(processes=int(self.cpu_cores)) as pool:
-                results = []
-                for i, file in enumerate(self.files):
-                    if self.cancel:
-                        break
-                    result = pool.apply_async(
-                        self.rename_func, 
-                        (file, self.from_ext, self.to_ext, self.keep_original)
-                    )
-                    results.append(result)
-                    
-                    # Update progress
-                    self.progress_updated.emit(i+1, file_count)
-                
-                # Get results
-                for result in results:
-                    if result.get():
-                        success_count += 1
-        else:
-            # Process files sequentially
-            for i, file in enumerate(self.files):
-                if self.cancel:
-                    break
-                if self.rename_func(file, self.from_ext, self.to_ext, self.keep_original):
-                    success_count += 1
-                
-                # Update progress
-                self.progress_updated.emit(i+1, file_count)
-        
-        if self.cancel:
-            self.status_updated.emit("Operation cancelled")
-        else:
-            self.status_updated.emit(f"Completed - {success_count}/{file_count} files processed successfully")
+        """Convert files in background thread
+        
+        ``conversion_finished`` is always emitted, even if the job fails, so
+        the window never stays stuck in processing mode.
+        """
+        job = self.job
+        status = "Processing files..."
+        if job is None and self.journal_path:
+            self.status_updated.emit("Writing journal...")
+            try:
+                job = journal.Journal.create(
+                    self.journal_path, self.operations, self.keep_original, self.overwrite
+                )
+                self.job = job
+            except OSError as e:
+                status = f"Processing files without a journal (could not create it: {e})..."
         
-        self.conversion_finished.emit(success_count, file_count)
-
-
-class PreviewDialog(QDialog):
-    """Dialog for previewing file changes"""
-    def __init__(self, files, from_ext, to_ext, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Preview Changes")
-        self.resize(600, 400)
-        
-        layout = QVBoxLayout()
-        
-        # Header
-        header_label = QLabel(f"Preview of extension changes ({from_ext} → {to_ext})")
-        layout.addWidget(header_label)
-        
-        # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(2)
-        self.table.setHorizontalHeaderLabels(["Original Filename", "New Filename"])
-        self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.verticalHeader().setVisible(False)
-        
-        if not to_ext.startswith('.'):
-            to_ext = '.' + to_ext
-            
-        # Limit preview to first 100 files
-        preview_files = files[:100]
-        self.table.setRowCount(len(preview_files))
-        
-        for row, file in enumerate(preview_files):
-            path = pathlib.Path(file)
-            old_name = path.name
-            new_name = path.stem + to_ext
-            
-            self.table.setItem(row, 0, QTableWidgetItem(old_name))
-            self.table.setItem(row, 1, QTableWidgetItem(new_name))
+        self.status_updated.emit(status)
         
-        self.table.resizeColumnsToContents()
-        layout.addWidget(self.table)
+        try:
+            self.report = engine.execute_plan(
+                self.operations,
+                keep_original=self.keep_original,
+                backend=self.backend,
+                workers=self.workers,
+                progress=self.progress_updated.emit,
+                should_cancel=lambda: self.cancel,
+                preserve_metadata=self.preserve_metadata,
+                total_bytes=self.total_bytes,
+                overwrite=self.overwrite,
+                journal=job,
+                progress_interval=metrics.PROGRESS_INTERVAL,
+                sizes=self.sizes,
+                durable=self.durable,
+            )
+            status = self.report.summary()
+        except Exception as e:
+            status = f"Conversion failed: {e}"
         
-        # Footer
-        if len(files) > 100:
-            footer_text = f"Showing first 100 of {len(files)} files"
+        if job is not None:
+            try:
+                if self.report is None:
+                    job.close()  # Leave the job resumable
+                else:
+                    job.finish(cancelled=self.report.cancelled)
+            except OSError as e:
+                status = f"{status} (could not finish journal: {e})"
+            if self.journal_path:
+                # Old finished journals are not needed for resume or undo
+                journal.prune_journals(os.path.dirname(self.journal_path))
+        
+        self.status_updated.emit(status)
+        if self.report is None:
+            self.conversion_finished.emit(0, len(self.operations))
         else:
-            footer_text = f"Showing all {len(files)} files"
-        footer_label = QLabel(footer_text)
-        layout.addWidget(footer_label)
+            self.conversion_finished.emit(self.report.success_count, self.report.total_count)
+
+
+class ScanThread(QThread):
+    """Worker thread that lists a folder and streams the files it finds"""
+    files_found = Signal(object)  # list of (path, size) scan entries
+    scan_finished = Signal(int, bool)  # file_count, cancelled
+    scan_failed = Signal(str)
+    cache_failed = Signal(str)  # the scan goes on without the cache
+    
+    def __init__(self, folder_path, recursive=False, batch_size=5000, interval=0.05,
+                 with_size=False, use_cache=False, rescan=False):
+        super().__init__()
+        self.folder_path = folder_path
+        self.recursive = recursive
+        self.with_size = with_size
+        self.use_cache = use_cache
+        self.rescan = rescan
+        self.scan_errors = OSError
+        self.batch_size = batch_size
+        self.interval = interval
+        self.cancel = False
         
-        # Close button
-        close_button = QPushButton("Close")
-        close_button.clicked.connect(self.accept)
+    def run(self):
+        """Scan the folder, emitting batches by size or elapsed time"""
+        batch = []
+        file_count = 0
+        # Send the very first file straight away so the window reacts immediately
+        last_emit = float('-inf')
+        
+        cache = self.open_cache()
+        entries = None
+        try:
+            scan = cache.scan if cache is not None else engine.scanner.scan
+            entries = scan(self.folder_path, recursive=self.recursive, with_size=self.with_size)
+            for entry in entries:
+                if self.cancel:
+                    break
+                batch.append(entry)
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now - last_emit >= self.interval:
+                    file_count += len(batch)
+                    self.files_found.emit(batch)
+                    batch = []
+                    last_emit = now
+        except self.scan_errors as e:
+            self.scan_failed.emit(str(e))
+            return
+        finally:
+            if entries is not None:
+                entries.close()
+            if cache is not None:
+                cache.close()
         
-        button_layout = QHBoxLayout()
-        button_layout.addStretch()
-        button_layout.addWidget(close_button)
-        layout.addLayout(button_layout)
+        if batch and not self.cancel:
+            file_count += len(batch)
+            self.files_found.emit(batch)
+        
+        self.scan_finished.emit(file_count, self.cancel)
+    
+    def open_cache(self):
+        """Open the scan cache in this thread, or return ``None`` to scan without it"""
+        if not self.use_cache:
+            return None
+        # Loaded here so sqlite3 stays out of the window's startup
+        from . import scancache
+        try:
+            cache = scancache.ScanCache()
+            if self.rescan:
+                cache.invalidate(self.folder_path)
+        except scancache.CACHE_ERRORS as e:
+            self.cache_failed.emit(str(e))
+            return None
+        self.scan_errors = scancache.CACHE_ERRORS
+        return cache
+
+
+class DetectThread(QThread):
+    """Worker thread that reads file headers to find each file's real type"""
+    progress_updated = Signal(int, int)  # current, total
+    detection_finished = Signal(object, bool)  # detected types, cancelled
+    detection_failed = Signal(str)
+    
+    def __init__(self, paths, backend, workers, cache, extension):
+        super().__init__()
+        self.paths = paths
+        self.backend = backend
+        self.workers = workers
+        self.cache = cache
+        self.extension = extension  # the extension whose files are checked
+        self.cancel = False
         
-        self.setLayout(layout)
+    def run(self):
+        """Detect the type of every file, reporting progress as headers are read"""
+        try:
+            detected = sniffer.detect_types(
+                self.paths,
+                self.backend,
+                self.workers,
+                cache=self.cache,
+                should_cancel=lambda: self.cancel,
+                progress=self.progress_updated.emit,
+                progress_interval=metrics.PROGRESS_INTERVAL,
+            )
+        except Exception as e:
+            self.detection_failed.emit(str(e))
+            return
+        self.detection_finished.emit(detected, self.cancel)
 
 
 class ExtensionChanger(QMainWindow):
+    # Labels shown in the "Run files on" dropdown and their engine backends
+    BACKEND_CHOICES = [
+        ("Automatic (recommended)", 'auto'),
+        ("Threads", 'thread'),
+        ("Processes", 'process'),
+        ("Single thread", 'serial'),
+    ]
+    
     def __init__(self, icon_path=None):
         super().__init__()
         
@@ -166,22 +238,20 @@ class ExtensionChanger(QMainWindow):
         self.setMinimumSize(600, 500)
         
         # Set icon if available
-        if icon_path and os.path.exists(str(icon_path)):
-            try:
-                icon = QIcon(str(icon_path))
-                self.setWindowIcon(icon)
-                print(f"Icon set from path: {icon_path}")
-                print(f"Icon is null: {icon.isNull()}")
-            except Exception as e:
-                print(f"Error setting icon: {e}")
-        else:
-            print(f"Icon path not valid: {icon_path}")
+        if icon_path:
+            self.setWindowIcon(QIcon(str(icon_path)))
         
         # Initialize variables
-        self.files = []
+        self.index = ExtensionIndex()
+        self.sniff_cache = sniffer.SniffCache()
         self.extensions = set()
         self.processing = False
         self.worker_thread = None
+        self.scan_thread = None
+        self.detect_thread = None
+        self.detect_then = None  # called with the plan once detection finishes
+        self.last_journal = None
+        self.conversion_started = 0.0
         
         # Central widget
         central_widget = QWidget()
@@ -211,12 +281,25 @@ class ExtensionChanger(QMainWindow):
         self.folder_path.setReadOnly(True)
         browse_folder_button = QPushButton("Browse Folder")
         browse_folder_button.clicked.connect(self.browse_folder)
+        rescan_button = QPushButton("Rescan")
+        rescan_button.setToolTip("List the folder again, ignoring cached listings")
+        rescan_button.clicked.connect(self.rescan_folder)
         
         source_layout.addWidget(source_label)
         source_layout.addWidget(self.folder_path)
         source_layout.addWidget(browse_folder_button)
+        source_layout.addWidget(rescan_button)
         main_layout.addLayout(source_layout)
         
+        # Recursive scan checkbox
+        self.recursive = QCheckBox("Include subfolders")
+        main_layout.addWidget(self.recursive)
+        
+        # Scan cache checkbox
+        self.use_scan_cache = QCheckBox("Remember folder listings (faster reopening of large folders)")
+        self.use_scan_cache.setToolTip("Keep folder listings in a cache so unchanged folders are not listed again")
+        main_layout.addWidget(self.use_scan_cache)
+        
         # Files section
         files_layout = QHBoxLayout()
         files_label = QLabel("Or select files:")
@@ -264,10 +347,58 @@ class ExtensionChanger(QMainWindow):
         to_layout.addStretch()
         ext_layout.addLayout(to_layout)
         
+        # Extra rules, applied together with From/To in one pass
+        rules_layout = QHBoxLayout()
+        rules_label = QLabel("More rules:")
+        rules_label.setMinimumWidth(80)
+        self.rules_edit = QLineEdit()
+        self.rules_edit.setPlaceholderText(".jpeg=.jpg; i:.JPG=.jpg; glob:*.tif=.tiff; re:PATTERN=TARGET")
+        self.rules_edit.setToolTip(
+            "Optional extra mappings, separated by semicolons.\n"
+            "Prefix i: for case-insensitive, glob: for file name patterns,\n"
+            "re: for regular expressions. The first matching rule wins."
+        )
+        
+        rules_layout.addWidget(rules_label)
+        rules_layout.addWidget(self.rules_edit)
+        ext_layout.addLayout(rules_layout)
+        
+        # Content detection checkbox
+        self.detect_content = QCheckBox("Fix extensions from file content")
+        self.detect_content.setToolTip(
+            "Read the first bytes of each file with the selected extension and\n"
+            "rename the ones whose content is of another type, e.g. a PNG saved as .jpg"
+        )
+        self.detect_content.toggled.connect(self.update_detect_mode)
+        ext_layout.addWidget(self.detect_content)
+        
         # Keep original checkbox
         self.keep_original = QCheckBox("Keep original files (create copies)")
         ext_layout.addWidget(self.keep_original)
         
+        # Conflict policy
+        conflict_layout = QHBoxLayout()
+        conflict_label = QLabel("If target exists:")
+        self.conflict_policy = QComboBox()
+        self.conflict_policy.addItem("Skip the file", planner.POLICY_SKIP)
+        self.conflict_policy.addItem("Add a number to the new name", planner.POLICY_SUFFIX)
+        self.conflict_policy.addItem("Overwrite the existing file", planner.POLICY_OVERWRITE)
+        
+        conflict_layout.addWidget(conflict_label)
+        conflict_layout.addWidget(self.conflict_policy)
+        conflict_layout.addStretch()
+        ext_layout.addLayout(conflict_layout)
+        
+        # Preserve metadata checkbox (only meaningful when copying)
+        self.preserve_metadata = QCheckBox("Preserve timestamps and permissions on copies")
+        self.preserve_metadata.setEnabled(False)
+        self.keep_original.toggled.connect(self.preserve_metadata.setEnabled)
+        ext_layout.addWidget(self.preserve_metadata)
+        
+        # Durable mode checkbox
+        self.durable = QCheckBox("Sync changes to disk (slower, survives power loss)")
+        ext_layout.addWidget(self.durable)
+        
         ext_group.setLayout(ext_layout)
         main_layout.addWidget(ext_group)
         
@@ -281,26 +412,35 @@ class ExtensionChanger(QMainWindow):
         adv_group = QGroupBox("Advanced Options")
         adv_layout = QVBoxLayout()
         
-        # Multiprocessing checkbox
-        self.use_mp = QCheckBox("Use multiprocessing (faster for many files)")
-        self.use_mp.setChecked(True)
-        adv_layout.addWidget(self.use_mp)
-        
-        # CPU cores slider
-        cores_layout = QHBoxLayout()
-        cores_label = QLabel("CPU cores to use:")
-        self.cpu_cores = QSlider(Qt.Horizontal)
-        self.cpu_cores.setMinimum(1)
-        self.cpu_cores.setMaximum(multiprocessing.cpu_count())
-        self.cpu_cores.setValue(multiprocessing.cpu_count())
-        self.cores_value = QLabel(str(self.cpu_cores.value()))
-        
-        self.cpu_cores.valueChanged.connect(lambda v: self.cores_value.setText(str(v)))
-        
-        cores_layout.addWidget(cores_label)
-        cores_layout.addWidget(self.cpu_cores)
-        cores_layout.addWidget(self.cores_value)
-        adv_layout.addLayout(cores_layout)
+        # Execution backend
+        backend_layout = QHBoxLayout()
+        backend_label = QLabel("Run files on:")
+        self.backend = QComboBox()
+        for label, backend in self.BACKEND_CHOICES:
+            self.backend.addItem(label, backend)
+        self.backend.currentIndexChanged.connect(self.update_workers_enabled)
+        
+        backend_layout.addWidget(backend_label)
+        backend_layout.addWidget(self.backend)
+        backend_layout.addStretch()
+        adv_layout.addLayout(backend_layout)
+        
+        # Workers slider
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Workers:")
+        self.workers = QSlider(Qt.Horizontal)
+        self.workers.setMinimum(1)
+        self.workers.setMaximum(executors.default_workers('thread'))
+        self.workers.setValue(executors.default_workers('process'))
+        self.workers_value = QLabel(str(self.workers.value()))
+        
+        self.workers.valueChanged.connect(lambda v: self.workers_value.setText(str(v)))
+        
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers)
+        workers_layout.addWidget(self.workers_value)
+        adv_layout.addLayout(workers_layout)
+        self.update_workers_enabled()
         
         adv_group.setLayout(adv_layout)
         main_layout.addWidget(adv_group)
@@ -339,6 +479,14 @@ class ExtensionChanger(QMainWindow):
         self.preview_button = QPushButton("Preview")
         self.preview_button.clicked.connect(self.preview_changes)
         
+        self.undo_button = QPushButton("Undo Last")
+        self.undo_button.clicked.connect(self.undo_last_conversion)
+        self.undo_button.setVisible(False)
+        
+        self.failures_button = QPushButton("Show Failures")
+        self.failures_button.clicked.connect(self.show_failures)
+        self.failures_button.setVisible(False)
+        
         self.cancel_button = QPushButton("Cancel")
         self.cancel_button.clicked.connect(self.cancel_operation)
         self.cancel_button.setVisible(False)
@@ -348,11 +496,20 @@ class ExtensionChanger(QMainWindow):
         
         buttons_layout.addWidget(self.convert_button)
         buttons_layout.addWidget(self.preview_button)
+        buttons_layout.addWidget(self.undo_button)
+        buttons_layout.addWidget(self.failures_button)
         buttons_layout.addWidget(self.cancel_button)
         buttons_layout.addStretch()
         buttons_layout.addWidget(self.exit_button)
         
         main_layout.addLayout(buttons_layout)
+        
+        # Look for a job that was cut short once the window is up
+        QTimer.singleShot(0, self.check_interrupted_jobs)
+    
+    def update_workers_enabled(self):
+        """Only let the worker count be chosen for pool backends"""
+        self.workers.setEnabled(self.backend.currentData() in ('thread', 'process'))
     
     def browse_folder(self):
         """Open folder browser dialog"""
@@ -360,166 +517,491 @@ class ExtensionChanger(QMainWindow):
         if folder_path:
             self.folder_path.setText(folder_path)
             self.files_path.clear()  # Clear files selection
-            
-            try:
-                self.files = [
-                    os.path.join(folder_path, f) 
-                    for f in os.listdir(folder_path)
-                    if os.path.isfile(os.path.join(folder_path, f))
-                ]
-                self.update_extension_list()
-                self.status_label.setText(f"Status: Found {len(self.files)} files in folder")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error accessing folder: {e}")
+            self.start_scan(folder_path)
+    
+    def rescan_folder(self):
+        """Scan the current folder again from disk, replacing its cached listings"""
+        folder_path = self.folder_path.text()
+        if folder_path:
+            self.start_scan(folder_path, rescan=True)
+    
+    def start_scan(self, folder_path, rescan=False):
+        """List a folder in the background, filling the window as files arrive"""
+        self.stop_scan()
+        self.stop_detection()
+        
+        self.index = ExtensionIndex()
+        self.refresh_extension_combo()
+        self.status_label.setText("Status: Scanning folder...")
+        
+        self.convert_button.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.cancel_button.setVisible(True)
+        
+        # Sizes cost a stat per file; only copies use them, to schedule the work
+        self.scan_thread = ScanThread(folder_path, self.recursive.isChecked(),
+                                      with_size=self.keep_original.isChecked(),
+                                      use_cache=self.use_scan_cache.isChecked(), rescan=rescan)
+        self.scan_thread.files_found.connect(self.add_scanned_files)
+        self.scan_thread.scan_finished.connect(self.scan_finished)
+        self.scan_thread.scan_failed.connect(self.scan_failed)
+        self.scan_thread.cache_failed.connect(self.scan_cache_failed)
+        self.scan_thread.start()
+    
+    def stop_scan(self):
+        """Cancel a running folder scan and wait for its thread to exit"""
+        if self.scan_thread is not None:
+            self.scan_thread.cancel = True
+            self.scan_thread.wait()
+            self.scan_thread = None
+            self.convert_button.setEnabled(True)
+            self.preview_button.setEnabled(True)
+            if not self.processing:
+                self.cancel_button.setVisible(False)
+    
+    @Slot(object)
+    def add_scanned_files(self, batch):
+        """Merge a batch of scanned files into the file list"""
+        if self.sender() is not self.scan_thread:
+            return  # Late batch from a scan that was replaced
+        if self.index.add_entries(batch):
+            self.refresh_extension_combo()
+        
+        current_ext = self.from_ext.currentText()
+        self.status_label.setText(
+            f"Status: Scanning... {len(self.index)} files found, "
+            f"{self.index.count(current_ext)} match {current_ext or 'the selected extension'}"
+        )
+    
+    @Slot(int, bool)
+    def scan_finished(self, file_count, cancelled):
+        """Restore the window once a folder scan ends"""
+        if self.sender() is not self.scan_thread:
+            return
+        self.scan_thread = None
+        self.convert_button.setEnabled(True)
+        self.preview_button.setEnabled(True)
+        if not self.processing:
+            self.cancel_button.setVisible(False)
+        
+        if cancelled:
+            self.status_label.setText(f"Status: Scan cancelled - {len(self.index)} files found")
+        else:
+            self.status_label.setText(f"Status: Found {len(self.index)} files in folder")
+    
+    @Slot(str)
+    def scan_failed(self, error):
+        """Report a folder that could not be listed"""
+        if self.sender() is not self.scan_thread:
+            return
+        self.scan_finished(len(self.index), True)
+        QMessageBox.critical(self, "Error", f"Error accessing folder: {error}")
+    
+    @Slot(str)
+    def scan_cache_failed(self, error):
+        """Say that the scan cache could not be opened; the scan carries on without it"""
+        if self.sender() is not self.scan_thread:
+            return
+        self.status_label.setText(f"Status: Scan cache unavailable ({error}), scanning folder...")
     
     def browse_files(self):
         """Open file browser dialog"""
         files, _ = QFileDialog.getOpenFileNames(self, "Select Files")
         if files:
-            self.files = files
+            self.stop_scan()
+            self.index = ExtensionIndex()
+            self.index.add_paths(files)
             self.files_path.setText(f"{len(files)} files selected")
             self.folder_path.clear()  # Clear folder selection
             
-            self.update_extension_list()
-            self.status_label.setText(f"Status: Selected {len(self.files)} files")
+            self.refresh_extension_combo()
+            self.status_label.setText(f"Status: Selected {len(self.index)} files")
     
-    def update_extension_list(self):
-        """Update the extension dropdown with available extensions"""
-        self.extensions = set()
-        
-        for file in self.files:
-            ext = pathlib.Path(file).suffix
-            if ext:
-                self.extensions.add(ext)
+    def refresh_extension_combo(self):
+        """Rebuild the dropdown from the extension counts, keeping the selection"""
+        current_ext = self.from_ext.currentText()
+        ext_list = self.index.extensions()
+        self.extensions = set(ext_list)
         
+        self.from_ext.blockSignals(True)
         self.from_ext.clear()
-        ext_list = sorted(list(self.extensions))
         self.from_ext.addItems(ext_list)
+        self.from_ext.blockSignals(False)
         
-        if ext_list:
+        if current_ext in self.extensions:
+            self.from_ext.setCurrentIndex(ext_list.index(current_ext))
+        elif ext_list:
             self.from_ext.setCurrentIndex(0)
     
     def update_matching_files(self):
         """Update count of matching files"""
         current_ext = self.from_ext.currentText()
         if current_ext:
-            matching_files = self.get_files_with_extension(current_ext)
-            self.status_label.setText(f"Status: {len(matching_files)} files match the selected extension")
+            # Counts are kept in the index, no need to rescan the file list
+            match_count = self.index.count(current_ext)
+            total_bytes = self.index.total_bytes(current_ext)
+            size_text = f" ({engine.format_size(total_bytes)})" if total_bytes else ""
+            self.status_label.setText(
+                f"Status: {match_count} files match the selected extension{size_text}"
+            )
     
     def get_files_with_extension(self, extension):
-        """Filter files by extension"""
-        return [f for f in self.files if f.endswith(extension)]
+        """Filter files by extension, as a view that shares the index's storage"""
+        return self.index.files(extension)
     
     @staticmethod
     def rename_file(file_path, from_ext, to_ext, keep_original):
-        """Rename a single file's extension"""
-        try:
-            path = pathlib.Path(file_path)
-            if keep_original:
-                # Create a copy instead of renaming
-                new_path = path.with_suffix(to_ext)
-                with open(path, 'rb') as src_file:
-                    with open(new_path, 'wb') as dst_file:
-                        dst_file.write(src_file.read())
-            else:
-                # Rename the file
-                path.rename(path.with_suffix(to_ext))
-            return True
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-            return False
+        """Rename a single file's extension and return whether it worked"""
+        record = engine.rename_file(file_path, from_ext, to_ext, keep_original)
+        return record.outcome == results.OUTCOME_DONE
     
-    def preview_changes(self):
-        """Show preview of changes"""
-        from_ext = self.from_ext.currentText()
-        to_ext = self.to_ext.text()
+    def parse_rules(self):
+        """Return the extra rules typed by the user as a ``RuleSet``
         
-        if not from_ext:
-            QMessageBox.warning(self, "Warning", "Please select a source extension first")
-            return
-            
-        if not to_ext:
-            QMessageBox.warning(self, "Warning", "Please enter a destination extension")
-            return
+        Rules are separated by semicolons or new lines. ``None`` means the
+        text could not be parsed; the user has already been told why.
+        """
+        specs = [spec.strip() for spec in self.rules_edit.text().replace('\n', ';').split(';')]
+        try:
+            return RuleSet.parse(spec for spec in specs if spec)
+        except RuleError as e:
+            QMessageBox.warning(self, "Warning", f"Invalid rule: {e}")
+            return None
+    
+    def update_detect_mode(self, detect):
+        """The target extension comes from file content in detect mode"""
+        self.to_ext.setEnabled(not detect)
+        self.rules_edit.setEnabled(not detect)
+    
+    def start_detection(self, from_ext, then):
+        """Check the content of the ``from_ext`` files in the background
         
+        Once every file has been read, renames to the detected types are
+        planned and passed to ``then`` as ``(plan, description, total_bytes)``.
+        """
         matching_files = self.get_files_with_extension(from_ext)
         if not matching_files:
             QMessageBox.information(self, "Info", "No files match the selected extension")
             return
         
-        preview_dialog = PreviewDialog(matching_files, from_ext, to_ext, self)
-        preview_dialog.exec()
+        self.stop_detection()
+        self.convert_button.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.cancel_button.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.progress_text.setText("")
+        self.status_label.setText(f"Status: Checking the content of {len(matching_files)} files...")
+        
+        self.detect_then = then
+        self.detect_thread = DetectThread(
+            matching_files,
+            self.backend.currentData(),
+            self.workers.value() if self.workers.isEnabled() else None,
+            self.sniff_cache,
+            from_ext,
+        )
+        self.detect_thread.progress_updated.connect(self.update_detection_progress)
+        self.detect_thread.detection_finished.connect(self.detection_finished)
+        self.detect_thread.detection_failed.connect(self.detection_failed)
+        self.detect_thread.start()
     
-    def start_conversion(self):
-        """Start the conversion process"""
-        from_ext = self.from_ext.currentText()
-        to_ext = self.to_ext.text()
+    def stop_detection(self):
+        """Cancel a running content check and wait for its thread to exit"""
+        if self.detect_thread is not None:
+            self.detect_thread.cancel = True
+            self.detect_thread.wait()
+            self.detect_thread = None
+            self.end_detection()
+    
+    def end_detection(self):
+        """Give the window back after a content check"""
+        self.detect_then = None
+        self.convert_button.setEnabled(True)
+        self.preview_button.setEnabled(True)
+        if not self.processing and self.scan_thread is None:
+            self.cancel_button.setVisible(False)
+    
+    @Slot(int, int)
+    def update_detection_progress(self, current, total):
+        """Show how many file headers have been read"""
+        if self.sender() is not self.detect_thread:
+            return
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(current)
+        self.progress_text.setText(f"{current}/{total} files checked")
+    
+    @Slot(object, bool)
+    def detection_finished(self, detected, cancelled):
+        """Plan renames to the detected types and continue with them"""
+        thread = self.sender()
+        if thread is not self.detect_thread:
+            return  # Late result from a check that was stopped
+        then = self.detect_then
+        self.detect_thread = None
+        self.end_detection()
+        
+        from_ext = thread.extension
+        if cancelled:
+            self.status_label.setText("Status: Content check cancelled")
+            return
+        self.status_label.setText("Status: Content check finished")
         
-        if not from_ext:
-            QMessageBox.warning(self, "Warning", "Please select a source extension first")
+        operations = sniffer.plan_detected(thread.paths, detected)
+        if not operations:
+            QMessageBox.information(self, "Info", f"Every {from_ext} file matches its content")
             return
-            
-        if not to_ext:
-            QMessageBox.warning(self, "Warning", "Please enter a destination extension")
+        
+        plan = planner.build_plan(operations, self.conflict_policy.currentData())
+        size_of = self.index.size
+        total_bytes = sum(size_of(operation.src) or 0 for operation in operations)
+        then(plan, f"{from_ext} → detected type", total_bytes)
+    
+    @Slot(str)
+    def detection_failed(self, error):
+        """Report a content check that could not run"""
+        if self.sender() is not self.detect_thread:
             return
+        self.detect_thread = None
+        self.end_detection()
+        self.status_label.setText("Status: Content check failed")
+        QMessageBox.critical(self, "Error", f"Could not check file contents: {error}")
+    
+    def collect_plan(self, then):
+        """Build the plan for the current settings and pass it to ``then``
         
-        matching_files = self.get_files_with_extension(from_ext)
+        ``then`` is called with ``(plan, description, total_bytes)``; it is
+        not called after telling the user what is missing. Plans that need
+        a content check are passed on once the check finishes.
+        """
+        from_ext = self.from_ext.currentText()
         
-        if not matching_files:
-            QMessageBox.information(self, "Info", "No files match the selected extension")
+        if self.detect_content.isChecked():
+            if not from_ext:
+                QMessageBox.warning(self, "Warning", "Please select a source extension first")
+                return
+            self.start_detection(from_ext, then)
+            return
+        
+        collected = self.collect_rule_plan(from_ext, self.to_ext.text())
+        if collected is not None:
+            then(*collected)
+    
+    def collect_rule_plan(self, from_ext, to_ext):
+        """Build the plan for the selected extensions and typed rules
+        
+        Returns ``(plan, description, total_bytes)``, or ``None`` after
+        telling the user what is missing.
+        """
+        extra_rules = self.parse_rules()
+        if extra_rules is None:
+            return None
+        
+        if not len(extra_rules):
+            if not from_ext:
+                QMessageBox.warning(self, "Warning", "Please select a source extension first")
+                return None
+            
+            if not to_ext:
+                QMessageBox.warning(self, "Warning", "Please enter a destination extension")
+                return None
+            
+            matching_files = self.get_files_with_extension(from_ext)
+            if not matching_files:
+                QMessageBox.information(self, "Info", "No files match the selected extension")
+                return None
+            
+            plan = self.build_plan(matching_files, from_ext, to_ext)
+            description = f"{from_ext} → {engine.normalize_extension(to_ext)}"
+            return plan, description, self.index.total_bytes(from_ext)
+        
+        # All rules are applied to every scanned file in a single pass
+        rule_list = list(extra_rules.rules)
+        if from_ext and to_ext:
+            rule_list.insert(0, Rule(from_ext, to_ext))
+        rule_set = RuleSet(rule_list)
+        operations = rule_set.plan(self.index)
+        if not operations:
+            QMessageBox.information(self, "Info", "No files match the rules")
+            return None
+        
+        plan = planner.build_plan(operations, self.conflict_policy.currentData())
+        size_of = self.index.size
+        total_bytes = sum(size_of(operation.src) or 0 for operation in operations)
+        return plan, rule_set.describe(), total_bytes
+    
+    def preview_changes(self):
+        """Show preview of changes"""
+        self.collect_plan(self.show_preview)
+    
+    def show_preview(self, plan, description, total_bytes):
+        """Open the preview dialog for a plan"""
+        # The preview is rarely opened, so it is only loaded on first use
+        from .preview import PreviewDialog
+        
+        preview_dialog = PreviewDialog(plan, description, self.index.size, self)
+        preview_dialog.exec()
+    
+    def build_plan(self, files, from_ext, to_ext):
+        """Plan a conversion and resolve conflicts with the selected policy"""
+        operations = engine.plan_operations(files, from_ext, to_ext)
+        return planner.build_plan(operations, self.conflict_policy.currentData())
+    
+    def start_conversion(self):
+        """Start the conversion process"""
+        self.collect_plan(self.confirm_conversion)
+    
+    def confirm_conversion(self, plan, description, total_bytes):
+        """Ask for confirmation and run a plan"""
+        # Check for conflicts before anything is touched
+        run_count = len(plan) - plan.skipped_count
+        if run_count == 0:
+            QMessageBox.information(self, "Info", f"Nothing to convert. {plan.summary()}")
             return
         
         # Ask for confirmation
+        message = f"Convert {run_count} files ({description})?"
+        if plan.conflict_count:
+            message += f"\n\n{plan.summary()}"
         reply = QMessageBox.question(
             self, 
             "Confirm Conversion", 
-            f"Convert {len(matching_files)} files from {from_ext} to {to_ext}?",
+            message,
             QMessageBox.Yes | QMessageBox.No, 
             QMessageBox.No
         )
         
         if reply == QMessageBox.Yes:
-            # Update UI for processing
-            self.progress_bar.setValue(0)
-            self.progress_bar.setMaximum(len(matching_files))
-            self.progress_text.setText(f"0/{len(matching_files)} files processed")
-            
-            self.convert_button.setVisible(False)
-            self.preview_button.setVisible(False)
-            self.cancel_button.setVisible(True)
-            self.exit_button.setEnabled(False)
-            
-            # Create and start worker thread
-            self.worker_thread = ConversionThread(
-                matching_files,
-                from_ext,
-                to_ext,
-                self.keep_original.isChecked(),
-                self.use_mp.isChecked(),
-                self.cpu_cores.value(),
-                self.rename_file
+            operations = plan.runnable()
+            keep_original = self.keep_original.isChecked()
+            sizes = None
+            if keep_original:
+                # Copies are scheduled by the sizes found while scanning
+                size_of = self.index.size
+                sizes = [size_of(operation.src) for operation in operations]
+                if None in sizes:
+                    # Scanned without sizes: the engine stats the sources itself
+                    total_bytes = None
+            self.start_worker(ConversionThread(
+                operations,
+                keep_original,
+                self.backend.currentData(),
+                self.workers.value() if self.workers.isEnabled() else None,
+                self.preserve_metadata.isChecked(),
+                total_bytes,
+                plan.overwrite,
+                journal.new_journal_path(),
+                sizes=sizes,
+                durable=self.durable.isChecked()
+            ))
+    
+    def start_job(self, job):
+        """Run the operations of a resumed or undo journal"""
+        self.start_worker(ConversionThread(
+            job.operations,
+            job.keep_original,
+            self.backend.currentData(),
+            self.workers.value() if self.workers.isEnabled() else None,
+            self.preserve_metadata.isChecked(),
+            overwrite=job.overwrite,
+            job=job,
+            durable=self.durable.isChecked()
+        ))
+    
+    def start_worker(self, worker_thread):
+        """Switch the window to processing mode and start a conversion thread"""
+        file_count = len(worker_thread.operations)
+        
+        # Update UI for processing
+        self.progress_bar.setValue(0)
+        self.progress_bar.setMaximum(file_count)
+        self.progress_text.setText(f"0/{file_count} files processed")
+        
+        self.convert_button.setVisible(False)
+        self.preview_button.setVisible(False)
+        self.undo_button.setVisible(False)
+        self.failures_button.setVisible(False)
+        self.cancel_button.setVisible(True)
+        self.exit_button.setEnabled(False)
+        
+        # Connect signals
+        self.worker_thread = worker_thread
+        self.conversion_started = time.perf_counter()
+        self.worker_thread.progress_updated.connect(self.update_progress)
+        self.worker_thread.status_updated.connect(self.update_status)
+        self.worker_thread.conversion_finished.connect(self.conversion_finished)
+        
+        self.worker_thread.start()
+        self.processing = True
+    
+    def undo_last_conversion(self):
+        """Revert the files changed by the last conversion"""
+        if not self.last_journal:
+            return
+        reply = QMessageBox.question(
+            self,
+            "Undo Conversion",
+            "Revert the files changed by the last conversion?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            job = journal.Journal.undo(self.last_journal)
+        except (OSError, journal.JournalError) as e:
+            QMessageBox.critical(self, "Error", f"Cannot undo: {e}")
+            return
+        self.last_journal = None
+        self.start_job(job)
+    
+    def check_interrupted_jobs(self):
+        """Offer to finish the most recent job if it was interrupted
+        
+        Jobs the user cancelled are not offered again.
+        """
+        for path in journal.find_journals()[:1]:
+            try:
+                state = journal.read_journal(path)
+            except (OSError, ValueError, journal.JournalError):
+                continue
+            if state.finished or state.complete:
+                continue
+            remaining = len(state.operations) - len(state.done)
+            reply = QMessageBox.question(
+                self,
+                "Resume Interrupted Job",
+                f"A previous job stopped with {remaining} of {len(state.operations)} "
+                f"files left to process. Resume it now?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.Yes
             )
-            
-            # Connect signals
-            self.worker_thread.progress_updated.connect(self.update_progress)
-            self.worker_thread.status_updated.connect(self.update_status)
-            self.worker_thread.conversion_finished.connect(self.conversion_finished)
-            
-            self.worker_thread.start()
-            self.processing = True
+            if reply != QMessageBox.Yes:
+                continue
+            try:
+                self.start_job(journal.Journal.resume(path))
+            except (OSError, journal.JournalError) as e:
+                QMessageBox.critical(self, "Error", f"Cannot resume: {e}")
     
     def cancel_operation(self):
         """Cancel the current operation"""
+        if self.scan_thread is not None:
+            self.scan_thread.cancel = True
+            self.status_label.setText("Status: Cancelling scan...")
+        if self.detect_thread is not None:
+            self.detect_thread.cancel = True
+            self.status_label.setText("Status: Cancelling content check...")
         if self.processing and self.worker_thread:
             self.worker_thread.cancel = True
-            self.status_label.setText("Status: Cancelling...")
+            self.status_label.setText("Status: Cancelling - finishing files in progress...")
     
     @Slot(int, int)
     def update_progress(self, current, total):
         """Update progress bar and text"""
         self.progress_bar.setValue(current)
         self.progress_bar.setMaximum(total)
-        self.progress_text.setText(f"{current}/{total} files processed")
+        elapsed = time.perf_counter() - self.conversion_started
+        rate = f" ({current / elapsed:,.0f} files/s)" if elapsed > 0 and current else ""
+        self.progress_text.setText(f"{current}/{total} files processed{rate}")
     
     @Slot(str)
     def update_status(self, status):
@@ -534,13 +1016,69 @@ class ExtensionChanger(QMainWindow):
         self.cancel_button.setVisible(False)
         self.exit_button.setEnabled(True)
         self.processing = False
-
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    app.setStyle("Fusion")  # Use Fusion style for a consistent look
+        
+        report = self.worker_thread.report if self.worker_thread else None
+        if report is not None:
+            self.apply_report_to_index(report)
+            if report.failures:
+                self.failures_button.setText(f"Show Failures ({len(report.failures)})")
+                self.failures_button.setVisible(True)
+        
+        # Only forward jobs can be undone, not the undo itself
+        job = self.worker_thread.job if self.worker_thread else None
+        if job is not None and job.header.get('kind') == journal.KIND_FORWARD and success_count:
+            self.last_journal = job.path
+        self.undo_button.setVisible(bool(self.last_journal))
+    
+    def show_failures(self):
+        """List the files the last conversion failed on, offering a retry"""
+        report = self.worker_thread.report if self.worker_thread else None
+        if report is None or not report.failures:
+            return
+        
+        # Failures are rare, so the dialog is only loaded on first use
+        from .failures import FailuresDialog
+        dialog = FailuresDialog(report, self)
+        if dialog.exec() == FailuresDialog.Retry:
+            self.retry_failed()
     
-    window = ExtensionChanger()
-    window.show()
+    def retry_failed(self):
+        """Run the operations that failed in the last conversion again
+        
+        The operations come from the report's result log, so nothing is
+        rescanned or planned again.
+        """
+        previous = self.worker_thread
+        operations = previous.report.failed_operations()
+        if not operations:
+            return
+        self.start_worker(ConversionThread(
+            operations,
+            previous.keep_original,
+            self.backend.currentData(),
+            self.workers.value() if self.workers.isEnabled() else None,
+            previous.preserve_metadata,
+            overwrite=previous.overwrite,
+            journal_path=journal.new_journal_path(),
+            durable=previous.durable
+        ))
+    
+    def apply_report_to_index(self, report):
+        """Move converted files to their new extension without rescanning"""
+        keep_original = self.worker_thread.keep_original
+        for operation in report.completed:
+            if operation.dst is None:
+                self.index.discard(operation.src)
+            elif keep_original:
+                self.index.add(operation.dst, self.index.size(operation.src))
+            else:
+                self.index.rename(operation.src, operation.dst)
+        self.refresh_extension_combo()
+        self.update_matching_files()
     
-    sys.exit(app.exec())
\ No newline at end of file
+    def closeEvent(self, event):
+        """Stop background work before the window goes away"""
+        self.stop_scan()
+        self.stop_detection()
+        executors.warm_pool.shutdown()
+        super().closeEvent(event)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer failures dialog
+
+Lists the operations of a finished conversion that failed, with the error
+and errno of each, straight from the report's result log. From here the
+failed operations can be run again without rescanning.
+"""
+
+import os
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableView,
+    QHeaderView, QAbstractItemView
+)
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from .results import OUTCOME_FAILED
+
+
+class FailuresModel(QAbstractTableModel):
+    """Table model over the failed results of a :class:`engine.ConversionReport`
+
+    Only log positions are kept; rows are fetched in batches and their text
+    is produced on demand, like the preview's plan model.
+    """
+    COLUMNS = ("Filename", "Folder", "Error", "Errno")
+    FETCH_BATCH = 1000
+
+    def __init__(self, report, parent=None):
+        super().__init__(parent)
+        self.operations = report.operations
+        self.log = report.results
+        self._positions = sorted(self.log.errors)
+        self._loaded = min(len(self._positions), self.FETCH_BATCH)
+
+    def record(self, row):
+        return self.log.record(self._positions[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.record(index.row())
+        src = self.operations[record.index].src
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return os.path.basename(src)
+            if column == 1:
+                return os.path.dirname(src)
+            if column == 2:
+                return record.error
+            return "" if record.errno is None else str(record.errno)
+        if role == Qt.ToolTipRole:
+            return src if column < 2 else record.error
+        if role == Qt.TextAlignmentRole and column == 3:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._positions)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self._positions) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+
+class FailuresDialog(QDialog):
+    """Dialog listing failed operations, with a "Retry Failed" action
+
+    ``exec()`` returns :attr:`Retry` when the user asks to retry.
+    """
+    Retry = 2
+
+    def __init__(self, report, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Failed Files")
+        self.resize(800, 400)
+
+        layout = QVBoxLayout()
+
+        failed = len(report.results.indices_with(OUTCOME_FAILED))
+        header_label = QLabel(f"{failed} of {report.total_count} files could not be converted")
+        layout.addWidget(header_label)
+
+        # Table
+        self.model = FailuresModel(report, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.setColumnWidth(0, 200)
+        self.table.setColumnWidth(1, 200)
+        self.table.setColumnWidth(3, 60)
+        layout.addWidget(self.table)
+
+        # Buttons
+        retry_button = QPushButton("Retry Failed")
+        retry_button.clicked.connect(lambda: self.done(self.Retry))
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(retry_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer compact file sets
+
+Holds millions of scanned files without one Python string per path. Each
+directory is stored once in a table and every file keeps only a directory
+number, its name (UTF-8, packed back to back in a single buffer) and its
+size, all in flat ``array`` columns. Full paths are only built when a file
+is actually read, so iterating, slicing and filtering by extension cost
+about 25 bytes per file plus the name itself, instead of a few hundred.
+
+Files are addressed by a stable integer id. Removed files leave a hole
+that :class:`FileView` sequences skip when they are built.
+"""
+
+import os
+from array import array
+
+
+# Directory number of a removed file
+DELETED = 0xFFFFFFFF
+
+# Size recorded for a file whose size is unknown
+UNKNOWN_SIZE = -1
+
+# Names are stored as UTF-8; surrogatepass round-trips undecodable bytes
+# that os.scandir hands back as lone surrogates
+_ENCODING = 'utf-8'
+_ERRORS = 'surrogatepass'
+
+
+class FileSet:
+    """Append-only table of files, grouped by interned parent directory"""
+
+    def __init__(self, entries=()):
+        self._directories = []  # directory number -> path
+        self._directory_numbers = {}  # path -> directory number
+        self._members = []  # directory number -> array of file ids
+        self._parents = array('I')  # file id -> directory number, or DELETED
+        self._offsets = array('Q', [0])  # file id -> start of its name in _names
+        self._names = bytearray()
+        self._sizes = array('q')  # file id -> size, or UNKNOWN_SIZE
+        self._lookup = {}  # directory number -> {name: file id}, built on demand
+        self._live = 0
+        self.add_entries(entries)
+
+    @classmethod
+    def from_paths(cls, paths):
+        """Build a set from file paths whose size is unknown"""
+        fileset = cls()
+        for path in paths:
+            fileset.add(path)
+        return fileset
+
+    # -- Adding and removing ----------------------------------------------
+
+    def _directory_number(self, directory):
+        number = self._directory_numbers.get(directory)
+        if number is None:
+            number = self._directory_numbers[directory] = len(self._directories)
+            self._directories.append(directory)
+            self._members.append(array('I'))
+        return number
+
+    def add_file(self, directory, name, size=None):
+        """Add ``name`` inside ``directory`` and return its file id"""
+        number = self._directory_number(directory)
+        file_id = len(self._parents)
+        self._parents.append(number)
+        self._names += name.encode(_ENCODING, _ERRORS)
+        self._offsets.append(len(self._names))
+        self._sizes.append(UNKNOWN_SIZE if size is None else size)
+        self._members[number].append(file_id)
+        names = self._lookup.get(number)
+        if names is not None:
+            names[name] = file_id
+        self._live += 1
+        return file_id
+
+    def add(self, path, size=None):
+        """Add a file by path and return its file id"""
+        directory, name = os.path.split(path)
+        return self.add_file(directory, name, size)
+
+    def add_entries(self, entries):
+        """Add ``(path, size)`` pairs such as :class:`scanner.ScanEntry` objects"""
+        add = self.add
+        for path, size in entries:
+            add(path, size)
+
+    def discard(self, file_id):
+        """Remove a file by id; removing it twice does nothing"""
+        number = self._parents[file_id]
+        if number == DELETED:
+            return
+        names = self._lookup.get(number)
+        if names is not None:
+            names.pop(self.name(file_id), None)
+        self._parents[file_id] = DELETED
+        self._live -= 1
+
+    # -- Looking files up -------------------------------------------------
+
+    def find(self, path):
+        """Return the id of a live file with this path, or ``None``
+
+        The first lookup in a directory builds a name table for it, so
+        sets that are only iterated never pay for one.
+        """
+        directory, name = os.path.split(path)
+        number = self._directory_numbers.get(directory)
+        if number is None:
+            return None
+        names = self._lookup.get(number)
+        if names is None:
+            names = self._lookup[number] = {
+                self.name(file_id): file_id
+                for file_id in self._members[number]
+                if self._parents[file_id] != DELETED
+            }
+        return names.get(name)
+
+    def __contains__(self, path):
+        return self.find(path) is not None
+
+    def __len__(self):
+        return self._live
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def name(self, file_id):
+        offsets = self._offsets
+        return self._names[offsets[file_id]:offsets[file_id + 1]].decode(_ENCODING, _ERRORS)
+
+    def directory(self, file_id):
+        return self._directories[self._parents[file_id]]
+
+    def path(self, file_id):
+        return os.path.join(self._directories[self._parents[file_id]], self.name(file_id))
+
+    def size(self, file_id):
+        """Return the recorded size of a file, or ``None`` if unknown"""
+        size = self._sizes[file_id]
+        return None if size == UNKNOWN_SIZE else size
+
+    def size_of(self, path):
+        """Return the recorded size of the file at ``path``, or ``None``"""
+        file_id = self.find(path)
+        return None if file_id is None else self.size(file_id)
+
+    def is_live(self, file_id):
+        return self._parents[file_id] != DELETED
+
+    # -- Views ------------------------------------------------------------
+
+    def ids(self):
+        """Return the ids of all live files, in the order they were added"""
+        if self._live == len(self._parents):
+            return range(len(self._parents))
+        parents = self._parents
+        return array('I', (file_id for file_id in range(len(parents))
+                           if parents[file_id] != DELETED))
+
+    def view(self, ids=None):
+        """Return a :class:`FileView` over ``ids``, or over every live file"""
+        return FileView(self, self.ids() if ids is None else ids)
+
+    def with_extension(self, extension):
+        """Return a :class:`FileView` of the live files with an extension"""
+        return self.view().with_extension(extension)
+
+    def directories(self):
+        """Return the number of distinct directories seen"""
+        return len(self._directories)
+
+
+class FileView:
+    """A read-only sequence of files from a :class:`FileSet`
+
+    Iterating yields full paths, built one at a time. Slicing and filtering
+    return new views that share the set's storage.
+    """
+
+    __slots__ = ('fileset', 'ids')
+
+    def __init__(self, fileset, ids):
+        self.fileset = fileset
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return len(self.ids) > 0
+
+    def __iter__(self):
+        path = self.fileset.path
+        for file_id in self.ids:
+            yield path(file_id)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FileView(self.fileset, self.ids[index])
+        return self.fileset.path(self.ids[index])
+
+    def __repr__(self):
+        return f"<FileView of {len(self.ids)} files>"
+
+    def size(self, index):
+        """Return the size of the file at ``index``, or ``None`` if unknown"""
+        return self.fileset.size(self.ids[index])
+
+    def items(self):
+        """Yield ``(path, size)`` pairs"""
+        path = self.fileset.path
+        size = self.fileset.size
+        for file_id in self.ids:
+            yield path(file_id), size(file_id)
+
+    def total_bytes(self):
+        sizes = self.fileset._sizes
+        return sum(sizes[file_id] for file_id in self.ids if sizes[file_id] > 0)
+
+    def with_extension(self, extension):
+        """Return the files of this view with an extension, from names alone"""
+        # Imported here because the index itself is built on file sets
+        from .index import extension_of
+        name = self.fileset.name
+        return FileView(self.fileset, array('I', (
+            file_id for file_id in self.ids if extension_of(name(file_id)) == extension
+        )))
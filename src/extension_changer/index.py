@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer extension index
+
+Groups scanned files by extension once, keeping per-extension counts and
+byte totals, so that switching the selected extension is a dictionary
+lookup instead of a rescan of every path. The index is updated in place as
+files are renamed or copied.
+"""
+
+import os
+from array import array
+
+from .fileset import FileSet
+
+
+# Multi-part extensions that are treated as a single extension. Anything
+# else is grouped by its last suffix only, so "holiday.photo.jpg" is a ".jpg".
+COMPOUND_SUFFIXES = frozenset([
+    '.tar.gz', '.tar.bz2', '.tar.xz', '.tar.zst', '.tar.lz', '.tar.lzma',
+    '.tar.z', '.tar.br', '.nii.gz', '.warc.gz', '.user.js', '.d.ts',
+])
+
+
+def extension_of(path):
+    """Return the extension a file is grouped under
+
+    Known compound suffixes such as ``.tar.gz`` are kept whole; otherwise this
+    matches ``pathlib.PurePath.suffix``. Files without an extension give ``''``.
+    """
+    name = os.path.basename(path)
+    dot = name.rfind('.')
+    if dot <= 0 or dot == len(name) - 1:
+        return ''
+    inner = name.rfind('.', 0, dot)
+    if inner > 0 and name[inner:].lower() in COMPOUND_SUFFIXES:
+        return name[inner:]
+    return name[dot:]
+
+
+class ExtensionGroup:
+    """Ids of the files sharing one extension, with a running byte total"""
+    __slots__ = ('ids', 'count', 'total_bytes')
+
+    def __init__(self):
+        self.ids = array('I')  # file ids in insertion order, removed ones included
+        self.count = 0
+        self.total_bytes = 0
+
+    def __len__(self):
+        return self.count
+
+
+class ExtensionIndex:
+    """Extension -> files index built while scanning
+
+    Files live in a compact :class:`fileset.FileSet`; each extension group
+    only holds file ids, so no full path is kept as a string.
+    """
+
+    def __init__(self, entries=()):
+        self.fileset = FileSet()
+        self._groups = {}
+        self.add_entries(entries)
+
+    def __len__(self):
+        return len(self.fileset)
+
+    def __contains__(self, path):
+        return path in self.fileset
+
+    def __iter__(self):
+        return iter(self.fileset)
+
+    def _add_new(self, path, size):
+        file_id = self.fileset.add(path, size)
+        ext = extension_of(path)
+        group = self._groups.get(ext)
+        if group is None:
+            group = self._groups[ext] = ExtensionGroup()
+        group.ids.append(file_id)
+        group.count += 1
+        if size:
+            group.total_bytes += size
+        return ext
+
+    def add(self, path, size=None):
+        """Add a file, replacing any previous entry for the same path"""
+        self.discard(path)
+        return self._add_new(path, size)
+
+    def add_entries(self, entries):
+        """Add ``(path, size)`` pairs such as :class:`scanner.ScanEntry` objects
+
+        The paths must not be in the index yet, as is the case for scan
+        results. Returns the set of extensions that were not in the index
+        before.
+        """
+        groups = self._groups
+        add = self._add_new
+        new_extensions = set()
+        for path, size in entries:
+            ext = add(path, size)
+            if groups[ext].count == 1:
+                new_extensions.add(ext)
+        return new_extensions
+
+    def add_paths(self, paths):
+        """Add files whose size is unknown"""
+        return self.add_entries((path, None) for path in paths)
+
+    def discard(self, path):
+        """Remove a file from the index if present and return its size"""
+        file_id = self.fileset.find(path)
+        if file_id is None:
+            return None
+        size = self.fileset.size(file_id)
+        self.fileset.discard(file_id)
+        ext = extension_of(path)
+        group = self._groups[ext]
+        group.count -= 1
+        if size:
+            group.total_bytes -= size
+        if not group.count:
+            del self._groups[ext]
+        return size
+
+    def rename(self, old_path, new_path):
+        """Move a file to its new path (and extension group)"""
+        size = self.discard(old_path)
+        self.add(new_path, size)
+
+    def size(self, path):
+        """Return the recorded size of a file, or ``None`` if unknown"""
+        return self.fileset.size_of(path)
+
+    def extensions(self):
+        """Return the sorted list of known extensions"""
+        return sorted(ext for ext in self._groups if ext)
+
+    def count(self, extension):
+        """Return how many files have an extension"""
+        group = self._groups.get(extension)
+        return group.count if group else 0
+
+    def total_bytes(self, extension):
+        """Return the summed size of files with an extension"""
+        group = self._groups.get(extension)
+        return group.total_bytes if group else 0
+
+    def files(self, extension):
+        """Return a :class:`fileset.FileView` of the files with an extension, in scan order"""
+        group = self._groups.get(extension)
+        if group is None:
+            return self.fileset.view(array('I'))
+        if group.count < len(group.ids):
+            # Drop the ids of files renamed or removed since the last call
+            is_live = self.fileset.is_live
+            group.ids = array('I', (file_id for file_id in group.ids if is_live(file_id)))
+        return self.fileset.view(group.ids)
+
+    def sizes(self, extension):
+        """Return ``(path, size)`` pairs for an extension"""
+        return list(self.files(extension).items())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer operation journal
+
+An append-only JSON Lines log of a conversion job. The plan is written once
+up front, then the index of every completed operation is appended in
+batches, with ``fsync`` at most once per sync interval. If the process dies
+partway through, replaying the journal tells exactly which operations were
+done, so the job can be resumed without redoing them, and a finished job
+can be reverted.
+
+Record layout (one JSON object per line)::
+
+    {"t": "job", "v": 1, "kind": "forward", "keep_original": false, ...}
+    {"t": "op", "s": "/data/a.jpeg", "d": "/data/a.jpg"}      # one per operation
+    {"t": "done", "i": [0, 1, 5, ...]}                       # appended in batches
+    {"t": "end", "cancelled": false}
+
+A cancelled job still gets an end record. Resuming it appends a ``resume``
+record, which reopens the job until the next end record.
+"""
+
+import json
+import os
+import time
+
+from .engine import Operation, user_cache_dir
+
+
+JOURNAL_VERSION = 1
+
+KIND_FORWARD = 'forward'
+KIND_UNDO = 'undo'
+
+# Completed indices buffered before a write
+DEFAULT_BATCH_SIZE = 1000
+
+# Seconds between fsync calls; 0 syncs every batch, None only at the end
+DEFAULT_SYNC_INTERVAL = 1.0
+
+# Journals kept by prune_journals, newest first
+DEFAULT_KEEP = 20
+
+
+class JournalError(Exception):
+    """Raised when a journal cannot be used for the requested action"""
+
+
+class JournalState:
+    """Everything a journal file says about a job"""
+
+    def __init__(self, path, header, operations, done, finished, cancelled):
+        self.path = path
+        self.header = header
+        self.operations = operations
+        self.done = done  # set of operation indices
+        self.finished = finished
+        self.cancelled = cancelled
+
+    @property
+    def kind(self):
+        return self.header.get('kind', KIND_FORWARD)
+
+    @property
+    def keep_original(self):
+        return self.header.get('keep_original', False)
+
+    @property
+    def overwrite(self):
+        return self.header.get('overwrite', False)
+
+    @property
+    def complete(self):
+        """Whether every planned operation has been done"""
+        return len(self.done) == len(self.operations)
+
+    def pending_indices(self):
+        return [i for i in range(len(self.operations)) if i not in self.done]
+
+
+def read_journal(path):
+    """Replay a journal file into a :class:`JournalState`
+
+    A torn last line (from a crash mid-write) is ignored.
+    """
+    header = None
+    operations = []
+    done = set()
+    finished = False
+    cancelled = False
+    with open(path, 'r', encoding='utf-8') as fileobj:
+        for line in fileobj:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            kind = record.get('t')
+            if kind == 'op':
+                operations.append(Operation(record['s'], record.get('d')))
+            elif kind == 'done':
+                done.update(record['i'])
+            elif kind == 'job':
+                header = record
+            elif kind == 'end':
+                finished = True
+                cancelled = record.get('cancelled', False)
+            elif kind == 'resume':
+                finished = cancelled = False
+    if header is None:
+        raise JournalError(f"Not a journal file: {path}")
+    return JournalState(path, header, operations, done, finished, cancelled)
+
+
+class Journal:
+    """Writer side of a journal, handed to :func:`engine.execute_plan`
+
+    ``operations`` are the operations still to run and ``ids`` maps their
+    position in that list to their index in the journal.
+    """
+
+    def __init__(self, path, fileobj, operations, ids, header,
+                 batch_size=DEFAULT_BATCH_SIZE, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.path = path
+        self.header = header
+        self.operations = operations
+        self.ids = ids
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self._file = fileobj
+        self._pending = []
+        self._last_sync = time.monotonic()
+
+    @property
+    def keep_original(self):
+        return self.header.get('keep_original', False)
+
+    @property
+    def overwrite(self):
+        return self.header.get('overwrite', False)
+
+    @classmethod
+    def create(cls, path, operations, keep_original=False, overwrite=False,
+               kind=KIND_FORWARD, source=None, **options):
+        """Start a new journal and write the full plan to it"""
+        header = {
+            't': 'job',
+            'v': JOURNAL_VERSION,
+            'kind': kind,
+            'keep_original': keep_original,
+            'overwrite': overwrite,
+            'created': time.time(),
+        }
+        if source:
+            header['source'] = source
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fileobj = open(path, 'x', encoding='utf-8')
+        try:
+            write = fileobj.write
+            write(json.dumps(header) + '\n')
+            for operation in operations:
+                write(json.dumps({'t': 'op', 's': operation.src, 'd': operation.dst}) + '\n')
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+        except BaseException:
+            fileobj.close()
+            raise
+        return cls(path, fileobj, list(operations), None, header, **options)
+
+    @classmethod
+    def resume(cls, path, **options):
+        """Reopen an interrupted journal for the operations not yet done"""
+        state = read_journal(path)
+        if state.finished and state.complete:
+            raise JournalError("This job already completed, there is nothing to resume")
+        ids = []
+        already_done = []
+        for i in state.pending_indices():
+            if _done_before_crash(state, state.operations[i]):
+                already_done.append(i)
+            else:
+                ids.append(i)
+
+        _drop_torn_tail(path)
+        fileobj = open(path, 'a', encoding='utf-8')
+        if state.finished:
+            fileobj.write(json.dumps({'t': 'resume', 'at': time.time()}) + '\n')
+            fileobj.flush()
+        journal = cls(path, fileobj, [state.operations[i] for i in ids], ids, state.header,
+                      **options)
+        if already_done:
+            journal._pending.extend(already_done)
+            journal.flush(sync=True)
+        return journal
+
+    @classmethod
+    def undo(cls, path, undo_path=None, **options):
+        """Start a journal that reverts the completed operations of a job"""
+        state = read_journal(path)
+        if state.kind == KIND_UNDO:
+            raise JournalError("An undo job cannot itself be undone")
+        if not state.done:
+            raise JournalError("No completed operations to undo")
+
+        reverse = []
+        for i in sorted(state.done, reverse=True):
+            operation = state.operations[i]
+            if state.keep_original:
+                # Remove the copy, the original was never touched
+                reverse.append(Operation(operation.dst, None))
+            else:
+                reverse.append(Operation(operation.dst, operation.src))
+
+        undo_path = undo_path or default_undo_path(path)
+        return cls.create(undo_path, reverse, keep_original=False, overwrite=False,
+                          kind=KIND_UNDO, source=os.path.abspath(path), **options)
+
+    def record_done(self, index):
+        """Record that ``operations[index]`` completed"""
+        self._pending.append(self.ids[index] if self.ids is not None else index)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self, sync=None):
+        """Write buffered completions, syncing if the interval has elapsed"""
+        if self._pending:
+            self._file.write(json.dumps({'t': 'done', 'i': self._pending}) + '\n')
+            self._pending = []
+        self._file.flush()
+        now = time.monotonic()
+        if sync is None:
+            sync = (self.sync_interval is not None
+                    and now - self._last_sync >= self.sync_interval)
+        if sync:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+    def finish(self, cancelled=False):
+        """Flush everything and mark the job as ended
+
+        A cancelled job is marked as such, so it is not offered for resuming
+        again; it can still be resumed on purpose.
+        """
+        if self._file is None:
+            return
+        self.flush(sync=False)
+        self._file.write(json.dumps({'t': 'end', 'cancelled': cancelled}) + '\n')
+        self.close()
+
+    def close(self):
+        """Close without marking the job ended (it stays resumable)"""
+        if self._file is None:
+            return
+        self.flush(sync=True)
+        self._file.close()
+        self._file = None
+
+
+def _done_before_crash(state, operation):
+    """Whether a pending operation completed just before a crash, unjournaled"""
+    if not state.keep_original:
+        # Renamed (or removed) away, and the target is in place
+        return (not os.path.lexists(operation.src)
+                and (operation.dst is None or os.path.lexists(operation.dst)))
+    if state.overwrite:
+        # Targets may have existed before the job, so copy them again
+        return False
+    # Copies only appear under their name once complete, so a target the
+    # size of its source is the copy itself. Anything else was put there
+    # by someone else and is left alone.
+    try:
+        return os.path.getsize(operation.dst) == os.path.getsize(operation.src)
+    except OSError:
+        return False
+
+
+def _drop_torn_tail(path):
+    """Cut off a partially written last line so new records start cleanly"""
+    with open(path, 'rb+') as fileobj:
+        size = fileobj.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        fileobj.seek(size - 1)
+        if fileobj.read(1) == b'\n':
+            return
+        # Walk back to the last complete line
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            fileobj.seek(position)
+            chunk = fileobj.read(step)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                fileobj.truncate(position + newline + 1)
+                return
+        fileobj.truncate(0)
+
+
+def default_undo_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}-undo{ext or '.jsonl'}"
+
+
+def default_journal_dir():
+    """Directory where the GUI keeps its journals"""
+    return os.path.join(user_cache_dir(), 'journals')
+
+
+def new_journal_path(directory=None):
+    """Return a fresh, timestamped journal path"""
+    directory = directory or default_journal_dir()
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(directory, f"job-{stamp}.jsonl")
+    number = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"job-{stamp}-{number}.jsonl")
+        number += 1
+    return path
+
+
+def find_journals(directory=None):
+    """Return journal paths in a directory, newest first"""
+    directory = directory or default_journal_dir()
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.jsonl')]
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(directory, name) for name in names]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def has_ended(path):
+    """Whether the last record of a journal marks its job as ended
+
+    Only the tail of the file is read, so this is cheap for large jobs.
+    """
+    with open(path, 'rb') as fileobj:
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(max(0, size - 4096))
+        lines = fileobj.read().splitlines()
+    if not lines:
+        return False
+    try:
+        record = json.loads(lines[-1])
+    except ValueError:
+        return False
+    return isinstance(record, dict) and record.get('t') == 'end'
+
+
+def prune_journals(directory=None, keep=DEFAULT_KEEP):
+    """Delete ended journals other than the newest ``keep`` journals
+
+    Journals of interrupted jobs are never deleted, so they can still be
+    resumed. Returns the number of journals deleted.
+    """
+    try:
+        paths = find_journals(directory)
+    except OSError:
+        return 0
+    removed = 0
+    for path in paths[keep:]:
+        try:
+            if has_ended(path):
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
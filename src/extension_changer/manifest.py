@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer sharded job manifests
+
+Splits one planned conversion across several processes or machines that
+mount the same storage. The plan is computed once and written to a
+gzip-compressed JSON Lines manifest in which every source directory is
+listed once, followed by the names of its files, so a manifest costs a few
+bytes per operation. Each worker then runs shard ``i`` of ``n``:
+directories are assigned to shards by a hash of their path, which every
+worker computes on its own, and all operations of a directory go to the
+same shard. Every shard saves its report to its own result file, and
+:func:`merge_results` combines them into the report of the whole job.
+
+Record layout (one JSON object per line)::
+
+    {"t": "manifest", "v": 1, "id": "...", "keep_original": false, ...}
+    {"t": "dir", "d": "/data", "s": ["a.jpeg", "b.jpeg"], "n": ["a.jpg", "b.jpg"]}
+
+``s`` and ``n`` hold source and target names. A directory record may also
+carry ``z``, the source sizes, and ``x``, mapping positions whose target
+lies in another directory to that directory. A ``null`` target removes the
+source.
+"""
+
+import gzip
+import json
+import os
+import time
+import uuid
+import zlib
+
+from .engine import ConversionReport, Operation
+
+
+MANIFEST_VERSION = 1
+
+RESULT_VERSION = 1
+
+
+class ManifestError(Exception):
+    """Raised when a manifest or shard result cannot be used"""
+
+
+def parse_shard(text):
+    """Parse a shard given as ``I/N`` into ``(I, N)``, counting from 1"""
+    try:
+        shard, shards = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"expected I/N, e.g. 1/4, not {text!r}") from None
+    if not 1 <= shard <= shards:
+        raise ValueError(f"shard must be between 1 and {shards}, not {shard}")
+    return shard, shards
+
+
+def shard_of(directory, shards):
+    """Return the shard, from 1 to ``shards``, that runs a source directory"""
+    return zlib.crc32(os.fsencode(directory)) % shards + 1
+
+
+# ---------------------------------------------------------------------------
+# Manifests
+# ---------------------------------------------------------------------------
+
+def write_manifest(path, operations, keep_original=False, overwrite=False, sizes=None):
+    """Write the operations of a planned job to a manifest
+
+    ``sizes`` optionally lists the size of each operation's source, for
+    copy scheduling. Paths are stored absolute. Returns the id identifying
+    the manifest in shard results.
+    """
+    groups = {}  # source directory -> (names, targets, sizes, other directories)
+    split = os.path.split
+    for position, operation in enumerate(operations):
+        directory, name = split(operation.src)
+        group = groups.get(directory)
+        if group is None:
+            group = groups[directory] = ([], [], [], {})
+        names, targets, group_sizes, elsewhere = group
+        if operation.dst is None:
+            target = None
+        else:
+            target_directory, target = split(operation.dst)
+            if target_directory != directory:
+                elsewhere[len(names)] = os.path.abspath(target_directory)
+        names.append(name)
+        targets.append(target)
+        if sizes is not None:
+            group_sizes.append(sizes[position])
+
+    manifest_id = uuid.uuid4().hex
+    header = {
+        't': 'manifest',
+        'v': MANIFEST_VERSION,
+        'id': manifest_id,
+        'keep_original': keep_original,
+        'overwrite': overwrite,
+        'operations': len(operations),
+        'directories': len(groups),
+        'created': time.time(),
+    }
+    with gzip.open(path, 'wt', encoding='utf-8') as fileobj:
+        write = fileobj.write
+        write(json.dumps(header) + '\n')
+        for directory, (names, targets, group_sizes, elsewhere) in groups.items():
+            # Absolute, so every worker finds the files whatever its directory
+            record = {'t': 'dir', 'd': os.path.abspath(directory), 's': names, 'n': targets}
+            if sizes is not None:
+                record['z'] = group_sizes
+            if elsewhere:
+                record['x'] = elsewhere
+            write(json.dumps(record) + '\n')
+    return manifest_id
+
+
+class Manifest:
+    """The operations of one shard of a manifest"""
+
+    def __init__(self, path, header, shard, shards, operations, sizes):
+        self.path = path
+        self.header = header
+        self.shard = shard
+        self.shards = shards
+        self.operations = operations
+        self.sizes = sizes  # source size of each operation, or None
+
+    @property
+    def id(self):
+        return self.header['id']
+
+    @property
+    def keep_original(self):
+        return self.header.get('keep_original', False)
+
+    @property
+    def overwrite(self):
+        return self.header.get('overwrite', False)
+
+    @property
+    def total(self):
+        """Operations in the whole manifest, across all shards"""
+        return self.header['operations']
+
+
+def read_manifest(path, shard=1, shards=1):
+    """Read the operations of shard ``shard`` of ``shards`` from a manifest"""
+    operations = []
+    sizes = []
+    directories = 0
+    join = os.path.join
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as fileobj:
+            header = json.loads(fileobj.readline() or 'null')
+            if not isinstance(header, dict) or header.get('t') != 'manifest':
+                raise ManifestError(f"Not a manifest file: {path}")
+            if header.get('v') != MANIFEST_VERSION:
+                raise ManifestError(f"Unsupported manifest version: {header.get('v')}")
+            for line in fileobj:
+                record = json.loads(line)
+                directories += 1
+                directory = record['d']
+                if shards > 1 and shard_of(directory, shards) != shard:
+                    continue
+                elsewhere = record.get('x', {})
+                for position, (name, target) in enumerate(zip(record['s'], record['n'])):
+                    if target is not None:
+                        target = join(elsewhere.get(str(position), directory), target)
+                    operations.append(Operation(join(directory, name), target))
+                sizes.extend(record.get('z') or [None] * len(record['s']))
+    except (EOFError, ValueError, KeyError, zlib.error) as e:
+        # gzip.BadGzipFile is an OSError and is left to the caller
+        raise ManifestError(f"Damaged manifest file {path}: {e}") from None
+    if directories != header.get('directories'):
+        raise ManifestError(f"Manifest file {path} is incomplete")
+    return Manifest(path, header, shard, shards, operations, sizes)
+
+
+# ---------------------------------------------------------------------------
+# Shard results
+# ---------------------------------------------------------------------------
+
+def default_result_path(manifest_path, shard, shards):
+    """Return the result file of a shard, next to its manifest"""
+    root = manifest_path[:-3] if manifest_path.endswith('.gz') else manifest_path
+    root = os.path.splitext(root)[0]
+    return f"{root}.shard-{shard}-of-{shards}.json"
+
+
+def write_result(path, manifest, report):
+    """Save a shard's :class:`engine.ConversionReport` for merging"""
+    document = {
+        't': 'shard-result',
+        'v': RESULT_VERSION,
+        'manifest': manifest.id,
+        'shard': manifest.shard,
+        'shards': manifest.shards,
+        'report': report.to_dict(),
+    }
+    # Written aside and moved in place, so a merge never sees half a file
+    tmp = f"{path}.partial"
+    with open(tmp, 'w', encoding='utf-8') as fileobj:
+        json.dump(document, fileobj)
+    os.replace(tmp, path)
+
+
+def read_result(path):
+    with open(path, 'r', encoding='utf-8') as fileobj:
+        try:
+            document = json.load(fileobj)
+        except ValueError as e:
+            raise ManifestError(f"Damaged shard result {path}: {e}") from None
+    if not isinstance(document, dict) or document.get('t') != 'shard-result':
+        raise ManifestError(f"Not a shard result file: {path}")
+    if document.get('v') != RESULT_VERSION:
+        raise ManifestError(f"Unsupported shard result version: {document.get('v')}")
+    return document
+
+
+def merge_results(paths):
+    """Combine the result files of every shard of one manifest
+
+    Returns a :class:`engine.ConversionReport` for the whole job. Raises
+    :class:`ManifestError` if the files belong to different manifests or a
+    shard is missing or given twice.
+    """
+    documents = [read_result(path) for path in paths]
+    if not documents:
+        raise ManifestError("No shard results to merge")
+    first = documents[0]
+    shards = first['shards']
+    seen = {}
+    for path, document in zip(paths, documents):
+        if document['manifest'] != first['manifest'] or document['shards'] != shards:
+            raise ManifestError(f"{path} belongs to another manifest than {paths[0]}")
+        if document['shard'] in seen:
+            raise ManifestError(f"Shard {document['shard']}/{shards} is given twice: "
+                                f"{seen[document['shard']]} and {path}")
+        seen[document['shard']] = path
+    missing = [str(shard) for shard in range(1, shards + 1) if shard not in seen]
+    if missing:
+        raise ManifestError(f"Missing results for shard(s) {', '.join(missing)} of {shards}")
+
+    merged = ConversionReport(0)
+    merged.backend = 'sharded'
+    for document in sorted(documents, key=lambda document: document['shard']):
+        report = ConversionReport.from_dict(document['report'])
+        merged.total_count += report.total_count
+        merged.success_count += report.success_count
+        merged.failures.extend(report.failures)
+        merged.bytes_copied += report.bytes_copied
+        merged.cancelled = merged.cancelled or report.cancelled
+        # Shards run side by side, so the job took as long as the slowest
+        merged.elapsed = max(merged.elapsed, report.elapsed)
+        merged.workers += report.workers
+        merged.metrics.merge(report.metrics, prefix=f"shard-{document['shard']}/")
+    return merged
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer metrics
+
+Throughput, latency and utilization figures for an executed plan. Workers
+time each operation themselves; the numbers are folded into a
+:class:`RunMetrics` in the thread that consumes results, so recording costs a
+few dictionary updates per file and nothing is shared between workers.
+"""
+
+import multiprocessing
+import threading
+import time
+from collections import namedtuple
+
+
+# Kinds of operation, as reported in latency breakdowns
+KIND_RENAME = 'rename'
+KIND_COPY = 'copy'
+KIND_REMOVE = 'remove'
+KIND_SYNC = 'sync'  # a directory fsync in durable mode
+
+# Default interval between coalesced progress updates, in seconds
+PROGRESS_INTERVAL = 0.1
+
+# Latency buckets are powers of two in microseconds, up to about 35 minutes
+HISTOGRAM_BUCKETS = 32
+
+ErrorRecord = namedtuple('ErrorRecord', ['path', 'kind', 'errno', 'error_type', 'message'])
+
+
+def worker_name():
+    """Return a label for the process or thread running the current task"""
+    process = multiprocessing.current_process()
+    if process.name != 'MainProcess':
+        return process.name
+    return threading.current_thread().name
+
+
+def error_record(path, kind, error):
+    """Build an :class:`ErrorRecord` from an exception"""
+    return ErrorRecord(path, kind, getattr(error, 'errno', None),
+                       type(error).__name__, str(error))
+
+
+class LatencyHistogram:
+    """Log-scale histogram of durations"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Return an upper bound for the given percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def merge(self, other):
+        """Add the durations recorded by another histogram"""
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a histogram from :meth:`to_dict` output"""
+        histogram = cls()
+        for upper, count in data.get('buckets', {}).items():
+            histogram.counts[int(upper).bit_length() - 1] += count
+        histogram.count = data['count']
+        histogram.total = data['mean'] * data['count']
+        histogram.max = data['max']
+        return histogram
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            # Upper bound of each non-empty bucket in microseconds
+            'buckets': {str(1 << bucket): count
+                        for bucket, count in enumerate(self.counts) if count},
+        }
+
+
+class WorkerStats:
+    """Time a single worker spent on operations"""
+
+    __slots__ = ('operations', 'busy')
+
+    def __init__(self):
+        self.operations = 0
+        self.busy = 0.0
+
+
+class RunMetrics:
+    """Metrics collected while a plan executes"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+        self.latency = {}  # kind -> LatencyHistogram
+        self.workers = {}  # worker name -> WorkerStats
+        self.errors = []  # ErrorRecord for every failure
+        self.sync_batches = 0  # directory sync batches in durable mode
+        self.synced_directories = 0
+        self.sync_time = 0.0
+
+    def record(self, kind, duration, bytes_copied=0, worker=None, error=None):
+        """Record one finished operation; ``error`` is an :class:`ErrorRecord`"""
+        self.files += 1
+        self.bytes += bytes_copied
+        histogram = self.latency.get(kind)
+        if histogram is None:
+            histogram = self.latency[kind] = LatencyHistogram()
+        histogram.add(duration)
+        stats = self.workers.get(worker)
+        if stats is None:
+            stats = self.workers[worker] = WorkerStats()
+        stats.operations += 1
+        stats.busy += duration
+        if error is not None:
+            self.failed += 1
+            self.errors.append(error)
+
+    def record_sync(self, directories, seconds):
+        """Record one batch of directory syncs in durable mode"""
+        self.sync_batches += 1
+        self.synced_directories += directories
+        self.sync_time += seconds
+
+    def merge(self, other, prefix=''):
+        """Fold in the metrics of a run that went on in parallel
+
+        The elapsed time is that of the longer run. Worker names are given
+        ``prefix`` so workers of different runs stay apart.
+        """
+        self.elapsed = max(self.elapsed, other.elapsed)
+        self.files += other.files
+        self.failed += other.failed
+        self.bytes += other.bytes
+        for kind, histogram in other.latency.items():
+            self.latency.setdefault(kind, LatencyHistogram()).merge(histogram)
+        for name, stats in other.workers.items():
+            merged = self.workers.setdefault(f"{prefix}{name}", WorkerStats())
+            merged.operations += stats.operations
+            merged.busy += stats.busy
+        self.errors.extend(other.errors)
+        self.sync_batches += other.sync_batches
+        self.synced_directories += other.synced_directories
+        self.sync_time += other.sync_time
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild metrics from :meth:`to_dict` output, e.g. a saved report"""
+        run_metrics = cls()
+        run_metrics.elapsed = data['elapsed']
+        run_metrics.files = data['files']
+        run_metrics.failed = data['failed']
+        run_metrics.bytes = data['bytes']
+        run_metrics.latency = {kind: LatencyHistogram.from_dict(histogram)
+                               for kind, histogram in data.get('latency', {}).items()}
+        for name, worker in data.get('workers', {}).items():
+            stats = run_metrics.workers[name] = WorkerStats()
+            stats.operations = worker['operations']
+            stats.busy = worker['busy']
+        run_metrics.errors = [ErrorRecord(**record) for record in data.get('errors', ())]
+        sync = data.get('sync', {})
+        run_metrics.sync_batches = sync.get('batches', 0)
+        run_metrics.synced_directories = sync.get('directories', 0)
+        run_metrics.sync_time = sync.get('seconds', 0.0)
+        return run_metrics
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def _elapsed(self):
+        return self.elapsed or time.perf_counter() - self.started
+
+    @property
+    def files_per_second(self):
+        elapsed = self._elapsed()
+        return self.files / elapsed if elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        elapsed = self._elapsed()
+        return self.bytes / elapsed if elapsed else 0.0
+
+    def utilization(self):
+        """Return the busy fraction of wall time for each worker"""
+        elapsed = self._elapsed()
+        return {name: (stats.busy / elapsed if elapsed else 0.0)
+                for name, stats in self.workers.items()}
+
+    def to_dict(self):
+        utilization = self.utilization()
+        return {
+            'elapsed': self._elapsed(),
+            'files': self.files,
+            'failed': self.failed,
+            'bytes': self.bytes,
+            'files_per_second': self.files_per_second,
+            'bytes_per_second': self.bytes_per_second,
+            'latency': {kind: histogram.to_dict() for kind, histogram in self.latency.items()},
+            'workers': {
+                str(name): {
+                    'operations': stats.operations,
+                    'busy': stats.busy,
+                    'utilization': utilization[name],
+                }
+                for name, stats in self.workers.items()
+            },
+            'sync': {
+                'batches': self.sync_batches,
+                'directories': self.synced_directories,
+                'seconds': self.sync_time,
+            },
+            'errors': [record._asdict() for record in self.errors],
+        }
+
+
+class ProgressThrottle:
+    """Coalesce ``progress(current, total)`` calls to one per interval
+
+    The final update (``current == total``) is always passed through. A run
+    that stops short, e.g. when cancelled, calls :meth:`flush` so the last
+    update held back still arrives.
+    """
+
+    def __init__(self, callback, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self._next = 0.0
+        self._held = None  # last (current, total) not passed on yet
+
+    def __call__(self, current, total):
+        now = time.monotonic()
+        if now >= self._next or current >= total:
+            self._next = now + self.interval
+            self._held = None
+            self.callback(current, total)
+        else:
+            self._held = (current, total)
+
+    def flush(self):
+        """Pass on the last update if it was held back"""
+        if self._held is not None:
+            held, self._held = self._held, None
+            self.callback(*held)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer preflight planner
+
+Checks a batch of planned operations for conflicts before anything is
+touched. Every target directory is listed once and all targets are checked
+against those in-memory listings, so no per-file ``stat`` is needed. Targets
+that collide with each other inside the batch are detected as well, and a
+policy decides what happens to conflicting rows.
+"""
+
+import os
+from collections import Counter, defaultdict
+
+from .engine import Operation
+from .index import extension_of
+
+
+# Conflict policies
+POLICY_SKIP = 'skip'
+POLICY_SUFFIX = 'suffix'
+POLICY_OVERWRITE = 'overwrite'
+POLICIES = (POLICY_SKIP, POLICY_SUFFIX, POLICY_OVERWRITE)
+
+# Per-row statuses
+STATUS_OK = 'ok'
+STATUS_RENUMBERED = 'renumbered'
+STATUS_OVERWRITE = 'overwrite'
+STATUS_SKIP_EXISTS = 'skip-exists'
+STATUS_SKIP_DUPLICATE = 'skip-duplicate'
+STATUS_SKIP_SOURCE = 'skip-source'
+
+SKIPPED_STATUSES = frozenset([STATUS_SKIP_EXISTS, STATUS_SKIP_DUPLICATE, STATUS_SKIP_SOURCE])
+
+STATUS_LABELS = {
+    STATUS_OK: "OK",
+    STATUS_RENUMBERED: "Conflict - numbered",
+    STATUS_OVERWRITE: "Target exists - overwrite",
+    STATUS_SKIP_EXISTS: "Target exists - skip",
+    STATUS_SKIP_DUPLICATE: "Duplicate target - skip",
+    STATUS_SKIP_SOURCE: "Target is another file's source - skip",
+}
+
+
+def _list_names(directory):
+    """Return the normalised names in a directory (empty if it is missing)"""
+    try:
+        with os.scandir(directory) as it:
+            return {os.path.normcase(entry.name) for entry in it}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+
+class _ProbedNames:
+    """Stands in for a directory listing by checking single names on demand"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __contains__(self, name):
+        return os.path.lexists(os.path.join(self.directory, name))
+
+
+def _numbered_name(name, number):
+    """Number a name before its extension, keeping compound ones such as ``.tar.gz`` whole"""
+    ext = extension_of(name)
+    stem = name[:len(name) - len(ext)]
+    return f"{stem} ({number}){ext}"
+
+
+class Plan:
+    """Operations together with their preflight status"""
+
+    def __init__(self, operations, statuses, policy):
+        self.operations = operations
+        self.statuses = statuses
+        self.policy = policy
+
+    def __len__(self):
+        return len(self.operations)
+
+    @property
+    def overwrite(self):
+        """Whether execution must be allowed to replace existing targets"""
+        return self.policy == POLICY_OVERWRITE
+
+    def runnable(self):
+        """Return the operations that will actually be executed"""
+        return [
+            operation
+            for operation, status in zip(self.operations, self.statuses)
+            if status not in SKIPPED_STATUSES
+        ]
+
+    def counts(self):
+        """Return a ``Counter`` of row statuses"""
+        return Counter(self.statuses)
+
+    @property
+    def skipped_count(self):
+        counts = self.counts()
+        return sum(counts[status] for status in SKIPPED_STATUSES)
+
+    @property
+    def conflict_count(self):
+        return len(self.statuses) - self.counts()[STATUS_OK]
+
+    def summary(self):
+        """Describe the conflicts found, e.g. for a confirmation prompt"""
+        counts = self.counts()
+        parts = [
+            f"{counts[status]} {STATUS_LABELS[status].lower()}"
+            for status in STATUS_LABELS
+            if status != STATUS_OK and counts[status]
+        ]
+        if not parts:
+            return "No conflicts"
+        return "Conflicts: " + ", ".join(parts)
+
+
+def build_plan(operations, policy=POLICY_SKIP, probe=False):
+    """Check operations for conflicts and apply a conflict policy
+
+    Returns a :class:`Plan`. With ``'skip'`` conflicting rows are left out,
+    with ``'suffix'`` they get a free numbered name such as ``foo (1).jpg``,
+    and with ``'overwrite'`` existing targets are replaced. Two operations
+    aiming at the same target are never both run; under ``'overwrite'`` the
+    later ones are skipped, since replacing would destroy a source file. For
+    the same reason ``'overwrite'`` never replaces a target that is itself
+    the source of another operation in the batch, as with chained rules
+    such as ``.a=.b`` and ``.b=.c``; those rows are skipped too.
+
+    With ``probe`` each target is checked with a single ``lstat`` instead of
+    listing its directory, which is cheaper for a handful of files landing
+    in a large directory.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown conflict policy: {policy}")
+
+    normcase = os.path.normcase
+    split = os.path.split
+
+    # List every affected directory exactly once
+    list_names = _ProbedNames if probe else _list_names
+    listings = {}
+    for operation in operations:
+        directory = split(operation.dst)[0]
+        if directory not in listings:
+            listings[directory] = list_names(directory)
+
+    sources = set()
+    if policy == POLICY_OVERWRITE:
+        sources = {normcase(operation.src) for operation in operations}
+
+    claimed = defaultdict(set)  # directory -> targets taken by this batch
+    planned = []
+    statuses = []
+    for operation in operations:
+        directory, name = split(operation.dst)
+        key = normcase(name)
+        existing = listings[directory]
+        taken = claimed[directory]
+
+        exists = key in existing
+        if exists and normcase(operation.src) == normcase(operation.dst):
+            # Case-only rename of the same file on a case-insensitive system
+            exists = False
+        duplicate = key in taken
+
+        if not exists and not duplicate:
+            status = STATUS_OK
+        elif policy == POLICY_SUFFIX:
+            number = 1
+            while True:
+                candidate = _numbered_name(name, number)
+                candidate_key = normcase(candidate)
+                if candidate_key not in existing and candidate_key not in taken:
+                    break
+                number += 1
+            operation = Operation(operation.src, os.path.join(directory, candidate))
+            key = candidate_key
+            status = STATUS_RENUMBERED
+        elif policy == POLICY_OVERWRITE and not duplicate:
+            if normcase(operation.dst) in sources:
+                status = STATUS_SKIP_SOURCE
+            else:
+                status = STATUS_OVERWRITE
+        else:
+            status = STATUS_SKIP_DUPLICATE if duplicate else STATUS_SKIP_EXISTS
+
+        if status not in SKIPPED_STATUSES:
+            taken.add(key)
+        planned.append(operation)
+        statuses.append(status)
+
+    return Plan(planned, statuses, policy)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer preview dialog
+
+Shows the full plan of a conversion through a lazily populated table model,
+so plans with millions of operations can be browsed, sorted and filtered
+without creating a widget item per cell.
+"""
+
+import os
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
+    QTableView, QHeaderView, QFileDialog, QMessageBox, QAbstractItemView
+)
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+
+from . import engine
+from . import export
+from .planner import STATUS_LABELS
+
+
+class PlanModel(QAbstractTableModel):
+    """Table model over a preflight :class:`planner.Plan`
+
+    Rows are exposed in batches through ``canFetchMore``/``fetchMore`` and
+    cell text is produced on demand in ``data``. Sorting and filtering work
+    on an array of row numbers, never on copies of the operations.
+    """
+    COLUMNS = ("Original Filename", "New Filename", "Size", "Status")
+    FETCH_BATCH = 1000
+
+    def __init__(self, plan, size_of=None, parent=None):
+        super().__init__(parent)
+        self.operations = plan.operations
+        self.statuses = plan.statuses
+        self.size_of = size_of
+        self._order = list(range(len(self.operations)))
+        self._loaded = min(len(self._order), self.FETCH_BATCH)
+        self._filter = ""
+        self._sort = None
+
+    # -- Plan data ---------------------------------------------------------
+
+    def size(self, row):
+        if self.size_of is None:
+            return None
+        return self.size_of(self.operations[row].src)
+
+    def status(self, row):
+        """Return the preflight status of an operation"""
+        return self.statuses[row]
+
+    def visible_count(self):
+        return len(self._order)
+
+    # -- Qt model interface -----------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._order[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return os.path.basename(self.operations[row].src)
+            if column == 1:
+                return os.path.basename(self.operations[row].dst)
+            if column == 2:
+                size = self.size(row)
+                return "" if size is None else engine.format_size(size)
+            return STATUS_LABELS[self.status(row)]
+        if role == Qt.ToolTipRole and column < 2:
+            operation = self.operations[row]
+            return operation.src if column == 0 else operation.dst
+        if role == Qt.TextAlignmentRole and column == 2:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._order)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self._order) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Column -1 means "unsorted", i.e. plan order
+        self._sort = (column, order) if column >= 0 else None
+        self._rebuild()
+
+    def set_filter(self, text):
+        """Only show operations whose original or new name contains ``text``"""
+        self._filter = text.lower()
+        self._rebuild()
+
+    def _sort_key(self, column):
+        operations = self.operations
+        if column == 0:
+            return lambda row: os.path.basename(operations[row].src).lower()
+        if column == 1:
+            return lambda row: os.path.basename(operations[row].dst).lower()
+        if column == 2:
+            return lambda row: self.size(row) or 0
+        return self.status
+
+    def _rebuild(self):
+        """Recompute the visible row order after a sort or filter change"""
+        self.beginResetModel()
+        operations = self.operations
+        rows = range(len(operations))
+        if self._filter:
+            needle = self._filter
+            rows = [
+                row for row in rows
+                if needle in os.path.basename(operations[row].src).lower()
+                or needle in os.path.basename(operations[row].dst).lower()
+            ]
+        if self._sort is not None:
+            column, order = self._sort
+            rows = sorted(rows, key=self._sort_key(column),
+                          reverse=order == Qt.DescendingOrder)
+        self._order = list(rows)
+        self._loaded = min(len(self._order), self.FETCH_BATCH)
+        self.endResetModel()
+
+    def export_rows(self):
+        """Yield every row of the plan, in plan order, for export
+
+        Filtering and sorting only change the view, so the file holds the
+        same rows as the command line's ``--export-plan``.
+        """
+        for row in range(len(self.operations)):
+            operation = self.operations[row]
+            yield operation.src, operation.dst, self.size(row), self.status(row)
+
+
+class PreviewDialog(QDialog):
+    """Dialog for previewing file changes"""
+    def __init__(self, plan, description, size_of=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Preview Changes")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout()
+
+        # Header
+        header_label = QLabel(f"Preview of extension changes ({description})")
+        layout.addWidget(header_label)
+
+        # Filter
+        filter_layout = QHBoxLayout()
+        filter_label = QLabel("Filter:")
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Show only names containing...")
+        self.filter_edit.setClearButtonEnabled(True)
+        filter_layout.addWidget(filter_label)
+        filter_layout.addWidget(self.filter_edit)
+        layout.addLayout(filter_layout)
+
+        # Apply the filter once typing pauses rather than on every keystroke
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(250)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(self.filter_timer.start)
+
+        # Table
+        self.model = PlanModel(plan, size_of, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(-1, Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Interactive)
+        self.table.setColumnWidth(0, 280)
+        self.table.setColumnWidth(1, 280)
+        self.table.setColumnWidth(2, 90)
+        layout.addWidget(self.table)
+
+        # Footer
+        self.footer_label = QLabel()
+        layout.addWidget(self.footer_label)
+        self.update_footer()
+
+        conflicts_label = QLabel(plan.summary())
+        layout.addWidget(conflicts_label)
+
+        # Buttons
+        export_button = QPushButton("Export Plan...")
+        export_button.clicked.connect(self.export_plan)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(export_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def apply_filter(self):
+        """Filter the table by the text in the filter box"""
+        self.model.set_filter(self.filter_edit.text())
+        self.update_footer()
+
+    def update_footer(self):
+        total = len(self.model.operations)
+        visible = self.model.visible_count()
+        if visible == total:
+            self.footer_label.setText(f"{total} files")
+        else:
+            self.footer_label.setText(f"Showing {visible} of {total} files")
+
+    def export_plan(self):
+        """Write the whole plan to a CSV or JSON Lines file"""
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Plan", "plan.csv", "CSV (*.csv);;JSON Lines (*.jsonl)"
+        )
+        if not path:
+            return
+        fmt = 'jsonl' if 'jsonl' in selected_filter else export.format_for_path(path)
+        try:
+            count = export.export_plan(path, self.model.export_rows(), fmt)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Could not export plan: {e}")
+            return
+        QMessageBox.information(self, "Export Plan", f"Exported {count} rows to {path}")
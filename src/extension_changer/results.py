@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer result records
+
+Workers hand back one small tuple per operation, ``(index, error, bytes,
+duration, worker)``, and executors deliver them a chunk at a time. The
+thread that runs the job folds each batch into a :class:`ResultLog`, which
+keeps the operation index, outcome, errno, bytes copied and duration of
+every operation in flat ``array`` columns, with error messages stored only
+for the operations that failed. From the log a run can be reported in
+full, streamed to a JSON Lines file by a :class:`ReportWriter`, and its
+failed operations retried without scanning again.
+
+Report layout (one JSON object per line)::
+
+    {"t": "report", "v": 1, "keep_original": false, "overwrite": false, "operations": 3}
+    {"t": "result", "i": 0, "s": "/data/a.jpeg", "d": "/data/a.jpg", "ok": true, ...}
+    {"t": "result", "i": 2, ..., "ok": false, "errno": 13, "error": "[Errno 13] ..."}
+    {"t": "end", "succeeded": 2, "failed": 1, "cancelled": false}
+"""
+
+import json
+from array import array
+from collections import namedtuple
+
+
+REPORT_VERSION = 1
+
+OUTCOME_DONE = 0
+OUTCOME_FAILED = 1
+
+# Stored in the errno column for results without an errno
+NO_ERRNO = -1
+
+ResultRecord = namedtuple('ResultRecord',
+                          ['index', 'outcome', 'errno', 'bytes', 'duration', 'error'])
+
+
+class ReportError(Exception):
+    """Raised when a file is not a usable result report"""
+
+
+class ResultLog:
+    """Results of an executed plan, in completion order"""
+
+    def __init__(self):
+        self.indices = array('I')  # operation index
+        self.outcomes = array('B')
+        self.errnos = array('i')
+        self.bytes = array('Q')
+        self.durations = array('d')
+        self.errors = {}  # position in the log -> (error type, message)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def extend(self, batch):
+        """Append a batch of worker results and return the failed positions"""
+        errors = self.errors
+        failed = []
+        position = len(self.indices)
+        for index, error, copied, duration, _worker in batch:
+            self.indices.append(index)
+            if error is None:
+                self.outcomes.append(OUTCOME_DONE)
+                self.errnos.append(NO_ERRNO)
+            else:
+                self.outcomes.append(OUTCOME_FAILED)
+                self.errnos.append(NO_ERRNO if error[0] is None else error[0])
+                errors[position] = error[1:]
+                failed.append(position)
+            self.bytes.append(copied)
+            self.durations.append(duration)
+            position += 1
+        return failed
+
+    def discard(self, positions):
+        """Remove the results at ``positions`` from the log"""
+        drop = set(positions)
+        if not drop:
+            return
+        keep = [position for position in range(len(self.indices)) if position not in drop]
+        self.indices = array('I', (self.indices[position] for position in keep))
+        self.outcomes = array('B', (self.outcomes[position] for position in keep))
+        self.errnos = array('i', (self.errnos[position] for position in keep))
+        self.bytes = array('Q', (self.bytes[position] for position in keep))
+        self.durations = array('d', (self.durations[position] for position in keep))
+        self.errors = {new: self.errors[old] for new, old in enumerate(keep)
+                       if old in self.errors}
+
+    def record(self, position):
+        """Return the :class:`ResultRecord` at a position in the log"""
+        errno = self.errnos[position]
+        error = self.errors.get(position)
+        return ResultRecord(
+            self.indices[position],
+            self.outcomes[position],
+            None if errno == NO_ERRNO else errno,
+            self.bytes[position],
+            self.durations[position],
+            None if error is None else error[1],
+        )
+
+    def records(self, start=0):
+        """Yield the records from position ``start`` on"""
+        for position in range(start, len(self.indices)):
+            yield self.record(position)
+
+    def __iter__(self):
+        return self.records()
+
+    def indices_with(self, outcome):
+        """Return the operation indices with an outcome, in completion order"""
+        indices = self.indices
+        if outcome == OUTCOME_FAILED:
+            return array('I', (indices[position] for position in sorted(self.errors)))
+        return array('I', (index for index, result in zip(indices, self.outcomes)
+                           if result == outcome))
+
+
+class ReportWriter:
+    """Streams the results of a run to a JSON Lines report
+
+    Hand it to :func:`engine.execute_plan`, which writes every batch as it
+    arrives; the caller is responsible for :meth:`finish`.
+    """
+
+    def __init__(self, path, operations, keep_original=False, overwrite=False):
+        self.path = path
+        self.operations = operations
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({
+            't': 'report',
+            'v': REPORT_VERSION,
+            'keep_original': keep_original,
+            'overwrite': overwrite,
+            'operations': len(operations),
+        }) + '\n')
+
+    def write(self, log, start):
+        """Write the records of ``log`` from position ``start`` on"""
+        operations = self.operations
+        lines = []
+        for record in log.records(start):
+            operation = operations[record.index]
+            line = {
+                't': 'result',
+                'i': record.index,
+                's': operation.src,
+                'd': operation.dst,
+                'ok': record.outcome == OUTCOME_DONE,
+                'errno': record.errno,
+                'bytes': record.bytes,
+                'seconds': record.duration,
+            }
+            if record.error is not None:
+                line['error'] = record.error
+            lines.append(json.dumps(line))
+        if lines:
+            self._file.write('\n'.join(lines) + '\n')
+
+    def finish(self, report=None):
+        """Write the totals of ``report``, if given, and close the file"""
+        if self._file is None:
+            return
+        if report is not None:
+            self._file.write(json.dumps({
+                't': 'end',
+                'succeeded': report.success_count,
+                'failed': len(report.failures),
+                'cancelled': report.cancelled,
+            }) + '\n')
+        self._file.close()
+        self._file = None
+
+
+def read_failed(path):
+    """Return ``(header, operations)`` for the failed operations of a report
+
+    Operations come back in their original plan order. A torn last line
+    (from an interrupted run) is ignored.
+    """
+    # Imported here because the engine keeps its results in a ResultLog
+    from .engine import Operation
+    header = None
+    failed = {}
+    with open(path, 'r', encoding='utf-8') as fileobj:
+        for line in fileobj:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            kind = record.get('t')
+            if kind == 'result':
+                if not record['ok']:
+                    failed[record['i']] = Operation(record['s'], record['d'])
+            elif kind == 'report':
+                header = record
+    if header is None:
+        raise ReportError(f"Not a result report: {path}")
+    return header, [failed[index] for index in sorted(failed)]
+
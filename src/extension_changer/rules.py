@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer mapping rules
+
+Lets one run apply many ``from -> to`` mappings, such as ``.jpeg -> .jpg``,
+``.JPG -> .jpg`` and ``.tif -> .tiff``, in a single pass over the scanned
+files. Literal suffix rules are compiled into dictionaries, and glob and
+regex rules into one combined regular expression, so every file costs a few
+dictionary lookups and at most one regex match however many rules there are.
+
+Rules are written as ``[i:][glob:|re:]PATTERN=TARGET``::
+
+    .jpeg=.jpg              literal suffix (compound suffixes like .tar.gz work)
+    i:.jpg=.jpg             case-insensitive, e.g. turns .JPG and .Jpg into .jpg
+    glob:IMG_*.png=.webp    file names matching a glob get the target extension
+    re:\\.jpe?g$=.jpg        the matched part of the name is replaced by TARGET,
+                            which may use backreferences such as \\1
+
+When several rules match a file, the first one listed wins.
+"""
+
+import fnmatch
+import os
+import re
+
+from .engine import Operation, normalize_extension
+from .index import extension_of
+
+
+KIND_SUFFIX = 'suffix'
+KIND_GLOB = 'glob'
+KIND_REGEX = 'regex'
+
+_KIND_PREFIXES = {
+    'glob:': KIND_GLOB,
+    're:': KIND_REGEX,
+}
+
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class RuleError(ValueError):
+    """Raised for a rule that cannot be parsed or compiled"""
+
+
+class Rule:
+    """A single ``pattern -> target`` mapping"""
+
+    __slots__ = ('pattern', 'target', 'kind', 'ignore_case', 'regex')
+
+    def __init__(self, pattern, target, kind=KIND_SUFFIX, ignore_case=False):
+        if not pattern:
+            raise RuleError("A rule needs a pattern")
+        self.kind = kind
+        self.ignore_case = ignore_case
+        self.regex = None
+        if kind == KIND_SUFFIX:
+            self.pattern = normalize_extension(pattern)
+            self.target = normalize_extension(target)
+        elif kind == KIND_GLOB:
+            self.pattern = pattern
+            self.target = normalize_extension(target)
+            self.regex = re.compile(fnmatch.translate(pattern),
+                                    re.IGNORECASE if ignore_case else 0)
+        elif kind == KIND_REGEX:
+            self.pattern = pattern
+            self.target = target
+            try:
+                self.regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            except re.error as e:
+                raise RuleError(f"Invalid regular expression {pattern!r}: {e}") from None
+        else:
+            raise RuleError(f"Unknown rule kind: {kind}")
+
+    @classmethod
+    def parse(cls, text, ignore_case=False):
+        """Parse ``[i:][glob:|re:]PATTERN=TARGET``"""
+        spec = text.strip()
+        if spec.startswith('i:'):
+            ignore_case = True
+            spec = spec[2:]
+        kind = KIND_SUFFIX
+        for prefix, prefix_kind in _KIND_PREFIXES.items():
+            if spec.startswith(prefix):
+                kind = prefix_kind
+                spec = spec[len(prefix):]
+                break
+        pattern, separator, target = spec.rpartition('=')
+        if not separator:
+            raise RuleError(f"Expected PATTERN=TARGET, got {text!r}")
+        return cls(pattern, target, kind, ignore_case)
+
+    def __repr__(self):
+        return f"Rule({str(self)!r})"
+
+    def __str__(self):
+        prefix = 'i:' if self.ignore_case else ''
+        if self.kind != KIND_SUFFIX:
+            prefix += 're:' if self.kind == KIND_REGEX else 'glob:'
+        return f"{prefix}{self.pattern}={self.target}"
+
+    def _pattern_source(self):
+        """This rule as a regex that matches from the start of a file name"""
+        if self.kind == KIND_GLOB:
+            source = fnmatch.translate(self.pattern)
+        else:
+            # Let the pattern match anywhere, as re.search would
+            source = f".*?(?:{self.pattern})"
+        if self.ignore_case:
+            source = f"(?i:{source})"
+        return source
+
+    def apply(self, name):
+        """Return the new file name, or ``None`` if this rule does not match"""
+        if self.kind == KIND_SUFFIX:
+            if self.ignore_case:
+                matches = name.lower().endswith(self.pattern.lower())
+            else:
+                matches = name.endswith(self.pattern)
+            if not matches or len(name) == len(self.pattern):
+                return None
+            return name[:-len(self.pattern)] + self.target
+        if self.kind == KIND_GLOB:
+            if not self.regex.match(name):
+                return None
+            extension = extension_of(name)
+            return (name[:-len(extension)] if extension else name) + self.target
+        match = self.regex.search(name)
+        if match is None:
+            return None
+        return name[:match.start()] + match.expand(self.target) + name[match.end():]
+
+
+class RuleSet:
+    """Compiled rules, applied to file names in a single pass"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._exact = {}  # suffix -> rule number
+        self._folded = {}  # lower-cased suffix -> rule number
+        self._max_dots = 0
+        pattern_rules = []
+        for number, rule in enumerate(self.rules):
+            if rule.kind == KIND_SUFFIX:
+                table = self._folded if rule.ignore_case else self._exact
+                key = rule.pattern.lower() if rule.ignore_case else rule.pattern
+                table.setdefault(key, number)
+                self._max_dots = max(self._max_dots, rule.pattern.count('.'))
+            else:
+                pattern_rules.append(number)
+        self._pattern_rules = pattern_rules
+        self._combined = None
+        if pattern_rules and not any(
+                self.rules[number].kind == KIND_REGEX
+                and _BACKREFERENCE.search(self.rules[number].pattern)
+                for number in pattern_rules):
+            # One alternation of every pattern; the first alternative that
+            # matches is the first matching rule. Group numbers inside a
+            # user's regex would shift here, so rules using backreferences
+            # are matched one by one instead.
+            source = '|'.join(f"(?P<r{number}>{self.rules[number]._pattern_source()})"
+                              for number in pattern_rules)
+            try:
+                self._combined = re.compile(source)
+            except re.error:
+                self._combined = None
+
+    @classmethod
+    def parse(cls, specs, ignore_case=False):
+        """Build a rule set from ``[i:][glob:|re:]PATTERN=TARGET`` strings"""
+        return cls(Rule.parse(spec, ignore_case) for spec in specs)
+
+    @classmethod
+    def from_mapping(cls, mapping, ignore_case=False):
+        """Build literal suffix rules from a ``{from_ext: to_ext}`` dict"""
+        return cls(Rule(source, target, KIND_SUFFIX, ignore_case)
+                   for source, target in mapping.items())
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _suffix_rule(self, name):
+        """Return the number of the first literal rule matching ``name``, or ``None``"""
+        if not self._max_dots:
+            return None
+        # Only suffixes at least as long as the file's own extension count,
+        # so a ".gz" rule leaves "a.tar.gz" to a ".tar.gz" rule
+        shortest = len(extension_of(name))
+        if not shortest:
+            return None
+        best = None
+        end = len(name)
+        position = end
+        for _ in range(self._max_dots):
+            position = name.rfind('.', 0, position)
+            if position <= 0:
+                break
+            if end - position < shortest:
+                continue
+            suffix = name[position:]
+            number = self._exact.get(suffix)
+            folded = self._folded.get(suffix.lower()) if self._folded else None
+            for candidate in (number, folded):
+                if candidate is not None and (best is None or candidate < best):
+                    best = candidate
+        return best
+
+    def _pattern_rule(self, name):
+        """Return the number of the first pattern rule matching ``name``, or ``None``"""
+        if self._combined is not None:
+            match = self._combined.match(name)
+            if match is None:
+                return None
+            return int(match.lastgroup[1:])
+        for number in self._pattern_rules:
+            if self.rules[number].apply(name) is not None:
+                return number
+        return None
+
+    def match(self, path):
+        """Return ``(rule, new_path)`` for the first matching rule, or ``None``"""
+        directory, name = os.path.split(path)
+        number = self._suffix_rule(name)
+        if self._pattern_rules:
+            pattern_number = self._pattern_rule(name)
+            if pattern_number is not None and (number is None or pattern_number < number):
+                number = pattern_number
+        if number is None:
+            return None
+        rule = self.rules[number]
+        new_name = rule.apply(name)
+        if new_name is None or new_name == name or not new_name:
+            return None
+        return rule, os.path.join(directory, new_name)
+
+    def target(self, path):
+        """Return the new path for ``path``, or ``None`` if no rule changes it"""
+        matched = self.match(path)
+        return matched[1] if matched else None
+
+    def plan(self, files):
+        """Build the operations for every file some rule changes"""
+        operations = []
+        append = operations.append
+        match = self.match
+        for path in files:
+            matched = match(path)
+            if matched is not None:
+                append(Operation(path, matched[1]))
+        return operations
+
+    def describe(self):
+        return ", ".join(str(rule) for rule in self.rules)
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer persistent scan cache
+
+Remembers directory listings in an SQLite database in the user cache
+directory, so scanning a large, mostly unchanged tree again costs one
+``stat`` per directory instead of a full listing. A cached listing is
+reused while the directory's modification time, inode and device are
+unchanged; anything else is listed again and stored. Files are yielded
+while a directory is being listed or read back, so the first results arrive
+as quickly as with a plain scan. The extension index is rebuilt from the
+cached entries without touching the disk.
+
+The detected types of :mod:`sniffer` can be kept in the same database
+through :meth:`ScanCache.sniff_cache`, so ``--detect`` runs over an
+unchanged tree read no file headers at all.
+
+Adding, removing or renaming an entry updates its directory's modification
+time, but rewriting a file in place does not, so cached file sizes can lag
+behind until the directory changes or is invalidated.
+
+The database is kept under a size limit by evicting the directories that
+were used least recently.
+"""
+
+import os
+import sqlite3
+import time
+
+from .engine import user_cache_dir
+from .scanner import ScanEntry, compile_patterns, _iter_directory
+
+
+SCHEMA_VERSION = 2
+
+# Upper bound for the database, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# A listing taken this soon after its directory changed is not trusted, since
+# a coarse timestamp could hide a second change within the same tick
+RACY_WINDOW_NS = 2 * 10**9
+
+# Directories relisted between commits, so other processes are not locked out
+COMMIT_INTERVAL = 200
+
+# Rows written or read per statement while a directory is streamed
+ROW_BATCH = 1000
+
+# Directories dropped per eviction step
+EVICT_BATCH = 500
+
+# Seconds to wait for another process holding the database
+SQLITE_TIMEOUT = 5.0
+
+# Errors a scan through the cache can raise, from the disk or the database
+CACHE_ERRORS = (OSError, sqlite3.Error)
+
+_SCHEMA = """
+CREATE TABLE directories (
+    id INTEGER PRIMARY KEY,
+    path BLOB NOT NULL UNIQUE,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    device INTEGER,
+    sized INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE TABLE entries (
+    directory INTEGER NOT NULL,
+    name BLOB NOT NULL,
+    size INTEGER,
+    is_dir INTEGER NOT NULL
+);
+CREATE INDEX entries_directory ON entries (directory);
+CREATE INDEX directories_used ON directories (used);
+CREATE TABLE sniffed (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    extension TEXT,
+    PRIMARY KEY (device, inode, size, mtime_ns)
+);
+"""
+
+# Subtree of a directory key: the key itself, or anything from "key/" up to
+# (but excluding) the byte after the separator
+_SUBTREE = "path = ? OR (path >= ? AND path < ?)"
+
+
+def default_cache_path():
+    return os.path.join(user_cache_dir(), 'scan-cache.sqlite3')
+
+
+def _key(path):
+    """Database key of a directory: its absolute path as bytes"""
+    return os.fsencode(os.path.abspath(path))
+
+
+def _subtree_bounds(key):
+    separator = os.fsencode(os.sep)
+    upper = separator[:-1] + bytes([separator[-1] + 1])
+    if key.endswith(separator):
+        # A root such as "/" already ends with the separator
+        key = key[:-len(separator)]
+    return key, key + separator, key + upper
+
+
+class ScanCache:
+    """Directory listings stored in SQLite and revalidated by ``stat``
+
+    A connection belongs to the thread that opened it, so open the cache
+    in the thread that scans.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.hits = 0  # directories served from the cache
+        self.misses = 0  # directories listed again
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT)
+        try:
+            self._setup()
+        except BaseException:
+            self._db.close()
+            raise
+
+    def _setup(self):
+        db = self._db
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        # New database, or one written by another version: start over
+        db.executescript("""
+            DROP TABLE IF EXISTS entries;
+            DROP TABLE IF EXISTS directories;
+            DROP TABLE IF EXISTS sniffed;
+        """)
+        db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        db.execute('VACUUM')
+        db.executescript(_SCHEMA)
+        db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    # -- Scanning ----------------------------------------------------------
+
+    def scan(self, root, recursive=False, max_depth=None, include=None, exclude=None,
+             with_size=False, onerror=None):
+        """Yield a :class:`scanner.ScanEntry` for every file under ``root``
+
+        Takes the same options as :func:`scanner.scan`, apart from
+        ``threads``: unchanged directories only need a ``stat``, and the
+        changed ones are listed one at a time.
+        """
+        include = compile_patterns(include)
+        exclude = compile_patterns(exclude)
+        if not recursive:
+            max_depth = 0
+
+        used = []
+        relisted = 0
+        stack = [(root, 0)]
+        join = os.path.join
+        try:
+            while stack:
+                path, depth = stack.pop()
+                subdirs = []
+                try:
+                    stat = os.stat(path)
+                    key = _key(path)
+                    row = self._db.execute(
+                        'SELECT id, mtime_ns, inode, device, sized FROM directories WHERE path = ?',
+                        (key,),
+                    ).fetchone()
+                    if (row is not None and row[1] == stat.st_mtime_ns and row[2] == stat.st_ino
+                            and row[3] == stat.st_dev and (row[4] or not with_size)):
+                        self.hits += 1
+                        used.append(row[0])
+                        yield from self._read_cached(path, row[0], with_size,
+                                                     include, exclude, subdirs)
+                    else:
+                        self.misses += 1
+                        relisted += 1
+                        yield from self._relist(path, key, row, stat, with_size,
+                                                include, exclude, subdirs)
+                        if relisted % COMMIT_INTERVAL == 0:
+                            self._db.commit()
+                except OSError as e:
+                    if depth == 0:
+                        raise
+                    if onerror:
+                        onerror(e)
+                    continue
+
+                if max_depth is None or depth < max_depth:
+                    stack.extend(
+                        (join(path, name), depth + 1)
+                        for name in reversed(subdirs)
+                        if not (exclude and exclude(name))
+                    )
+        finally:
+            if self._db is not None:
+                self._touch(used)
+                self._db.commit()
+                self.evict()
+
+    def _read_cached(self, path, directory_id, with_size, include, exclude, subdirs):
+        """Yield the files of a cached directory, collecting subdirectory names"""
+        cursor = self._db.execute(
+            'SELECT name, size, is_dir FROM entries WHERE directory = ?', (directory_id,))
+        join = os.path.join
+        fsdecode = os.fsdecode
+        try:
+            while True:
+                rows = cursor.fetchmany(ROW_BATCH)
+                if not rows:
+                    break
+                for name, size, is_dir in rows:
+                    name = fsdecode(name)
+                    if is_dir:
+                        subdirs.append(name)
+                        continue
+                    if exclude and exclude(name):
+                        continue
+                    if include and not include(name):
+                        continue
+                    yield ScanEntry(join(path, name), size if with_size else None)
+        finally:
+            cursor.close()
+
+    def _relist(self, path, key, row, stat, with_size, include, exclude, subdirs):
+        """List a directory from disk, storing it while its files are yielded
+
+        The listing is stored unfiltered, so it can be reused with any
+        include/exclude patterns. It is only marked valid once complete, so a
+        scan stopped halfway lists the directory again next time.
+        """
+        db = self._db
+        directory_id, previous = self._begin_listing(key, row, stat, with_size)
+        insert = 'INSERT INTO entries (directory, name, size, is_dir) VALUES (?, ?, ?, ?)'
+        fsencode = os.fsencode
+        # Entry paths are the directory joined with the name
+        cut = len(os.path.join(path, ''))
+        pending = []
+        children = []
+        for entry in _iter_directory(path, children, with_size, None, None):
+            name = entry.path[cut:]
+            pending.append((directory_id, fsencode(name), entry.size, 0))
+            if len(pending) >= ROW_BATCH:
+                db.executemany(insert, pending)
+                pending = []
+            if exclude and exclude(name):
+                continue
+            if include and not include(name):
+                continue
+            yield entry
+
+        subdirs.extend(child[cut:] for child in children)
+        pending.extend((directory_id, fsencode(name), None, 1) for name in subdirs)
+        db.executemany(insert, pending)
+        # Forget subdirectories that are gone, with everything below them
+        for name in previous.difference(subdirs):
+            self._delete_subtree(_key(os.path.join(path, name)))
+
+        mtime_ns = stat.st_mtime_ns
+        if time.time_ns() - mtime_ns < RACY_WINDOW_NS:
+            mtime_ns = None  # list it again next time
+        db.execute('UPDATE directories SET mtime_ns = ? WHERE id = ?', (mtime_ns, directory_id))
+
+    def _begin_listing(self, key, row, stat, with_size):
+        """Clear a directory's stored listing and mark it as not yet valid
+
+        Returns its id and the names of its previously stored subdirectories.
+        """
+        db = self._db
+        now = time.time()
+        if row is None:
+            directory_id = db.execute(
+                'INSERT INTO directories (path, mtime_ns, inode, device, sized, used) '
+                'VALUES (?, NULL, ?, ?, ?, ?)',
+                (key, stat.st_ino, stat.st_dev, with_size, now),
+            ).lastrowid
+            return directory_id, set()
+
+        directory_id = row[0]
+        previous = {
+            os.fsdecode(name) for (name,) in db.execute(
+                'SELECT name FROM entries WHERE directory = ? AND is_dir', (directory_id,))
+        }
+        db.execute('DELETE FROM entries WHERE directory = ?', (directory_id,))
+        db.execute(
+            'UPDATE directories SET mtime_ns = NULL, inode = ?, device = ?, sized = ?, used = ? '
+            'WHERE id = ?',
+            (stat.st_ino, stat.st_dev, with_size, now, directory_id),
+        )
+        return directory_id, previous
+
+    def _touch(self, directory_ids):
+        """Mark cached directories as recently used, for eviction"""
+        if directory_ids:
+            now = time.time()
+            self._db.executemany('UPDATE directories SET used = ? WHERE id = ?',
+                                 ((now, directory_id) for directory_id in directory_ids))
+
+    def sniff_cache(self):
+        """Return a :class:`StoredSniffCache` kept in this database"""
+        return StoredSniffCache(self._db)
+
+    # -- Invalidation and eviction -------------------------------------------
+
+    def _delete_subtree(self, key):
+        bounds = _subtree_bounds(key)
+        self._db.execute(
+            f'DELETE FROM entries WHERE directory IN (SELECT id FROM directories WHERE {_SUBTREE})',
+            bounds,
+        )
+        self._db.execute(f'DELETE FROM directories WHERE {_SUBTREE}', bounds)
+
+    def invalidate(self, root=None):
+        """Forget the cached listings under ``root``, or everything"""
+        if root is None:
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM directories')
+            self._db.execute('DELETE FROM sniffed')
+        else:
+            self._delete_subtree(_key(root))
+        self._db.commit()
+        self._db.execute('PRAGMA incremental_vacuum')
+
+    def size(self):
+        """Return the bytes of the database in use, excluding free pages"""
+        db = self._db
+        page_size = db.execute('PRAGMA page_size').fetchone()[0]
+        pages = db.execute('PRAGMA page_count').fetchone()[0]
+        free = db.execute('PRAGMA freelist_count').fetchone()[0]
+        return (pages - free) * page_size
+
+    def evict(self):
+        """Drop least recently used directories until under ``max_bytes``
+
+        Every step also drops the oldest detected types. Returns the number
+        of directories dropped.
+        """
+        db = self._db
+        dropped = 0
+        while self.max_bytes is not None and self.size() > self.max_bytes:
+            ids = [row[0] for row in db.execute(
+                'SELECT id FROM directories ORDER BY used LIMIT ?', (EVICT_BATCH,))]
+            sniffed = db.execute(
+                'DELETE FROM sniffed WHERE rowid IN '
+                '(SELECT rowid FROM sniffed ORDER BY rowid LIMIT ?)', (EVICT_BATCH,)).rowcount
+            if not ids and not sniffed:
+                break
+            db.executemany('DELETE FROM entries WHERE directory = ?', ((i,) for i in ids))
+            db.executemany('DELETE FROM directories WHERE id = ?', ((i,) for i in ids))
+            db.commit()
+            dropped += len(ids)
+        if dropped:
+            db.execute('PRAGMA incremental_vacuum')
+        return dropped
+
+    def stats(self):
+        """Return counts describing the cache and the last scans"""
+        db = self._db
+        return {
+            'directories': db.execute('SELECT COUNT(*) FROM directories').fetchone()[0],
+            'entries': db.execute('SELECT COUNT(*) FROM entries').fetchone()[0],
+            'sniffed': db.execute('SELECT COUNT(*) FROM sniffed').fetchone()[0],
+            'bytes': self.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class StoredSniffCache:
+    """:class:`sniffer.SniffCache` counterpart kept in the scan cache database
+
+    Keys are :func:`sniffer.cache_key` tuples. Results are written in the
+    scan cache's transaction and saved when the cache is closed; it belongs
+    to the same thread as its :class:`ScanCache`.
+    """
+
+    MISSING = object()
+
+    def __init__(self, db):
+        self._db = db
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM sniffed').fetchone()[0]
+
+    def get(self, key):
+        """Return the cached type (possibly ``None``), or :attr:`MISSING`"""
+        row = self._db.execute(
+            'SELECT extension FROM sniffed '
+            'WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?', key).fetchone()
+        return self.MISSING if row is None else row[0]
+
+    def put(self, key, extension):
+        self._db.execute(
+            'INSERT OR REPLACE INTO sniffed (device, inode, size, mtime_ns, extension) '
+            'VALUES (?, ?, ?, ?, ?)', key + (extension,))
+
+    def clear(self):
+        self._db.execute('DELETE FROM sniffed')
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer directory scanner
+
+Streams files out of a directory tree using ``os.scandir`` so that the
+type information cached on each ``DirEntry`` is used instead of an extra
+``stat`` per file. Subdirectories can optionally be listed in parallel on a
+thread pool; results are yielded as soon as each directory has been read.
+"""
+
+import fnmatch
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .fileset import FileSet
+
+
+# A scanned file. ``size`` is ``None`` unless the scan was asked for sizes.
+ScanEntry = namedtuple('ScanEntry', ['path', 'size'])
+
+
+def compile_patterns(patterns):
+    """Compile a list of glob patterns into a single name matcher
+
+    Returns ``None`` when there is nothing to match so callers can skip the
+    check entirely.
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    regex = '|'.join(fnmatch.translate(os.path.normcase(p)) for p in patterns)
+    match = re.compile(regex).match
+    return lambda name: match(os.path.normcase(name)) is not None
+
+
+def _iter_directory(path, subdirs, with_size, include, exclude):
+    """Yield the files of one directory, collecting subdirectories on the side
+
+    Files are yielded while the directory is still being read, so even a
+    single directory with millions of entries produces results immediately.
+    """
+    with os.scandir(path) as it:
+        for entry in it:
+            name = entry.name
+            if exclude and exclude(name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    if include and not include(name):
+                        continue
+                    size = entry.stat().st_size if with_size else None
+                    yield ScanEntry(entry.path, size)
+            except OSError:
+                # The entry vanished or cannot be inspected, skip it
+                continue
+
+
+def _list_directory(path, with_size, include, exclude):
+    """Read one directory and split it into files and subdirectories"""
+    subdirs = []
+    files = list(_iter_directory(path, subdirs, with_size, include, exclude))
+    return files, subdirs
+
+
+def scan(root, recursive=False, max_depth=None, include=None, exclude=None,
+         threads=1, with_size=False, onerror=None):
+    """Yield a :class:`ScanEntry` for every file under ``root``
+
+    ``max_depth`` limits how many directory levels below ``root`` are visited
+    (0 means only ``root`` itself). ``include`` and ``exclude`` are glob
+    patterns matched against file names; ``exclude`` also prunes directories.
+    Errors listing ``root`` are raised, errors on subdirectories are passed
+    to ``onerror`` (if given) and the directory is skipped, like ``os.walk``.
+    """
+    include = compile_patterns(include)
+    exclude = compile_patterns(exclude)
+    if not recursive:
+        max_depth = 0
+
+    subdirs = []
+    yield from _iter_directory(root, subdirs, with_size, include, exclude)
+    if max_depth == 0 or not subdirs:
+        return
+
+    if threads and threads > 1:
+        yield from _scan_parallel(subdirs, max_depth, threads, with_size,
+                                  include, exclude, onerror)
+    else:
+        yield from _scan_serial(subdirs, max_depth, with_size,
+                                include, exclude, onerror)
+
+
+def _scan_serial(subdirs, max_depth, with_size, include, exclude, onerror):
+    stack = [(path, 1) for path in reversed(subdirs)]
+    while stack:
+        path, depth = stack.pop()
+        children = []
+        try:
+            yield from _iter_directory(path, children, with_size, include, exclude)
+        except OSError as e:
+            if onerror:
+                onerror(e)
+            continue
+        if max_depth is None or depth < max_depth:
+            stack.extend((child, depth + 1) for child in reversed(children))
+
+
+def _scan_parallel(subdirs, max_depth, threads, with_size, include, exclude, onerror):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        def submit(path, depth):
+            future = executor.submit(_list_directory, path, with_size, include, exclude)
+            pending[future] = depth
+
+        pending = {}
+        for path in subdirs:
+            submit(path, 1)
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    depth = pending.pop(future)
+                    try:
+                        files, children = future.result()
+                    except OSError as e:
+                        if onerror:
+                            onerror(e)
+                        continue
+                    if max_depth is None or depth < max_depth:
+                        for child in children:
+                            submit(child, depth + 1)
+                    yield from files
+        finally:
+            # Stop queued listings if the consumer stops early
+            for future in pending:
+                future.cancel()
+
+
+def collect(root, fileset=None, **kwargs):
+    """Scan ``root`` into a compact :class:`fileset.FileSet` and return it
+
+    Pass an existing ``fileset`` to add to it, e.g. when several folders
+    are scanned for one job.
+    """
+    if fileset is None:
+        fileset = FileSet()
+    fileset.add_entries(scan(root, **kwargs))
+    return fileset
+
+
+def scan_batches(root, batch_size=1000, **kwargs):
+    """Yield lists of at most ``batch_size`` scan entries
+
+    Useful for consumers that want to update incrementally without paying a
+    callback per file.
+    """
+    batch = []
+    for entry in scan(root, **kwargs):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer size-aware scheduling
+
+Copy jobs run in plan order by default, so a few multi-gigabyte files near
+the end of the list can keep one worker busy long after the others went
+idle. :class:`CopySchedule` instead hands out work from separate queues:
+metadata-only operations (renames and removals) first, then large copies
+longest first, with small copies filling the gaps. At most
+``max_large`` large copies are in flight at once so the disk is not
+thrashed by many parallel streams. Longest-first ordering keeps the total
+time close to the total work divided by the number of workers.
+"""
+
+import os
+
+from . import executors
+from .executors import LARGE_COPY_SIZE, LARGE_COPY_WORKERS
+
+
+def _stat_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+class CopySchedule:
+    """Iterator of ``(index, operation)`` tasks for an executor
+
+    ``sizes`` holds the size of each operation's source as found at scan
+    time, with ``None`` where it is unknown; those files are sized with a
+    ``stat``. The consumer must call :meth:`finished` with the index of
+    every result so large copies can be counted back in. While the cap on
+    large copies is reached and only large copies are left, the iterator
+    yields :data:`executors.WAIT`.
+    """
+
+    def __init__(self, operations, keep_original, sizes=None,
+                 large_size=LARGE_COPY_SIZE, max_large=LARGE_COPY_WORKERS):
+        self.operations = operations
+        self.max_large = max_large
+        self.large_in_flight = 0
+        self.bytes = 0
+        metadata = []
+        small = []
+        large = []
+        for index, operation in enumerate(operations):
+            if operation.dst is None or not keep_original:
+                metadata.append(index)
+                continue
+            size = sizes[index] if sizes is not None else None
+            if size is None:
+                size = _stat_size(operation.src)
+            self.bytes += size
+            (large if size >= large_size else small).append((size, index))
+        # Popped from the end, so these come out largest first
+        small.sort()
+        large.sort()
+        metadata.reverse()
+        self._metadata = metadata
+        self._small = small
+        self._large = large
+        self._large_indices = {index for _, index in large}
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._metadata:
+            index = self._metadata.pop()
+        elif self._large and (not self.max_large or self.large_in_flight < self.max_large):
+            index = self._large.pop()[1]
+            self.large_in_flight += 1
+        elif self._small:
+            index = self._small.pop()[1]
+        elif self._large:
+            return executors.WAIT
+        else:
+            raise StopIteration
+        return index, self.operations[index]
+
+    def finished(self, index):
+        """Record that the operation at ``index`` completed or failed"""
+        if index in self._large_indices:
+            self._large_indices.discard(index)
+            self.large_in_flight -= 1
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer content sniffing
+
+Finds files whose extension does not match their content, such as PNGs
+saved as ``.jpg``, by reading only the first few bytes of each file and
+matching them against a built-in table of magic numbers. Headers are read
+with a single unbuffered ``os.read`` on the workers of an
+:mod:`executors` backend, and results are cached by device, inode, size and
+modification time, so checking the same files again (e.g. preview, then
+convert) only costs a ``stat`` each.
+
+A file is left alone when its extension is one of the accepted names for
+the detected type: a ``.docx`` is a ZIP archive and a ``.jpeg`` a JPEG, so
+neither is renamed.
+"""
+
+import os
+from collections import namedtuple
+
+from . import executors
+from . import metrics
+from .engine import Operation, auto_chunksize, target_path
+from .index import extension_of
+
+
+# Bytes read from the start of every file
+HEADER_SIZE = 32
+
+# Most results kept by a SniffCache; the oldest are dropped first
+DEFAULT_CACHE_ENTRIES = 1000000
+
+# ``parts`` are ``(offset, bytes)`` pairs that must all match. ``aliases``
+# are other extensions that are correct for the same content.
+Signature = namedtuple('Signature', ['parts', 'extension', 'aliases'])
+
+_ZIP_CONTAINERS = (
+    '.docx', '.docm', '.xlsx', '.xlsm', '.pptx', '.pptm', '.odt', '.ods', '.odp',
+    '.odg', '.epub', '.jar', '.war', '.ear', '.apk', '.aab', '.ipa', '.xpi', '.whl',
+    '.nupkg', '.vsix', '.kmz', '.3mf', '.cbz', '.zipx',
+)
+
+_TIFF_BASED = ('.tif', '.dng', '.nef', '.cr2', '.arw', '.orf', '.pef', '.srw')
+
+# ISO base media files share one container; the brand only hints at the use
+_ISO_MEDIA = ('.mp4', '.m4v', '.m4a', '.m4b', '.m4p', '.mov', '.3gp', '.3g2',
+              '.heic', '.heif', '.avif')
+
+MAGIC_NUMBERS = [
+    Signature(((0, b'\x89PNG\r\n\x1a\n'),), '.png', ()),
+    Signature(((0, b'\xff\xd8\xff'),), '.jpg', ('.jpeg', '.jpe', '.jfif')),
+    Signature(((0, b'GIF87a'),), '.gif', ()),
+    Signature(((0, b'GIF89a'),), '.gif', ()),
+    Signature(((0, b'BM'), (6, b'\x00\x00\x00\x00')), '.bmp', ('.dib',)),
+    Signature(((0, b'RIFF'), (8, b'WEBP')), '.webp', ()),
+    Signature(((0, b'RIFF'), (8, b'WAVE')), '.wav', ()),
+    Signature(((0, b'RIFF'), (8, b'AVI ')), '.avi', ()),
+    Signature(((0, b'II*\x00'),), '.tiff', _TIFF_BASED),
+    Signature(((0, b'MM\x00*'),), '.tiff', _TIFF_BASED),
+    Signature(((0, b'\x00\x00\x01\x00'),), '.ico', ()),
+    Signature(((0, b'8BPS'),), '.psd', ('.psb',)),
+    Signature(((0, b'%PDF-'),), '.pdf', ('.ai',)),
+    Signature(((0, b'%!PS'),), '.ps', ('.eps',)),
+    Signature(((0, b'{\\rtf'),), '.rtf', ()),
+    Signature(((0, b'PK\x03\x04'),), '.zip', _ZIP_CONTAINERS),
+    Signature(((0, b'PK\x05\x06'),), '.zip', _ZIP_CONTAINERS),
+    Signature(((0, b'\x1f\x8b\x08'),), '.gz', ('.tgz', '.tar.gz', '.svgz', '.nii.gz', '.warc.gz')),
+    Signature(((0, b'BZh'),), '.bz2', ('.tbz', '.tbz2', '.tar.bz2')),
+    Signature(((0, b'\xfd7zXZ\x00'),), '.xz', ('.txz', '.tar.xz')),
+    Signature(((0, b'(\xb5/\xfd'),), '.zst', ('.tzst', '.tar.zst')),
+    Signature(((0, b"7z\xbc\xaf'\x1c"),), '.7z', ()),
+    Signature(((0, b'Rar!\x1a\x07'),), '.rar', ()),
+    Signature(((0, b'ID3'),), '.mp3', ()),
+    Signature(((0, b'OggS'),), '.ogg', ('.oga', '.ogv', '.ogx', '.opus', '.spx')),
+    Signature(((0, b'fLaC'),), '.flac', ()),
+    Signature(((0, b'\x1aE\xdf\xa3'),), '.mkv', ('.webm', '.mka', '.mk3d')),
+    Signature(((4, b'ftyp'),), '.mp4', _ISO_MEDIA),
+    Signature(((0, b'SQLite format 3\x00'),), '.sqlite', ('.sqlite3', '.db', '.db3')),
+    Signature(((0, b'\x00asm'),), '.wasm', ()),
+    Signature(((0, b'wOFF'),), '.woff', ()),
+    Signature(((0, b'wOF2'),), '.woff2', ()),
+    Signature(((0, b'OTTO'),), '.otf', ()),
+]
+
+# ISO media brands (bytes 8-12) that name a more specific extension than .mp4
+_ISO_BRANDS = {
+    b'qt  ': '.mov',
+    b'M4A ': '.m4a',
+    b'M4B ': '.m4b',
+    b'M4V ': '.m4v',
+    b'heic': '.heic',
+    b'heix': '.heic',
+    b'mif1': '.heif',
+    b'avif': '.avif',
+    b'3gp4': '.3gp',
+    b'3gp5': '.3gp',
+    b'3g2a': '.3g2',
+}
+
+_ACCEPTED = {}
+for _signature in MAGIC_NUMBERS:
+    _ACCEPTED.setdefault(_signature.extension, {_signature.extension}).update(_signature.aliases)
+del _signature
+
+
+def detect_header(header):
+    """Return the extension for a file starting with ``header``, or ``None``"""
+    for signature in MAGIC_NUMBERS:
+        for offset, magic in signature.parts:
+            if header[offset:offset + len(magic)] != magic:
+                break
+        else:
+            if signature.extension == '.mp4':
+                return _ISO_BRANDS.get(header[8:12], '.mp4')
+            return signature.extension
+    return None
+
+
+def accepts(extension, detected):
+    """Whether ``extension`` is a correct name for content of type ``detected``"""
+    extension = extension.lower()
+    if detected in _ISO_MEDIA:
+        # An ISO media brand is only a hint, e.g. a .mov may say "isom"
+        return extension in _ISO_MEDIA
+    return extension in _ACCEPTED.get(detected, (detected,))
+
+
+def cache_key(stat):
+    """Key under which the type of a file is cached"""
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def read_header(path, size=HEADER_SIZE):
+    """Return ``(header, stat)`` for a file, reading at most ``size`` bytes"""
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        stat = os.fstat(fd)
+        header = os.read(fd, size)
+    finally:
+        os.close(fd)
+    return header, stat
+
+
+def _sniff_indexed(item):
+    """Worker task: return ``(index, cache key, detected extension)``"""
+    index, path = item
+    try:
+        header, stat = read_header(path)
+    except OSError:
+        return index, None, None
+    return index, cache_key(stat), detect_header(header)
+
+
+class SniffCache:
+    """Detected types by :func:`cache_key`, bounded to ``max_entries``
+
+    Renames keep the inode and modification time, so results stay valid
+    after the files they describe are converted.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._types = {}
+
+    def __len__(self):
+        return len(self._types)
+
+    def get(self, key):
+        """Return the cached type (possibly ``None``), or :attr:`MISSING`"""
+        return self._types.get(key, self.MISSING)
+
+    def put(self, key, extension):
+        types = self._types
+        if key not in types and len(types) >= self.max_entries:
+            # Dicts keep insertion order, so this drops the oldest entry
+            del types[next(iter(types))]
+        types[key] = extension
+
+    def clear(self):
+        self._types.clear()
+
+
+def detect_types(paths, backend='auto', workers=None, cache=None, chunksize=None,
+                 should_cancel=None, progress=None, progress_interval=None):
+    """Return the detected extension of every file, in the order of ``paths``
+
+    Unknown or unreadable files give ``None``. ``paths`` may be a
+    :class:`fileset.FileView`. With a non-empty :class:`SniffCache`, each
+    file is stat-ed first and only files not in the cache are read.
+    ``progress`` is called as ``progress(current, total)`` for the files
+    that have to be read, at most once per ``progress_interval`` seconds
+    if one is given.
+    """
+    if not hasattr(paths, '__getitem__'):
+        paths = list(paths)
+    results = [None] * len(paths)
+
+    if cache is not None and len(cache):
+        todo = []
+        missing = cache.MISSING
+        for index, path in enumerate(paths):
+            try:
+                cached = cache.get(cache_key(os.stat(path)))
+            except OSError:
+                continue
+            if cached is missing:
+                todo.append(index)
+            else:
+                results[index] = cached
+    else:
+        todo = range(len(paths))
+
+    if backend == 'auto':
+        # Header reads wait on the disk, not the CPU
+        backend = 'serial' if len(todo) < executors.SERIAL_THRESHOLD else 'thread'
+    with executors.create_executor(backend, workers) as executor:
+        if not chunksize:
+            chunksize = auto_chunksize(len(todo), executor.workers)
+        tasks = ((index, paths[index]) for index in todo)
+        throttle = None
+        if progress and progress_interval:
+            progress = throttle = metrics.ProgressThrottle(progress, progress_interval)
+        total = len(todo)
+        for done, (index, key, extension) in enumerate(executor.imap_unordered(
+                _sniff_indexed, tasks, chunksize, should_cancel), 1):
+            results[index] = extension
+            if cache is not None and key is not None:
+                cache.put(key, extension)
+            if progress:
+                progress(done, total)
+    if throttle is not None:
+        throttle.flush()
+    return results
+
+
+def plan_detected(paths, detected):
+    """Build operations giving each file the extension its content calls for"""
+    operations = []
+    for path, extension in zip(paths, detected):
+        if extension is None:
+            continue
+        current = extension_of(path)
+        if accepts(current, extension):
+            continue
+        operations.append(Operation(path, target_path(path, extension, current)))
+    return operations
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extension Changer folder watcher
+
+Keeps a landing folder converted as files arrive. Directory changes come
+from inotify on Linux, or from a poller that only relists directories whose
+modification time changed. Every new file waits until it has not been
+written to for a settle period, then files are converted in small batches
+through the normal plan and execute path. Work per event is proportional to
+the number of changed files, not to the size of the folder.
+"""
+
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from . import engine
+from . import planner
+from .rules import RuleSet
+
+
+# Seconds a file must go unmodified before it is converted
+DEFAULT_SETTLE = 2.0
+
+# Most files converted in one batch
+DEFAULT_BATCH_SIZE = 100
+
+# Seconds between directory checks when polling
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Longest wait for events, so a stop request is noticed promptly
+MAX_WAIT = 1.0
+
+# Names never picked up, such as in-progress copies from copier.temp_path
+IGNORED_SUFFIXES = ('.partial',)
+
+# A file or directory that appeared or was written to
+WatchEvent = namedtuple('WatchEvent', ['path', 'is_dir'])
+
+
+def _scan_directory(path):
+    """Return ``(files, subdirectories)`` directly inside ``path``"""
+    files = []
+    directories = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+    return files, directories
+
+
+# ---------------------------------------------------------------------------
+# Event sources
+# ---------------------------------------------------------------------------
+
+class InotifySource:
+    """Directory events from Linux inotify, read through ctypes"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_ONLYDIR = 0x01000000
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+
+    _HEADER = struct.Struct('iIII')
+
+    def __init__(self, root, recursive=False):
+        # ctypes is only needed here, so plain CLI runs do not pay for it
+        import ctypes
+        self._get_errno = ctypes.get_errno
+        libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            self._add_watch_call = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available") from None
+        self.fd = init(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self.fd < 0:
+            error = self._get_errno()
+            raise OSError(error, os.strerror(error))
+        self.root = root
+        self.recursive = recursive
+        self._directories = {}  # watch descriptor -> directory path
+        self._overflowed = False
+
+    @classmethod
+    def available(cls):
+        return sys.platform.startswith('linux')
+
+    def add_directory(self, path):
+        """Watch a directory, returning the files and subdirectories already in it"""
+        wd = self._add_watch_call(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            error = self._get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return [], []
+            raise OSError(error, f"Cannot watch {path}: {os.strerror(error)}")
+        self._directories[wd] = path
+        files, directories = _scan_directory(path)
+        if self.recursive:
+            for directory in directories:
+                subfiles, _ = self.add_directory(directory)
+                files.extend(subfiles)
+        return files, directories
+
+    def start(self):
+        """Begin watching and return the files already present"""
+        return self.add_directory(self.root)[0]
+
+    def read(self, timeout):
+        """Wait up to ``timeout`` seconds and return the new :class:`WatchEvent` list"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        header_size = self._HEADER.size
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = self._HEADER.unpack_from(data, offset)
+                name = data[offset + header_size:offset + header_size + length].rstrip(b'\0')
+                offset += header_size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    self._overflowed = True
+                    continue
+                if mask & self.IN_IGNORED:
+                    self._directories.pop(wd, None)
+                    continue
+                directory = self._directories.get(wd)
+                if directory is None or not name:
+                    continue
+                events.append(WatchEvent(os.path.join(directory, os.fsdecode(name)),
+                                         bool(mask & self.IN_ISDIR)))
+        if self._overflowed:
+            # Events were lost; relist what is watched once to catch up
+            self._overflowed = False
+            for directory in list(self._directories.values()):
+                files, _ = _scan_directory(directory)
+                events.extend(WatchEvent(path, False) for path in files)
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingSource:
+    """Directory events found by comparing directory modification times
+
+    Each poll costs one ``stat`` per watched directory; only directories that
+    changed are listed again.
+    """
+
+    def __init__(self, root, recursive=False, interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.recursive = recursive
+        self.interval = interval
+        self._directories = {}  # path -> (mtime_ns, set of names)
+        self._next_poll = 0.0
+
+    def _snapshot(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None, [], []
+        files, directories = _scan_directory(path)
+        names = {os.path.basename(p) for p in files}
+        names.update(os.path.basename(p) for p in directories)
+        return (mtime, names), files, directories
+
+    def add_directory(self, path):
+        """Watch a directory, returning the files and subdirectories already in it"""
+        state, files, directories = self._snapshot(path)
+        if state is None:
+            return [], []
+        self._directories[path] = state
+        if self.recursive:
+            for directory in directories:
+                subfiles, _ = self.add_directory(directory)
+                files.extend(subfiles)
+        return files, directories
+
+    def start(self):
+        """Begin watching and return the files already present"""
+        self._next_poll = time.monotonic() + self.interval
+        return self.add_directory(self.root)[0]
+
+    def read(self, timeout):
+        """Wait up to ``timeout`` seconds and return the new :class:`WatchEvent` list"""
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        self._next_poll = time.monotonic() + self.interval
+
+        events = []
+        for path, (mtime, names) in list(self._directories.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                del self._directories[path]
+                continue
+            if current == mtime:
+                continue
+            state, files, directories = self._snapshot(path)
+            if state is None:
+                continue
+            self._directories[path] = state
+            for file_path in files:
+                if os.path.basename(file_path) not in names:
+                    events.append(WatchEvent(file_path, False))
+            for directory in directories:
+                if os.path.basename(directory) not in names:
+                    events.append(WatchEvent(directory, True))
+        return events
+
+    def close(self):
+        self._directories.clear()
+
+
+# ---------------------------------------------------------------------------
+# Watcher
+# ---------------------------------------------------------------------------
+
+class FolderWatcher:
+    """Convert matching files in a folder as they arrive
+
+    ``rules`` is a :class:`rules.RuleSet`, or a dict mapping source
+    extensions to target extensions. Files are
+    collected as they appear, converted once they have settled, and handed
+    to :func:`engine.execute_plan` at most ``batch_size`` at a time.
+    ``on_batch`` is called with each batch's :class:`planner.Plan` and
+    :class:`engine.ConversionReport`. With ``durable`` every batch is
+    synced to disk before it is reported.
+
+    Renames never replace a target that appeared after planning. Such a
+    conflict is not reported as a failure: the row is marked as skipped and
+    the file is planned again with the next batch, where the conflict
+    policy decides whether it is skipped or given a numbered name.
+    """
+
+    def __init__(self, root, rules, recursive=False, keep_original=False,
+                 policy=planner.POLICY_SKIP, settle=DEFAULT_SETTLE,
+                 batch_size=DEFAULT_BATCH_SIZE, backend='auto', workers=None,
+                 preserve_metadata=False, poll=False, poll_interval=DEFAULT_POLL_INTERVAL,
+                 on_batch=None, durable=False):
+        self.root = root
+        if isinstance(rules, dict):
+            rules = RuleSet.from_mapping(rules)
+        self.rules = rules
+        self.recursive = recursive
+        self.keep_original = keep_original
+        self.policy = policy
+        self.settle = settle
+        self.batch_size = batch_size
+        self.backend = backend
+        self.workers = workers
+        self.preserve_metadata = preserve_metadata
+        self.durable = durable
+        self.on_batch = on_batch
+        self.source = None
+        if not poll and InotifySource.available():
+            try:
+                self.source = InotifySource(root, recursive)
+            except OSError:
+                pass  # e.g. out of inotify instances; polling still works
+        if self.source is None:
+            self.source = PollingSource(root, recursive, poll_interval)
+        self._pending = {}  # path -> monotonic time it is next checked
+        self._stopped = False
+
+    def target(self, path):
+        """Return the path a file will be converted to, or ``None``"""
+        if path.endswith(IGNORED_SUFFIXES) or os.path.basename(path).startswith('.'):
+            return None
+        return self.rules.target(path)
+
+    def _add_file(self, path, now):
+        if self.target(path) is not None:
+            self._pending[path] = now + self.settle
+
+    def _handle(self, events, now):
+        for event in events:
+            if event.is_dir:
+                if self.recursive:
+                    files, _ = self.source.add_directory(event.path)
+                    for path in files:
+                        self._add_file(path, now)
+            else:
+                self._add_file(event.path, now)
+
+    def _settled(self, now):
+        """Return pending files that stopped changing, rescheduling the others"""
+        ready = []
+        wall = time.time()
+        for path, due in list(self._pending.items()):
+            if due > now:
+                continue
+            try:
+                quiet = wall - os.stat(path).st_mtime
+            except OSError:
+                # Gone again before it settled
+                del self._pending[path]
+                continue
+            if quiet >= self.settle:
+                del self._pending[path]
+                ready.append(path)
+            else:
+                self._pending[path] = now + self.settle - quiet
+        return ready
+
+    def convert(self, paths):
+        """Plan and execute one batch of settled files"""
+        operations = []
+        for path in paths:
+            target = self.target(path)
+            if target is not None:
+                operations.append(engine.Operation(path, target))
+        plan = planner.build_plan(operations, self.policy, probe=True)
+        report = engine.execute_plan(
+            plan.runnable(),
+            keep_original=self.keep_original,
+            backend=self.backend,
+            workers=self.workers,
+            preserve_metadata=self.preserve_metadata,
+            overwrite=plan.overwrite,
+            durable=self.durable,
+        )
+        self._requeue_conflicts(plan, report)
+        if self.on_batch:
+            self.on_batch(plan, report)
+        return report
+
+    def _requeue_conflicts(self, plan, report):
+        """Take operations whose target appeared after planning out of a batch
+
+        They are marked as skipped in ``plan``, dropped from ``report`` and
+        queued to be planned again right away.
+        """
+        log = report.results
+        positions = [position for position in log.errors
+                     if log.errnos[position] == errno.EEXIST]
+        if not positions:
+            return
+        conflicted = {report.operations[log.indices[position]].src for position in positions}
+        report.withdraw(positions)
+        for row, operation in enumerate(plan.operations):
+            if (operation.src in conflicted
+                    and plan.statuses[row] not in planner.SKIPPED_STATUSES):
+                plan.statuses[row] = planner.STATUS_SKIP_EXISTS
+        now = time.monotonic()
+        for path in conflicted:
+            self._pending[path] = now
+
+    def stop(self):
+        """Ask :meth:`run` to return after the current step"""
+        self._stopped = True
+
+    def run(self, include_existing=True):
+        """Watch until :meth:`stop` is called
+
+        With ``include_existing`` the files already in the folder are
+        converted too, once they have settled.
+        """
+        self._stopped = False
+        existing = self.source.start()
+        now = time.monotonic()
+        if include_existing:
+            for path in existing:
+                self._add_file(path, now)
+        try:
+            while not self._stopped:
+                if self._pending:
+                    wait = max(0.0, min(self._pending.values()) - time.monotonic())
+                    wait = min(wait, MAX_WAIT)
+                else:
+                    wait = MAX_WAIT
+                events = self.source.read(wait)
+                now = time.monotonic()
+                self._handle(events, now)
+                ready = self._settled(now)
+                for start in range(0, len(ready), self.batch_size):
+                    if self._stopped:
+                        break
+                    self.convert(ready[start:start + self.batch_size])
+        finally:
+            self.source.close()
@@ -0,0 +1,41 @@
+import os
+
+from extension_changer import benchmark
+
+
+def tree_files(root):
+    return sorted(os.path.relpath(os.path.join(folder, name), root)
+                  for folder, _, names in os.walk(root) for name in names)
+
+
+def test_make_tree_is_deterministic(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    total = benchmark.make_tree(str(first), files=20, depth=1, fanout=3, seed=1)
+    assert benchmark.make_tree(str(second), files=20, depth=1, fanout=3, seed=1) == total
+    assert tree_files(first) == tree_files(second)
+    assert len(tree_files(first)) == 20
+    assert sum(os.path.getsize(first / path) for path in tree_files(first)) == total
+
+
+def test_runs_restore_the_tree(tmp_path):
+    benchmark.make_tree(str(tmp_path), files=12, depth=1, fanout=2, sizes='empty')
+    before = tree_files(tmp_path)
+    results = benchmark.run_benchmarks(str(tmp_path), backends=('serial', 'thread'),
+                                       worker_counts=(2,), repeat=2)
+    assert [benchmark.result_key(result) for result in results] == [
+        'scan', 'index', 'plan', 'rename/serial/1', 'rename/thread/2',
+        'copy/serial/1', 'copy/thread/2']
+    assert all(result['runs'] == 2 for result in results)
+    assert tree_files(tmp_path) == before
+
+
+def test_compare_flags_stages_over_the_threshold():
+    def result(stage, seconds):
+        return {'stage': stage, 'backend': None, 'workers': None, 'seconds': seconds}
+
+    baseline = [result('scan', 1.0), result('plan', 1.0), result('index', 0.0)]
+    current = [result('scan', 1.05), result('plan', 1.5), result('index', 1.0),
+               result('rename', 1.0)]
+    rows, regressions = benchmark.compare(current, baseline, threshold=0.10)
+    assert [row[0] for row in rows] == ['scan', 'plan']
+    assert regressions == ['plan']
@@ -0,0 +1,60 @@
+import os
+
+from extension_changer import cli, engine
+
+
+def write(path, text=''):
+    with open(path, 'w') as fileobj:
+        fileobj.write(text)
+
+
+def make_folder(tmp_path):
+    for name in ('a.txt', 'b.txt', 'c.png'):
+        write(tmp_path / name, name)
+    return str(tmp_path)
+
+
+def test_normalize_extension():
+    assert engine.normalize_extension('txt') == '.txt'
+    assert engine.normalize_extension('.txt') == '.txt'
+
+
+def test_renames_matching_files(tmp_path):
+    assert cli.main([make_folder(tmp_path), '--from', 'txt', '--to', '.md', '-q']) == 0
+    assert sorted(os.listdir(tmp_path)) == ['a.md', 'b.md', 'c.png']
+    assert (tmp_path / 'a.md').read_text() == 'a.txt'
+
+
+def test_keep_original_copies(tmp_path):
+    assert cli.main([make_folder(tmp_path), '--from', '.txt', '--to', '.md', '-k', '-q']) == 0
+    assert sorted(os.listdir(tmp_path)) == ['a.md', 'a.txt', 'b.md', 'b.txt', 'c.png']
+    assert (tmp_path / 'b.md').read_text() == 'b.txt'
+
+
+def test_dry_run_changes_nothing(tmp_path, capsys):
+    assert cli.main([make_folder(tmp_path), '--from', 'txt', '--to', 'md', '--dry-run']) == 0
+    assert sorted(os.listdir(tmp_path)) == ['a.txt', 'b.txt', 'c.png']
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        f"{tmp_path / 'a.txt'} -> {tmp_path / 'a.md'}",
+        f"{tmp_path / 'b.txt'} -> {tmp_path / 'b.md'}",
+    ]
+
+
+def test_missing_path_fails(tmp_path, capsys):
+    assert cli.main([str(tmp_path / 'missing'), '--from', 'txt', '--to', 'md']) == 2
+    assert 'missing' in capsys.readouterr().err
+
+
+def test_auto_chunksize_gives_each_worker_about_four_batches():
+    assert engine.auto_chunksize(80, 4) == 5
+    assert engine.auto_chunksize(81, 4) == 6
+    assert engine.auto_chunksize(3, 4) == 1
+
+
+def test_parallel_renames_in_chunks(tmp_path):
+    for number in range(10):
+        write(tmp_path / f'{number}.txt', str(number))
+    assert cli.main([str(tmp_path), '--from', 'txt', '--to', 'md', '-j', '2',
+                     '--chunksize', '3', '-q']) == 0
+    assert sorted(os.listdir(tmp_path)) == sorted(f'{number}.md' for number in range(10))
+    assert (tmp_path / '7.md').read_text() == '7'
@@ -0,0 +1,143 @@
+import errno
+import os
+import sys
+
+import pytest
+
+from extension_changer import copier
+
+
+def write(path, data):
+    with open(path, 'wb') as fileobj:
+        fileobj.write(data)
+
+
+def read(path):
+    with open(path, 'rb') as fileobj:
+        return fileobj.read()
+
+
+def test_copy_file(tmp_path):
+    src, dst = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    data = os.urandom(3 * 1024 * 1024 + 7)
+    write(src, data)
+    assert copier.copy_file(str(src), str(dst), bufsize=64 * 1024) == len(data)
+    assert read(dst) == data
+    assert sorted(os.listdir(tmp_path)) == ['a.bin', 'b.bin']
+
+
+def test_chunked_copy_is_used_when_kernel_copies_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr(copier, '_kernel_methods', lambda: [])
+    src, dst = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    write(src, b'data' * 1000)
+    copier.copy_file(str(src), str(dst), bufsize=7)
+    assert read(dst) == b'data' * 1000
+
+
+def test_interrupted_copy_leaves_nothing_behind(tmp_path, monkeypatch):
+    src, dst = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    write(src, b'x' * 4096)
+
+    def failing_copy(fsrc, fdst, bufsize):
+        fdst.write(b'partial')
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(copier, 'copy_fileobj', failing_copy)
+    with pytest.raises(OSError):
+        copier.copy_file(str(src), str(dst))
+    assert os.listdir(tmp_path) == ['a.bin']
+
+
+def test_copy_never_replaces_without_overwrite(tmp_path):
+    src, dst = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    write(src, b'new')
+    write(dst, b'old')
+    with pytest.raises(FileExistsError):
+        copier.copy_file(str(src), str(dst), overwrite=False)
+    assert read(dst) == b'old'
+    assert sorted(os.listdir(tmp_path)) == ['a.bin', 'b.bin']
+
+    copier.copy_file(str(src), str(dst), overwrite=True)
+    assert read(dst) == b'new'
+
+
+def test_publish_refuses_a_target_that_appeared_during_the_copy(tmp_path, monkeypatch):
+    src, dst = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    write(src, b'new')
+    copy_fileobj = copier.copy_fileobj
+
+    def racing_copy(fsrc, fdst, bufsize):
+        write(dst, b'theirs')
+        return copy_fileobj(fsrc, fdst, bufsize)
+
+    monkeypatch.setattr(copier, 'copy_fileobj', racing_copy)
+    with pytest.raises(FileExistsError):
+        copier.copy_file(str(src), str(dst), overwrite=False)
+    assert read(dst) == b'theirs'
+    assert sorted(os.listdir(tmp_path)) == ['a.bin', 'b.bin']
+
+
+def test_rename_no_replace(tmp_path):
+    src, dst = tmp_path / 'a.txt', tmp_path / 'a.md'
+    write(src, b'a')
+    copier.rename_no_replace(str(src), str(dst))
+    assert os.listdir(tmp_path) == ['a.md']
+
+    write(src, b'b')
+    with pytest.raises(FileExistsError):
+        copier.rename_no_replace(str(src), str(dst))
+    assert read(src) == b'b'
+    assert read(dst) == b'a'
+
+
+@pytest.fixture
+def without_renameat2(monkeypatch):
+    monkeypatch.setattr(copier, '_renameat2', False)
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="needs renameat2")
+def test_rename_no_replace_uses_a_single_renameat2(tmp_path, monkeypatch):
+    if copier._load_renameat2() is None:
+        pytest.skip("libc has no renameat2")
+
+    def no_link(*args, **kwargs):
+        raise AssertionError("link() should not be needed")
+
+    monkeypatch.setattr(os, 'link', no_link)
+    src, dst = tmp_path / 'a.txt', tmp_path / 'a.md'
+    write(src, b'a')
+    copier.rename_no_replace(str(src), str(dst))
+    assert os.listdir(tmp_path) == ['a.md']
+
+
+@pytest.mark.usefixtures('without_renameat2')
+def test_rename_no_replace_with_links(tmp_path):
+    test_rename_no_replace(tmp_path)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="needs POSIX hard links")
+@pytest.mark.usefixtures('without_renameat2')
+def test_rename_no_replace_without_hard_links(tmp_path, monkeypatch):
+    def no_link(*args, **kwargs):
+        raise OSError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(os, 'link', no_link)
+    src, dst = tmp_path / 'a.txt', tmp_path / 'a.md'
+    write(src, b'a')
+    copier.rename_no_replace(str(src), str(dst))
+    assert os.listdir(tmp_path) == ['a.md']
+
+    write(src, b'b')
+    with pytest.raises(FileExistsError):
+        copier.rename_no_replace(str(src), str(dst))
+    assert read(dst) == b'a'
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink') or os.name == 'nt',
+                    reason="needs POSIX symlinks")
+def test_rename_no_replace_keeps_symlinks(tmp_path):
+    write(tmp_path / 'target.txt', b'a')
+    os.symlink('target.txt', tmp_path / 'link.txt')
+    copier.rename_no_replace(str(tmp_path / 'link.txt'), str(tmp_path / 'link.md'))
+    assert os.readlink(tmp_path / 'link.md') == 'target.txt'
+    assert not os.path.lexists(tmp_path / 'link.txt')
@@ -0,0 +1,105 @@
+import errno
+import os
+
+from extension_changer import durability, engine, metrics
+
+
+def make_operations(tmp_path, directories=('a', 'b'), per_directory=2):
+    operations = []
+    for name in directories:
+        (tmp_path / name).mkdir(exist_ok=True)
+        for number in range(per_directory):
+            src = str(tmp_path / name / f'{number}.txt')
+            operations.append(engine.Operation(src, src[:-4] + '.md'))
+    return operations
+
+
+def test_batches_by_size(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(durability, 'fsync_directory', lambda path: synced.append(path) or True)
+    durable = []
+    syncer = durability.DirectorySyncer(batch_size=3, interval=None, on_durable=durable.append)
+    operations = make_operations(tmp_path)
+
+    for index, operation in enumerate(operations):
+        syncer.add(index, operation)
+    # The first three operations made a batch, each directory synced once
+    assert durable == [0, 1, 2]
+    assert sorted(synced) == [str(tmp_path / 'a'), str(tmp_path / 'b')]
+    assert syncer.pending == [3]
+
+    syncer.sync()
+    assert durable == [0, 1, 2, 3]
+    assert syncer.pending == []
+
+
+def test_copies_only_sync_the_target_directory(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(durability, 'fsync_directory', lambda path: synced.append(path) or True)
+    (tmp_path / 'copies').mkdir()
+    operation = engine.Operation(str(tmp_path / 'a.txt'), str(tmp_path / 'copies' / 'a.md'))
+    syncer = durability.DirectorySyncer(keep_original=True, interval=None)
+    syncer.add(0, operation)
+    syncer.sync()
+    assert synced == [str(tmp_path / 'copies')]
+
+
+def test_failed_directory_sync_is_not_reported_durable(tmp_path, monkeypatch):
+    failing = str(tmp_path / 'b')
+    fail = [True]
+
+    def fsync_directory(path):
+        if path == failing and fail[0]:
+            raise OSError(errno.EIO, "Input/output error", path)
+        return True
+
+    monkeypatch.setattr(durability, 'fsync_directory', fsync_directory)
+    run_metrics = metrics.RunMetrics()
+    durable = []
+    syncer = durability.DirectorySyncer(interval=None, on_durable=durable.append,
+                                        run_metrics=run_metrics)
+    for index, operation in enumerate(make_operations(tmp_path)):
+        syncer.add(index, operation)
+
+    syncer.sync()
+    assert durable == [0, 1]
+    assert syncer.pending == [2, 3]
+    assert [error.path for error in run_metrics.errors] == [failing]
+
+    # The failed directory is synced again with the next batch
+    fail[0] = False
+    syncer.sync()
+    assert durable == [0, 1, 2, 3]
+    assert syncer.pending == []
+
+
+def test_fsync_directory(tmp_path):
+    if os.name == 'nt':
+        assert durability.fsync_directory(str(tmp_path)) is False
+    else:
+        assert durability.fsync_directory(str(tmp_path)) in (True, False)
+
+
+def test_journal_only_records_synced_operations(tmp_path, monkeypatch):
+    from extension_changer import journal
+
+    operations = make_operations(tmp_path)
+    for operation in operations:
+        with open(operation.src, 'w'):
+            pass
+    failing = str(tmp_path / 'b')
+
+    def fsync_directory(path):
+        if path == failing:
+            raise OSError(errno.EIO, "Input/output error", path)
+        return True
+
+    monkeypatch.setattr(durability, 'fsync_directory', fsync_directory)
+    path = str(tmp_path / 'job.jsonl')
+    job = journal.Journal.create(path, operations)
+    report = engine.execute_plan(operations, backend='serial', journal=job, durable=True)
+    job.finish()
+
+    assert report.success_count == 4
+    assert journal.read_journal(path).done == {0, 1}
+    assert [error.path for error in report.metrics.errors] == [failing]
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from extension_changer import engine
+
+
+def write(path, text=''):
+    with open(path, 'w') as fileobj:
+        fileobj.write(text)
+
+
+def test_directory_tasks_group_by_folder():
+    operations = [engine.Operation(os.path.join(folder, f'{number}.txt'),
+                                   os.path.join(folder, f'{number}.md'))
+                  for folder in ('/a', '/b') for number in range(3)]
+    operations.append(engine.Operation('/c/0.txt', '/c/0.md'))
+
+    def groups(tasks):
+        return [[(src_dir, [entry[0] for entry in entries]) for src_dir, _, entries in task]
+                for task in tasks]
+
+    # Small groups are packed together, large ones split
+    assert groups(engine.directory_tasks(operations, 4)) == [
+        [('/a', [0, 1, 2]), ('/b', [3, 4, 5])], [('/c', [6])]]
+    assert groups(engine.directory_tasks(operations, 2)) == [
+        [('/a', [0, 1])], [('/a', [2]), ('/b', [3, 4])], [('/b', [5]), ('/c', [6])]]
+
+
+@pytest.mark.skipif(not engine.DIR_FD_SUPPORTED, reason="needs dir_fd support")
+@pytest.mark.parametrize('backend', ['serial', 'thread'])
+def test_directory_renames_never_replace_a_target(tmp_path, backend):
+    operations = []
+    for folder in ('one', 'two'):
+        os.mkdir(tmp_path / folder)
+        for number in range(5):
+            write(tmp_path / folder / f'{number}.txt', folder)
+            operations.append(engine.Operation(str(tmp_path / folder / f'{number}.txt'),
+                                               str(tmp_path / folder / f'{number}.md')))
+    write(tmp_path / 'two' / '3.md', 'theirs')
+
+    report = engine.execute_plan(operations, backend=backend, chunksize=3)
+    assert report.success_count == 9
+    assert [path for path, error in report.failures] == [operations[8].src]
+    assert sorted(os.listdir(tmp_path / 'one')) == [f'{number}.md' for number in range(5)]
+    assert (tmp_path / 'two' / '3.md').read_text() == 'theirs'
+    assert (tmp_path / 'two' / '3.txt').exists()
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from extension_changer import engine, executors
+
+
+BACKENDS = ['serial', 'thread', 'process']
+
+
+@pytest.fixture(autouse=True, scope='module')
+def stop_warm_pool():
+    yield
+    executors.warm_pool.shutdown()
+
+
+def square(value):
+    return value * value
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_every_task_comes_back(backend):
+    with executors.create_executor(backend, 2) as executor:
+        results = list(executor.imap_unordered(square, range(100), chunksize=7))
+    assert sorted(results) == [n * n for n in range(100)]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_wait_with_nothing_pending_is_skipped(backend):
+    tasks = [executors.WAIT, 1, 2, executors.WAIT, executors.WAIT, 3, executors.WAIT]
+    with executors.create_executor(backend, 2) as executor:
+        results = list(executor.imap_unordered(square, tasks, chunksize=1))
+    assert sorted(results) == [1, 4, 9]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_stop_yields_every_started_task(backend):
+    handed_out = []
+
+    def tasks():
+        for value in range(1000):
+            handed_out.append(value)
+            yield value
+
+    results = []
+    with executors.create_executor(backend, 2) as executor:
+        for value in executor.imap_unordered(square, tasks(), chunksize=5,
+                                             should_stop=lambda: bool(results)):
+            results.append(value)
+    # Nothing is lost: every task taken from the input came back
+    assert 0 < len(results) < 1000
+    assert sorted(results) == sorted(value * value for value in handed_out)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_cancelled_plan_reports_exactly_what_was_done(tmp_path, backend):
+    operations = []
+    for number in range(400):
+        src = tmp_path / f'{number}.txt'
+        src.write_text('')
+        operations.append(engine.Operation(str(src), str(tmp_path / f'{number}.md')))
+
+    done = []
+    report = engine.execute_plan(
+        operations, backend=backend, workers=2, chunksize=4,
+        progress=lambda current, total: done.append(current),
+        should_cancel=lambda: bool(done),
+    )
+    renamed = sum(name.endswith('.md') for name in os.listdir(tmp_path))
+
+    assert report.cancelled
+    assert 0 < report.success_count < len(operations)
+    assert report.success_count == renamed == len(report.completed)
+    assert not report.failures
+    assert report.processed_count + report.not_started_count == len(operations)
+
+
+def test_warm_pool_is_reused_until_the_worker_count_changes():
+    pool = executors.WarmPool()
+    try:
+        with executors.ProcessExecutor(2, pool) as executor:
+            first = executor._pool
+            assert sorted(executor.imap_unordered(square, range(5))) == [0, 1, 4, 9, 16]
+        with executors.ProcessExecutor(2, pool) as executor:
+            assert executor._pool is first
+        with executors.ProcessExecutor(3, pool) as executor:
+            assert executor._pool is not first
+        assert pool.workers == 3
+    finally:
+        pool.shutdown()
+    assert pool.workers == 0
+
+
+def test_abandoned_run_discards_the_pool():
+    pool = executors.WarmPool()
+    try:
+        with executors.ProcessExecutor(2, pool) as executor:
+            results = executor.imap_unordered(square, range(1000))
+            next(results)
+        assert pool.workers == 0
+    finally:
+        pool.shutdown()
+
+
+def test_select_backend():
+    assert executors.select_backend(10) == ('serial', 1)
+    assert executors.select_backend(1000, workers=3) == ('thread', 3)
+    large = 1000 * executors.LARGE_COPY_SIZE
+    backend, workers = executors.select_backend(1000, large, keep_original=True, workers=16)
+    assert (backend, workers) == ('thread', executors.LARGE_COPY_WORKERS)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        executors.create_executor('gpu')
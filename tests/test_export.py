@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+
+import pytest
+
+from extension_changer import engine, export
+
+
+OPERATIONS = [engine.Operation('/d/a.txt', '/d/a.md'), engine.Operation('/d/b,c.txt', '/d/b,c.md')]
+
+
+@pytest.mark.parametrize('path, fmt', [('plan.csv', 'csv'), ('plan.JSONL', 'jsonl'),
+                                       ('plan.ndjson', 'jsonl'), ('plan', 'csv')])
+def test_format_for_path(path, fmt):
+    assert export.format_for_path(path) == fmt
+
+
+def test_rows_use_the_optional_lookups():
+    rows = list(export.iter_plan_rows(OPERATIONS, size_of={'/d/a.txt': 3}.get,
+                                      status_of=['ok', 'skip'].__getitem__))
+    assert rows == [('/d/a.txt', '/d/a.md', 3, 'ok'), ('/d/b,c.txt', '/d/b,c.md', None, 'skip')]
+    assert list(export.iter_plan_rows(OPERATIONS))[0] == ('/d/a.txt', '/d/a.md', None, '')
+
+
+def test_csv_export(tmp_path):
+    path = str(tmp_path / 'plan.csv')
+    rows = export.iter_plan_rows(OPERATIONS, size_of={'/d/a.txt': 3}.get)
+    assert export.export_plan(path, rows) == 2
+    with open(path, newline='', encoding='utf-8') as fileobj:
+        assert list(csv.reader(fileobj)) == [
+            list(export.PLAN_FIELDS),
+            ['/d/a.txt', '/d/a.md', '3', ''],
+            ['/d/b,c.txt', '/d/b,c.md', '', ''],
+        ]
+
+
+def test_jsonl_export():
+    fileobj = io.StringIO()
+    assert export.write_plan(fileobj, export.iter_plan_rows(OPERATIONS), 'jsonl') == 2
+    lines = [json.loads(line) for line in fileobj.getvalue().splitlines()]
+    assert lines[1] == {'source': '/d/b,c.txt', 'target': '/d/b,c.md', 'size': None, 'status': ''}
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        export.write_plan(io.StringIO(), [], 'xml')
@@ -0,0 +1,60 @@
+import os
+
+from extension_changer.fileset import FileSet
+
+
+def paths(*parts):
+    return [os.path.join(*part.split('/')) for part in parts]
+
+
+def test_paths_round_trip_with_one_entry_per_directory():
+    files = paths('a/one.txt', 'a/two.md', 'b/three.txt', 'a/four.txt')
+    fileset = FileSet((path, None) for path in files)
+    assert list(fileset) == files
+    assert len(fileset) == 4
+    assert fileset.directories() == 2
+    assert fileset[2] == files[2]
+
+
+def test_find_and_sizes():
+    fileset = FileSet([(os.path.join('a', 'x.txt'), 3), (os.path.join('a', 'y.txt'), None)])
+    file_id = fileset.find(os.path.join('a', 'x.txt'))
+    assert fileset.path(file_id) == os.path.join('a', 'x.txt')
+    assert fileset.size(file_id) == 3
+    assert fileset.size_of(os.path.join('a', 'y.txt')) is None
+    assert fileset.find(os.path.join('a', 'z.txt')) is None
+    assert fileset.find(os.path.join('b', 'x.txt')) is None
+    assert os.path.join('a', 'x.txt') in fileset
+
+
+def test_lookups_follow_later_changes():
+    fileset = FileSet.from_paths([os.path.join('a', 'x.txt')])
+    # Builds the name table of "a"
+    assert os.path.join('a', 'y.txt') not in fileset
+    added = fileset.add(os.path.join('a', 'y.txt'), 1)
+    assert fileset.find(os.path.join('a', 'y.txt')) == added
+    fileset.discard(added)
+    fileset.discard(added)
+    assert os.path.join('a', 'y.txt') not in fileset
+    assert len(fileset) == 1
+    assert list(fileset) == [os.path.join('a', 'x.txt')]
+
+
+def test_views_slice_and_filter_without_copying_paths():
+    files = paths('a/1.txt', 'a/2.MD', 'a/3.txt', 'b/4.tar.gz')
+    fileset = FileSet((path, len(path)) for path in files)
+    view = fileset.with_extension('.txt')
+    assert list(view) == [files[0], files[2]]
+    assert view.fileset is fileset
+    assert list(view[1:]) == [files[2]]
+    assert list(fileset.with_extension('.tar.gz')) == [files[3]]
+    assert view.total_bytes() == len(files[0]) + len(files[2])
+    assert list(view.items()) == [(files[0], len(files[0])), (files[2], len(files[2]))]
+    assert not fileset.with_extension('.png')
+
+
+def test_undecodable_names_round_trip():
+    name = os.fsdecode(b'caf\xe9.txt')
+    fileset = FileSet.from_paths([os.path.join('a', name)])
+    assert list(fileset) == [os.path.join('a', name)]
+    assert os.path.join('a', name) in fileset
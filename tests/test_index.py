@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from extension_changer.index import ExtensionIndex, extension_of
+
+
+@pytest.mark.parametrize('path, extension', [
+    ('photo.JPG', '.JPG'),
+    ('archive.tar.gz', '.tar.gz'),
+    ('notes.v2.txt', '.txt'),
+    ('.bashrc', ''),
+    ('README', ''),
+    ('trailing.', ''),
+    (os.path.join('dir.d', 'file'), ''),
+])
+def test_extension_of(path, extension):
+    assert extension_of(path) == extension
+
+
+def make_index():
+    return ExtensionIndex([
+        (os.path.join('d', 'a.txt'), 10),
+        (os.path.join('d', 'b.txt'), 5),
+        (os.path.join('e', 'c.md'), None),
+        (os.path.join('e', 'backup.tar.gz'), 7),
+    ])
+
+
+def test_counts_and_totals():
+    index = make_index()
+    assert len(index) == 4
+    assert index.extensions() == ['.md', '.tar.gz', '.txt']
+    assert index.count('.txt') == 2
+    assert index.total_bytes('.txt') == 15
+    assert index.total_bytes('.md') == 0
+    assert index.count('.png') == 0
+    assert list(index.files('.txt')) == [os.path.join('d', 'a.txt'), os.path.join('d', 'b.txt')]
+    assert index.sizes('.md') == [(os.path.join('e', 'c.md'), None)]
+
+
+def test_lookups():
+    index = make_index()
+    assert os.path.join('d', 'a.txt') in index
+    assert os.path.join('d', 'z.txt') not in index
+    assert index.size(os.path.join('d', 'b.txt')) == 5
+    assert index.size(os.path.join('e', 'c.md')) is None
+    assert index.size(os.path.join('x', 'y')) is None
+
+
+def test_rename_moves_a_file_between_groups():
+    index = make_index()
+    index.rename(os.path.join('d', 'a.txt'), os.path.join('d', 'a.md'))
+    assert index.count('.txt') == 1
+    assert index.total_bytes('.txt') == 5
+    assert index.count('.md') == 2
+    assert index.total_bytes('.md') == 10
+    assert list(index.files('.txt')) == [os.path.join('d', 'b.txt')]
+    assert index.size(os.path.join('d', 'a.md')) == 10
+
+
+def test_discard_drops_empty_groups():
+    index = make_index()
+    assert index.discard(os.path.join('e', 'backup.tar.gz')) == 7
+    assert index.discard(os.path.join('e', 'backup.tar.gz')) is None
+    assert index.extensions() == ['.md', '.txt']
+    assert len(index) == 3
+
+
+def test_add_replaces_an_existing_entry():
+    index = make_index()
+    index.add(os.path.join('d', 'a.txt'), 1)
+    assert index.count('.txt') == 2
+    assert index.total_bytes('.txt') == 6
+
+
+def test_add_entries_returns_new_extensions():
+    index = make_index()
+    new = index.add_entries([(os.path.join('f', 'x.png'), 1), (os.path.join('f', 'y.txt'), 1)])
+    assert new == {'.png'}
@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from extension_changer import engine, journal
+
+
+def make_files(tmp_path, count):
+    operations = []
+    for number in range(count):
+        src = tmp_path / f'{number}.txt'
+        src.write_text(str(number))
+        operations.append(engine.Operation(str(src), str(tmp_path / f'{number}.md')))
+    return operations
+
+
+def run(job, **options):
+    report = engine.execute_plan(job.operations, keep_original=job.keep_original,
+                                 backend='serial', overwrite=job.overwrite, journal=job,
+                                 **options)
+    return report
+
+
+def stop_after(count):
+    """Options that cancel a serial run once ``count`` operations are done"""
+    done = []
+    return {
+        'progress': lambda current, total: done.append(current),
+        'should_cancel': lambda: bool(done) and done[-1] >= count,
+    }
+
+
+def test_resume_runs_only_what_is_left(tmp_path):
+    operations = make_files(tmp_path, 6)
+    path = str(tmp_path / 'job.jsonl')
+    job = journal.Journal.create(path, operations)
+    report = run(job, **stop_after(2))
+    job.close()  # As if the process died
+    assert report.success_count == 2
+
+    state = journal.read_journal(path)
+    assert not state.finished
+    assert state.done == {0, 1}
+
+    resumed = journal.Journal.resume(path)
+    assert resumed.operations == operations[2:]
+    report = run(resumed)
+    resumed.finish()
+    assert report.success_count == 4
+
+    state = journal.read_journal(path)
+    assert state.finished and state.complete and not state.cancelled
+    assert all(os.path.exists(operation.dst) for operation in operations)
+    with pytest.raises(journal.JournalError):
+        journal.Journal.resume(path)
+
+
+def test_resume_skips_renames_done_just_before_a_crash(tmp_path):
+    operations = make_files(tmp_path, 3)
+    path = str(tmp_path / 'job.jsonl')
+    journal.Journal.create(path, operations).close()
+    os.rename(operations[0].src, operations[0].dst)
+
+    resumed = journal.Journal.resume(path)
+    assert resumed.operations == operations[1:]
+    resumed.close()
+    assert journal.read_journal(path).done == {0}
+
+
+def test_resumed_copies_never_replace_foreign_files(tmp_path):
+    operations = make_files(tmp_path, 3)
+    path = str(tmp_path / 'job.jsonl')
+    journal.Journal.create(path, operations, keep_original=True).close()
+    # A copy that landed just before the crash, and a file the user put
+    # at a planned target afterwards
+    with open(operations[0].dst, 'w') as fileobj:
+        fileobj.write('0')
+    with open(operations[1].dst, 'w') as fileobj:
+        fileobj.write('someone else')
+
+    resumed = journal.Journal.resume(path)
+    assert not resumed.overwrite
+    assert resumed.operations == operations[1:]
+    report = run(resumed)
+    resumed.finish()
+    assert report.success_count == 1
+    assert [failure[0] for failure in report.failures] == [operations[1].src]
+    with open(operations[1].dst) as fileobj:
+        assert fileobj.read() == 'someone else'
+    assert journal.read_journal(path).done == {0, 2}
+
+
+def test_cancelled_job_is_ended_but_resumable(tmp_path):
+    operations = make_files(tmp_path, 4)
+    path = str(tmp_path / 'job.jsonl')
+    job = journal.Journal.create(path, operations)
+    report = run(job, **stop_after(1))
+    job.finish(cancelled=report.cancelled)
+
+    state = journal.read_journal(path)
+    assert state.finished and state.cancelled and not state.complete
+
+    resumed = journal.Journal.resume(path)
+    assert journal.read_journal(path).finished is False
+    run(resumed)
+    resumed.finish()
+    assert journal.read_journal(path).complete
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    operations = make_files(tmp_path, 2)
+    path = str(tmp_path / 'job.jsonl')
+    journal.Journal.create(path, operations).close()
+    with open(path, 'a', encoding='utf-8') as fileobj:
+        fileobj.write('{"t": "done", "i": [0')
+    assert journal.read_journal(path).done == set()
+    journal.Journal.resume(path).close()
+    assert journal.read_journal(path).operations == operations
+
+
+@pytest.mark.parametrize('keep_original', [False, True])
+def test_undo_reverts_completed_operations(tmp_path, keep_original):
+    operations = make_files(tmp_path, 3)
+    path = str(tmp_path / 'job.jsonl')
+    job = journal.Journal.create(path, operations, keep_original=keep_original)
+    run(job)
+    job.finish()
+
+    undo = journal.Journal.undo(path)
+    assert undo.path == journal.default_undo_path(path)
+    report = run(undo)
+    undo.finish()
+    assert report.success_count == 3
+    for operation in operations:
+        assert os.path.exists(operation.src)
+        assert not os.path.exists(operation.dst)
+    with pytest.raises(journal.JournalError):
+        journal.Journal.undo(undo.path)
+
+
+def test_prune_keeps_recent_and_interrupted_journals(tmp_path):
+    operations = [engine.Operation('/data/a.txt', '/data/a.md')]
+    for number in range(5):
+        path = str(tmp_path / f'job-{number}.jsonl')
+        job = journal.Journal.create(path, operations)
+        if number == 0:
+            job.close()
+        else:
+            job.finish(cancelled=number == 1)
+        os.utime(path, (number, number))
+
+    assert journal.prune_journals(str(tmp_path), keep=2) == 2
+    assert sorted(os.listdir(tmp_path)) == ['job-0.jsonl', 'job-3.jsonl', 'job-4.jsonl']
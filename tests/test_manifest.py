@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from extension_changer import engine, manifest
+
+
+def make_tree(tmp_path, directories=8, files=5):
+    operations = []
+    for number in range(directories):
+        directory = tmp_path / f'dir{number}'
+        directory.mkdir()
+        for index in range(files):
+            src = directory / f'{index}.txt'
+            src.write_text('x' * index)
+            operations.append(engine.Operation(str(src), str(directory / f'{index}.md')))
+    return operations
+
+
+def test_parse_shard():
+    assert manifest.parse_shard('2/4') == (2, 4)
+    for text in ('0/4', '5/4', '1', 'a/b'):
+        with pytest.raises(ValueError):
+            manifest.parse_shard(text)
+
+
+def test_round_trip(tmp_path):
+    operations = make_tree(tmp_path, directories=2)
+    other = tmp_path / 'other'
+    other.mkdir()
+    operations.append(engine.Operation(operations[0].src.replace('0.txt', 'moved.txt'),
+                                       str(other / 'moved.md')))
+    sizes = list(range(len(operations)))
+    path = str(tmp_path / 'job.jsonl.gz')
+    manifest_id = manifest.write_manifest(path, operations, keep_original=True, sizes=sizes)
+
+    job = manifest.read_manifest(path)
+    assert job.id == manifest_id
+    assert job.keep_original and not job.overwrite
+    assert job.total == len(operations)
+    assert sorted(job.operations) == sorted(operations)
+    assert sorted(zip(job.operations, job.sizes)) == sorted(zip(operations, sizes))
+
+
+def test_shards_split_by_directory(tmp_path):
+    operations = make_tree(tmp_path)
+    path = str(tmp_path / 'job.jsonl.gz')
+    manifest.write_manifest(path, operations)
+
+    seen = []
+    for shard in range(1, 4):
+        job = manifest.read_manifest(path, shard, 3)
+        directories = {os.path.dirname(operation.src) for operation in job.operations}
+        assert all(manifest.shard_of(directory, 3) == shard for directory in directories)
+        seen.extend(job.operations)
+    assert sorted(seen) == sorted(operations)
+
+
+def test_incomplete_manifest_is_rejected(tmp_path):
+    operations = make_tree(tmp_path, directories=3)
+    path = str(tmp_path / 'job.jsonl.gz')
+    manifest.write_manifest(path, operations)
+    with gzip.open(path, 'rt', encoding='utf-8') as fileobj:
+        lines = fileobj.readlines()
+    with gzip.open(path, 'wt', encoding='utf-8') as fileobj:
+        fileobj.writelines(lines[:-1])
+    with pytest.raises(manifest.ManifestError):
+        manifest.read_manifest(path)
+
+
+def run_shards(path, shards):
+    result_paths = []
+    for shard in range(1, shards + 1):
+        job = manifest.read_manifest(path, shard, shards)
+        report = engine.execute_plan(job.operations, backend='serial')
+        result_path = manifest.default_result_path(path, shard, shards)
+        manifest.write_result(result_path, job, report)
+        result_paths.append(result_path)
+    return result_paths
+
+
+def test_merge_results(tmp_path):
+    operations = make_tree(tmp_path)
+    os.remove(operations[0].src)  # One failure
+    path = str(tmp_path / 'job.jsonl.gz')
+    manifest.write_manifest(path, operations)
+    result_paths = run_shards(path, 3)
+    assert result_paths[0].endswith('job.shard-1-of-3.json')
+
+    merged = manifest.merge_results(result_paths)
+    assert merged.total_count == len(operations)
+    assert merged.success_count == len(operations) - 1
+    assert [failure[0] for failure in merged.failures] == [operations[0].src]
+    assert not merged.cancelled
+
+
+def test_merge_rejects_missing_duplicate_and_foreign_shards(tmp_path):
+    operations = make_tree(tmp_path, directories=4)
+    path = str(tmp_path / 'a.jsonl.gz')
+    manifest.write_manifest(path, operations)
+    result_paths = run_shards(path, 2)
+
+    with pytest.raises(manifest.ManifestError, match='Missing'):
+        manifest.merge_results(result_paths[:1])
+    with pytest.raises(manifest.ManifestError, match='twice'):
+        manifest.merge_results([result_paths[0], result_paths[0], result_paths[1]])
+
+    other_path = str(tmp_path / 'b.jsonl.gz')
+    manifest.write_manifest(other_path, [])
+    foreign = run_shards(other_path, 2)
+    with pytest.raises(manifest.ManifestError, match='another manifest'):
+        manifest.merge_results([result_paths[0], foreign[1]])
+
+    damaged = str(tmp_path / 'damaged.json')
+    with open(damaged, 'w', encoding='utf-8') as fileobj:
+        json.dump({'t': 'something else'}, fileobj)
+    with pytest.raises(manifest.ManifestError):
+        manifest.merge_results([damaged])
@@ -0,0 +1,82 @@
+import pytest
+
+from extension_changer import engine, metrics
+
+
+def write(path, text=''):
+    with open(path, 'w') as fileobj:
+        fileobj.write(text)
+
+
+def test_histogram_percentiles_are_upper_bounds():
+    histogram = metrics.LatencyHistogram()
+    for seconds in [0.001] * 90 + [0.1] * 10:
+        histogram.add(seconds)
+    assert histogram.count == 100
+    assert histogram.mean == pytest.approx(0.0109)
+    assert 0.001 <= histogram.percentile(0.5) < 0.002
+    assert 0.1 <= histogram.percentile(0.99) <= histogram.max == 0.1
+
+
+def test_metrics_round_trip_through_dict():
+    run_metrics = metrics.RunMetrics()
+    run_metrics.record(metrics.KIND_COPY, 0.01, 100, 'w1')
+    run_metrics.record(metrics.KIND_RENAME, 0.002, 0, 'w2',
+                       metrics.ErrorRecord('/a', metrics.KIND_RENAME, 13, 'PermissionError', 'no'))
+    run_metrics.stop()
+    restored = metrics.RunMetrics.from_dict(run_metrics.to_dict())
+    assert (restored.files, restored.failed, restored.bytes) == (2, 1, 100)
+    assert restored.errors == run_metrics.errors
+    assert restored.latency[metrics.KIND_COPY].count == 1
+    assert restored.workers['w1'].operations == 1
+
+
+def test_merge_keeps_workers_of_each_run_apart():
+    first, second = metrics.RunMetrics(), metrics.RunMetrics()
+    first.record(metrics.KIND_RENAME, 0.001, worker='w')
+    second.record(metrics.KIND_RENAME, 0.003, worker='w')
+    first.merge(second, prefix='shard2/')
+    assert first.files == 2
+    assert first.latency[metrics.KIND_RENAME].count == 2
+    assert sorted(first.workers) == ['shard2/w', 'w']
+
+
+def test_throttle_passes_the_final_update():
+    calls = []
+    throttle = metrics.ProgressThrottle(lambda *args: calls.append(args), interval=3600)
+    for current in range(1, 11):
+        throttle(current, 10)
+    assert calls == [(1, 10), (10, 10)]
+    throttle.flush()
+    assert calls == [(1, 10), (10, 10)]
+
+
+def test_throttle_flush_sends_the_update_held_back():
+    calls = []
+    throttle = metrics.ProgressThrottle(lambda *args: calls.append(args), interval=3600)
+    for current in range(1, 6):
+        throttle(current, 10)
+    assert calls == [(1, 10)]
+    throttle.flush()
+    assert calls == [(1, 10), (5, 10)]
+
+
+def test_cancelled_run_reports_its_last_progress(tmp_path):
+    operations = []
+    for number in range(20):
+        write(tmp_path / f'{number}.txt')
+        operations.append(engine.Operation(str(tmp_path / f'{number}.txt'),
+                                           str(tmp_path / f'{number}.md')))
+    calls = []
+    checks = []
+
+    def should_cancel():
+        checks.append(None)
+        return len(checks) > 5
+
+    report = engine.execute_plan(operations, backend='serial', chunksize=1,
+                                 progress=lambda *args: calls.append(args),
+                                 progress_interval=3600, should_cancel=should_cancel)
+    assert report.cancelled
+    assert 1 < report.processed_count < 20
+    assert calls == [(1, 20), (report.processed_count, 20)]
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from extension_changer import engine, planner
+from extension_changer.rules import RuleSet
+
+
+def write(path, text=''):
+    with open(path, 'w') as fileobj:
+        fileobj.write(text)
+
+
+def read(path):
+    with open(path) as fileobj:
+        return fileobj.read()
+
+
+def op(tmp_path, src, dst):
+    return engine.Operation(str(tmp_path / src), str(tmp_path / dst))
+
+
+def test_no_conflicts(tmp_path):
+    write(tmp_path / 'a.txt')
+    plan = planner.build_plan([op(tmp_path, 'a.txt', 'a.md')])
+    assert plan.statuses == [planner.STATUS_OK]
+    assert plan.conflict_count == 0
+
+
+@pytest.mark.parametrize('probe', [False, True])
+def test_skip_existing_target(tmp_path, probe):
+    write(tmp_path / 'a.txt')
+    write(tmp_path / 'a.md')
+    plan = planner.build_plan([op(tmp_path, 'a.txt', 'a.md')], planner.POLICY_SKIP, probe)
+    assert plan.statuses == [planner.STATUS_SKIP_EXISTS]
+    assert plan.runnable() == []
+
+
+def test_duplicate_targets(tmp_path):
+    operations = [op(tmp_path, 'a.txt', 'x.md'), op(tmp_path, 'b.txt', 'x.md')]
+    for policy in planner.POLICIES:
+        plan = planner.build_plan(operations, policy)
+        if policy == planner.POLICY_SUFFIX:
+            assert plan.operations[1].dst == str(tmp_path / 'x (1).md')
+        else:
+            assert plan.statuses == [planner.STATUS_OK, planner.STATUS_SKIP_DUPLICATE]
+
+
+def test_suffix_keeps_compound_extension(tmp_path):
+    write(tmp_path / 'foo.tar.gz')
+    plan = planner.build_plan([op(tmp_path, 'foo.tgz', 'foo.tar.gz')], planner.POLICY_SUFFIX)
+    assert plan.operations[0].dst == str(tmp_path / 'foo (1).tar.gz')
+
+
+def test_suffix_skips_taken_numbers(tmp_path):
+    write(tmp_path / 'a.md')
+    write(tmp_path / 'a (1).md')
+    plan = planner.build_plan([op(tmp_path, 'a.txt', 'a.md')], planner.POLICY_SUFFIX)
+    assert plan.statuses == [planner.STATUS_RENUMBERED]
+    assert plan.operations[0].dst == str(tmp_path / 'a (2).md')
+
+
+def test_overwrite_existing_target(tmp_path):
+    write(tmp_path / 'a.txt', 'new')
+    write(tmp_path / 'a.md', 'old')
+    plan = planner.build_plan([op(tmp_path, 'a.txt', 'a.md')], planner.POLICY_OVERWRITE)
+    assert plan.statuses == [planner.STATUS_OVERWRITE]
+    assert plan.overwrite
+    report = engine.execute_plan(plan.runnable(), overwrite=plan.overwrite)
+    assert report.success_count == 1
+    assert read(tmp_path / 'a.md') == 'new'
+
+
+def test_overwrite_never_destroys_chained_source(tmp_path):
+    write(tmp_path / 'x.a', 'A')
+    write(tmp_path / 'x.b', 'B')
+    rules = RuleSet.parse(['.a=.b', '.b=.c'])
+    operations = rules.plan([str(tmp_path / 'x.a'), str(tmp_path / 'x.b')])
+    plan = planner.build_plan(operations, planner.POLICY_OVERWRITE)
+    assert dict(zip((o.src for o in plan.operations), plan.statuses)) == {
+        str(tmp_path / 'x.a'): planner.STATUS_SKIP_SOURCE,
+        str(tmp_path / 'x.b'): planner.STATUS_OK,
+    }
+    engine.execute_plan(plan.runnable(), overwrite=plan.overwrite)
+    assert read(tmp_path / 'x.a') == 'A'
+    assert read(tmp_path / 'x.c') == 'B'
+    assert not os.path.exists(tmp_path / 'x.b')
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        planner.build_plan([], 'explode')
@@ -0,0 +1,96 @@
+import errno
+import os
+
+import pytest
+
+from extension_changer import cli, engine, results
+
+
+def write(path, text=''):
+    with open(path, 'w') as fileobj:
+        fileobj.write(text)
+
+
+BATCH = [
+    (2, None, 10, 0.5, 'w1'),
+    (0, (errno.EACCES, 'PermissionError', 'denied'), 0, 0.25, 'w1'),
+    (1, (None, 'ValueError', 'odd'), 0, 0.125, 'w2'),
+]
+
+
+def test_log_keeps_every_result_in_completion_order():
+    log = results.ResultLog()
+    assert log.extend(BATCH) == [1, 2]
+    assert len(log) == 3
+    assert list(log) == [
+        results.ResultRecord(2, results.OUTCOME_DONE, None, 10, 0.5, None),
+        results.ResultRecord(0, results.OUTCOME_FAILED, errno.EACCES, 0, 0.25, 'denied'),
+        results.ResultRecord(1, results.OUTCOME_FAILED, None, 0, 0.125, 'odd'),
+    ]
+    assert list(log.indices_with(results.OUTCOME_DONE)) == [2]
+    assert list(log.indices_with(results.OUTCOME_FAILED)) == [0, 1]
+
+
+def test_discard_renumbers_the_remaining_results():
+    log = results.ResultLog()
+    log.extend(BATCH)
+    log.discard([1])
+    assert [record.index for record in log] == [2, 1]
+    assert log.errors == {1: ('ValueError', 'odd')}
+    assert log.record(1).error == 'odd'
+
+
+def test_report_round_trip_keeps_failed_operations_in_plan_order(tmp_path):
+    operations = [engine.Operation(f'/d/{name}.txt', f'/d/{name}.md') for name in 'abc']
+    report = engine.ConversionReport(3, operations)
+    report.record_batch(BATCH)
+    path = str(tmp_path / 'run.jsonl')
+    writer = results.ReportWriter(path, operations, keep_original=True)
+    writer.write(report.results, 0)
+    writer.finish(report)
+    header, failed = results.read_failed(path)
+    assert header['keep_original'] is True
+    assert header['operations'] == 3
+    assert failed == operations[:2]
+    assert report.failed_operations() == operations[:2]
+    assert report.completed == [operations[2]]
+
+
+def test_torn_report_is_still_readable(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    writer = results.ReportWriter(str(path), [engine.Operation('/d/a.txt', '/d/a.md')])
+    log = results.ResultLog()
+    log.extend([(0, (errno.ENOENT, 'FileNotFoundError', 'gone'), 0, 0.1, None)])
+    writer.write(log, 0)
+    writer.finish()
+    with open(path, 'a') as fileobj:
+        fileobj.write('{"t": "result", "i": 1')
+    assert results.read_failed(str(path))[1] == [engine.Operation('/d/a.txt', '/d/a.md')]
+
+
+def test_not_a_report(tmp_path):
+    write(tmp_path / 'other.jsonl', '{"t": "something"}\n')
+    with pytest.raises(results.ReportError):
+        results.read_failed(str(tmp_path / 'other.jsonl'))
+
+
+def test_cli_retries_only_the_failed_operations(tmp_path, monkeypatch):
+    for name in ('a', 'b'):
+        write(tmp_path / f'{name}.txt', name)
+    report_path = str(tmp_path / 'run.jsonl')
+    rename_no_replace = engine.rename_no_replace
+
+    def refuse_a(src, dst, *args, **kwargs):
+        if os.path.basename(src) == 'a.txt':
+            raise PermissionError(errno.EACCES, "denied", src)
+        return rename_no_replace(src, dst, *args, **kwargs)
+
+    monkeypatch.setattr(engine, 'rename_no_replace', refuse_a)
+    assert cli.main([str(tmp_path), '--from', 'txt', '--to', 'md', '--backend', 'serial',
+                     '--report', report_path, '-q']) == 1
+    assert results.read_failed(report_path)[1] == [
+        engine.Operation(str(tmp_path / 'a.txt'), str(tmp_path / 'a.md'))]
+
+    monkeypatch.undo()
+    assert cli.main(['--retry-failed', report_path, '-q']) == 0
+    assert sorted(os.listdir(tmp_path)) == ['a.md', 'b.md', 'run.jsonl']
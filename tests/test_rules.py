@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from extension_changer.rules import Rule, RuleError, RuleSet
+
+
+def name_after(rules, name):
+    target = RuleSet.parse(rules).target(os.path.join('/data', name))
+    return None if target is None else os.path.basename(target)
+
+
+def test_first_literal_rule_wins():
+    assert name_after(['.jpeg=.jpg', '.jpeg=.png'], 'a.jpeg') == 'a.jpg'
+    assert name_after(['.jpeg=.png', '.jpeg=.jpg'], 'a.jpeg') == 'a.png'
+
+
+def test_case_insensitive_rule_only_wins_when_listed_first():
+    assert name_after(['.JPG=.png', 'i:.jpg=.jpg'], 'a.JPG') == 'a.png'
+    assert name_after(['i:.jpg=.jpg', '.JPG=.png'], 'a.JPG') == 'a.jpg'
+    assert name_after(['.JPG=.png'], 'a.jpg') is None
+
+
+def test_first_rule_wins_across_kinds():
+    rules = ['glob:IMG_*=.webp', '.png=.jpg']
+    assert name_after(rules, 'IMG_1.png') == 'IMG_1.webp'
+    assert name_after(rules, 'other.png') == 'other.jpg'
+    assert name_after(list(reversed(rules)), 'IMG_1.png') == 'IMG_1.jpg'
+
+
+def test_regex_rules_with_and_without_backreferences():
+    assert name_after([r're:\.jpe?g$=.jpg', '.jpeg=.png'], 'a.jpeg') == 'a.jpg'
+    assert name_after(['.jpeg=.png', r're:(\.jpe?g)$=\1.bak'], 'a.jpeg') == 'a.png'
+    assert name_after([r're:(\.jpe?g)$=\1.bak'], 'a.jpg') == 'a.jpg.bak'
+
+
+def test_compound_suffix_needs_a_compound_rule():
+    assert name_after(['.gz=.zip'], 'a.tar.gz') is None
+    assert name_after(['.gz=.zip'], 'a.gz') == 'a.zip'
+    assert name_after(['.gz=.zip', '.tar.gz=.tgz'], 'a.tar.gz') == 'a.tgz'
+
+
+def test_unchanged_and_extensionless_names_are_left_alone():
+    assert name_after(['.txt=.txt'], 'a.txt') is None
+    assert name_after(['.txt=.md'], '.txt') is None
+    assert name_after(['.txt=.md'], 'README') is None
+
+
+def test_invalid_rules():
+    with pytest.raises(RuleError):
+        Rule.parse('.txt')
+    with pytest.raises(RuleError):
+        Rule.parse('re:(=.md')
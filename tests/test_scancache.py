@@ -0,0 +1,118 @@
+import os
+import sqlite3
+
+import pytest
+
+from extension_changer import scancache
+
+
+OLD = 1_000_000_000  # a directory time well outside the racy window
+
+
+def write(path, data=b''):
+    with open(path, 'wb') as fileobj:
+        fileobj.write(data)
+
+
+def settle(*directories, offset=0):
+    """Give directories an old modification time, so listings are trusted"""
+    for directory in directories:
+        os.utime(directory, (OLD + offset, OLD + offset))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'root'
+    os.makedirs(root / 'sub')
+    write(root / 'a.txt', b'aa')
+    write(root / 'sub' / 'b.txt', b'b')
+    settle(root, root / 'sub')
+    return root
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with scancache.ScanCache(str(tmp_path / 'cache.sqlite3')) as cache:
+        yield cache
+
+
+def scan(cache, root, **options):
+    return sorted(cache.scan(str(root), recursive=True, **options))
+
+
+def test_unchanged_directories_are_served_from_the_cache(cache, tree):
+    first = scan(cache, tree)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert scan(cache, tree) == first
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert [os.path.basename(entry.path) for entry in first] == ['a.txt', 'b.txt']
+
+
+def test_changed_directory_is_listed_again(cache, tree):
+    scan(cache, tree)
+    write(tree / 'sub' / 'c.txt')
+    settle(tree / 'sub', offset=1)
+    names = [os.path.basename(entry.path) for entry in scan(cache, tree)]
+    assert names == ['a.txt', 'b.txt', 'c.txt']
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_recent_changes_are_not_trusted(cache, tree):
+    os.utime(tree)  # modified just now
+    scan(cache, tree)
+    scan(cache, tree)
+    assert cache.misses == 3
+
+
+def test_invalidate_forgets_a_subtree(cache, tree):
+    scan(cache, tree)
+    cache.invalidate(str(tree / 'sub'))
+    scan(cache, tree)
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.invalidate()
+    assert cache.stats()['directories'] == 0
+
+
+def test_sizes_are_listed_when_first_needed(cache, tree):
+    assert {entry.size for entry in scan(cache, tree)} == {None}
+    sized = scan(cache, tree, with_size=True)
+    assert [entry.size for entry in sized] == [2, 1]
+    assert cache.misses == 4
+    # A sized listing also serves scans without sizes
+    assert {entry.size for entry in scan(cache, tree)} == {None}
+    assert cache.misses == 4
+
+
+def test_removed_subdirectories_are_forgotten(cache, tree):
+    scan(cache, tree)
+    os.remove(tree / 'sub' / 'b.txt')
+    os.rmdir(tree / 'sub')
+    settle(tree, offset=1)
+    assert [os.path.basename(entry.path) for entry in scan(cache, tree)] == ['a.txt']
+    assert cache.stats()['directories'] == 1
+
+
+def test_patterns_apply_to_cached_listings(cache, tree):
+    write(tree / 'c.log')
+    settle(tree, offset=1)
+    scan(cache, tree)
+    entries = scan(cache, tree, include=['*.txt'], exclude=['sub'])
+    assert [os.path.basename(entry.path) for entry in entries] == ['a.txt']
+
+
+def test_eviction_keeps_the_database_under_its_limit(tmp_path, tree):
+    with scancache.ScanCache(str(tmp_path / 'small.sqlite3'), max_bytes=0) as cache:
+        scan(cache, tree)
+        assert cache.stats()['directories'] == 0
+
+
+def test_other_schema_versions_start_over(tmp_path, tree):
+    path = str(tmp_path / 'cache.sqlite3')
+    with scancache.ScanCache(path) as cache:
+        scan(cache, tree)
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA user_version = 999')
+    db.commit()
+    db.close()
+    with scancache.ScanCache(path) as cache:
+        assert cache.stats()['directories'] == 0
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from extension_changer import scanner
+
+
+def write(path, data=b''):
+    with open(path, 'wb') as fileobj:
+        fileobj.write(data)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    write(tmp_path / 'a.txt', b'aaa')
+    write(tmp_path / 'b.log')
+    os.makedirs(tmp_path / 'sub' / 'deep')
+    write(tmp_path / 'sub' / 'c.txt', b'c')
+    write(tmp_path / 'sub' / 'deep' / 'd.txt')
+    os.mkdir(tmp_path / 'skip')
+    write(tmp_path / 'skip' / 'e.txt')
+    return tmp_path
+
+
+def names(entries, root):
+    return sorted(os.path.relpath(entry.path, root) for entry in entries)
+
+
+def test_top_level_only_by_default(tree):
+    assert names(scanner.scan(str(tree)), tree) == ['a.txt', 'b.log']
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_recursive_scan_finds_every_file(tree, threads):
+    entries = list(scanner.scan(str(tree), recursive=True, threads=threads))
+    assert names(entries, tree) == sorted([
+        'a.txt', 'b.log', os.path.join('skip', 'e.txt'), os.path.join('sub', 'c.txt'),
+        os.path.join('sub', 'deep', 'd.txt')])
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_max_depth_and_patterns(tree, threads):
+    entries = scanner.scan(str(tree), recursive=True, max_depth=1, threads=threads,
+                           include=['*.txt'], exclude=['skip'])
+    assert names(entries, tree) == ['a.txt', os.path.join('sub', 'c.txt')]
+
+
+def test_sizes_only_when_asked(tree):
+    assert {entry.size for entry in scanner.scan(str(tree))} == {None}
+    sizes = {os.path.basename(entry.path): entry.size
+             for entry in scanner.scan(str(tree), with_size=True)}
+    assert sizes == {'a.txt': 3, 'b.log': 0}
+
+
+def test_missing_root_raises_and_subdirectory_errors_are_reported(tree, monkeypatch):
+    with pytest.raises(FileNotFoundError):
+        list(scanner.scan(str(tree / 'missing')))
+
+    errors = []
+    scandir = os.scandir
+
+    def failing(path):
+        if os.path.basename(path) == 'sub':
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', failing)
+    entries = scanner.scan(str(tree), recursive=True, onerror=errors.append)
+    assert names(entries, tree) == ['a.txt', 'b.log', os.path.join('skip', 'e.txt')]
+    assert len(errors) == 1
+
+
+def test_scan_batches(tree):
+    batches = list(scanner.scan_batches(str(tree), batch_size=2, recursive=True))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
@@ -0,0 +1,68 @@
+from extension_changer import engine, executors, scheduler
+
+
+def make_operations(count):
+    return [engine.Operation(f'/src/{index}', f'/dst/{index}') for index in range(count)]
+
+
+def take(schedule, count):
+    return [next(schedule) for _ in range(count)]
+
+
+def test_metadata_first_then_large_then_small_longest_first():
+    operations = make_operations(6)
+    operations[4] = engine.Operation('/src/4', None)  # a removal
+    sizes = [5, 500, 50, 300, None, 1]
+    schedule = scheduler.CopySchedule(operations, True, sizes, large_size=100, max_large=2)
+    order = [index for index, _ in take(schedule, 6)]
+    assert order == [4, 1, 3, 2, 0, 5]
+    assert schedule.bytes == 856
+
+
+def test_large_copies_are_capped_while_in_flight():
+    operations = make_operations(4)
+    sizes = [500, 400, 300, 1]
+    schedule = scheduler.CopySchedule(operations, True, sizes, large_size=100, max_large=1)
+    assert next(schedule)[0] == 0
+    # Only small copies may start while the large one runs
+    assert next(schedule)[0] == 3
+    assert next(schedule) is executors.WAIT
+    schedule.finished(3)
+    assert next(schedule) is executors.WAIT
+    schedule.finished(0)
+    assert next(schedule)[0] == 1
+    schedule.finished(1)
+    assert next(schedule)[0] == 2
+    schedule.finished(2)
+    assert list(schedule) == []
+
+
+def test_renames_keep_plan_order():
+    operations = make_operations(3)
+    schedule = scheduler.CopySchedule(operations, False, [10, 1000, 5])
+    assert [index for index, _ in schedule] == [0, 1, 2]
+    assert schedule.bytes == 0
+
+
+def test_unknown_sizes_are_looked_up(tmp_path):
+    small, large = tmp_path / 'small', tmp_path / 'large'
+    small.write_bytes(b'x')
+    large.write_bytes(b'x' * 200)
+    operations = [engine.Operation(str(small), str(small) + '.copy'),
+                  engine.Operation(str(large), str(large) + '.copy'),
+                  engine.Operation(str(tmp_path / 'missing'), str(tmp_path / 'missing.copy'))]
+    schedule = scheduler.CopySchedule(operations, True, large_size=100)
+    assert schedule.bytes == 201
+    assert [index for index, _ in schedule] == [1, 0, 2]
+
+
+def test_execute_plan_copies_through_the_schedule(tmp_path):
+    operations = []
+    for index, size in enumerate([3000, 2000, 10, 20, 1000]):
+        path = tmp_path / f'{index}.bin'
+        path.write_bytes(b'x' * size)
+        operations.append(engine.Operation(str(path), str(tmp_path / f'{index}.copy')))
+    report = engine.execute_plan(operations, keep_original=True, backend='thread', workers=3,
+                                 max_large_copies=1)
+    assert report.success_count == 5
+    assert report.bytes_copied == 6030
@@ -0,0 +1,120 @@
+import pytest
+
+from extension_changer import scancache, sniffer
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 8
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 8
+ZIP = b'PK\x03\x04' + b'\x00' * 8
+
+
+def write(path, data):
+    with open(path, 'wb') as fileobj:
+        fileobj.write(data)
+
+
+@pytest.mark.parametrize('header, extension', [
+    (PNG, '.png'),
+    (JPEG, '.jpg'),
+    (b'GIF89a', '.gif'),
+    (b'%PDF-1.7', '.pdf'),
+    (ZIP, '.zip'),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', '.webp'),
+    (b'RIFF\x00\x00\x00\x00WAVEfmt ', '.wav'),
+    (b'\x00\x00\x00\x18ftypisom', '.mp4'),
+    (b'\x00\x00\x00\x14ftypqt  ', '.mov'),
+    (b'\x00\x00\x00\x18ftypheic', '.heic'),
+    (b'SQLite format 3\x00', '.sqlite'),
+    (b'plain text', None),
+    (b'', None),
+])
+def test_detect_header(header, extension):
+    assert sniffer.detect_header(header) == extension
+
+
+@pytest.mark.parametrize('extension, detected, expected', [
+    ('.jpg', '.jpg', True),
+    ('.JPEG', '.jpg', True),
+    ('.docx', '.zip', True),
+    ('.mov', '.mp4', True),
+    ('.png', '.jpg', False),
+    ('.txt', '.zip', False),
+])
+def test_accepts_aliases(extension, detected, expected):
+    assert sniffer.accepts(extension, detected) is expected
+
+
+def test_plan_detected_renames_mismatches_only(tmp_path):
+    write(tmp_path / 'photo.jpg', PNG)
+    write(tmp_path / 'photo2.jpeg', JPEG)
+    write(tmp_path / 'notes.txt', b'hello')
+    write(tmp_path / 'report.docx', ZIP)
+    paths = [str(tmp_path / name)
+             for name in ('photo.jpg', 'photo2.jpeg', 'notes.txt', 'report.docx')]
+    detected = sniffer.detect_types(paths, backend='serial')
+    assert detected == ['.png', '.jpg', None, '.zip']
+    operations = sniffer.plan_detected(paths, detected)
+    assert [(op.src, op.dst) for op in operations] == [
+        (str(tmp_path / 'photo.jpg'), str(tmp_path / 'photo.png'))]
+
+
+def test_unreadable_files_give_none(tmp_path):
+    assert sniffer.detect_types([str(tmp_path / 'missing.jpg')], backend='serial') == [None]
+
+
+@pytest.mark.parametrize('backend', ['serial', 'thread'])
+def test_cached_types_skip_header_reads(tmp_path, monkeypatch, backend):
+    paths = []
+    for number in range(5):
+        path = tmp_path / f'{number}.jpg'
+        write(path, PNG)
+        paths.append(str(path))
+    cache = sniffer.SniffCache()
+    assert sniffer.detect_types(paths[:3], backend=backend, cache=cache) == ['.png'] * 3
+    assert len(cache) == 3
+
+    read = []
+    read_header = sniffer.read_header
+
+    def counting_read_header(path, *args):
+        read.append(path)
+        return read_header(path, *args)
+
+    monkeypatch.setattr(sniffer, 'read_header', counting_read_header)
+    assert sniffer.detect_types(paths, backend=backend, cache=cache) == ['.png'] * 5
+    assert sorted(read) == paths[3:]
+
+    # A rewritten file is read again
+    read.clear()
+    write(tmp_path / '0.jpg', JPEG + b'longer')
+    assert sniffer.detect_types(paths, backend=backend, cache=cache)[0] == '.jpg'
+    assert read == [paths[0]]
+
+
+def test_sniff_cache_drops_oldest_entries():
+    cache = sniffer.SniffCache(max_entries=2)
+    cache.put(1, '.png')
+    cache.put(2, None)
+    cache.put(3, '.jpg')
+    assert cache.get(1) is cache.MISSING
+    assert cache.get(2) is None
+    assert cache.get(3) == '.jpg'
+
+
+def test_stored_sniff_cache_survives_reopening(tmp_path):
+    write(tmp_path / 'photo.jpg', PNG)
+    paths = [str(tmp_path / 'photo.jpg')]
+    database = str(tmp_path / 'cache.sqlite3')
+    with scancache.ScanCache(database) as cache:
+        stored = cache.sniff_cache()
+        assert len(stored) == 0
+        assert sniffer.detect_types(paths, backend='serial', cache=stored) == ['.png']
+
+    with scancache.ScanCache(database) as cache:
+        stored = cache.sniff_cache()
+        assert len(stored) == 1
+        key = sniffer.cache_key((tmp_path / 'photo.jpg').stat())
+        assert stored.get(key) == '.png'
+        assert stored.get((0, 0, 0, 0)) is stored.MISSING
+        cache.invalidate()
+        assert len(stored) == 0
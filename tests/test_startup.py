@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+@pytest.mark.parametrize('module', ['extension_changer.__main__', 'extension_changer.cli'])
+def test_entry_points_import_nothing_heavy(module):
+    # A fresh interpreter, so modules loaded by other tests do not count
+    code = (f"import sys; sys.path.insert(0, {SRC!r}); import {module}; "
+            "print(' '.join(name for name in ('PySide6', 'ctypes', 'sqlite3') "
+            "if name in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True).stdout
+    assert output.split() == []
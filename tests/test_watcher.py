@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from extension_changer import cli, planner, watcher
+
+
+def write(path, text=''):
+    with open(path, 'w') as fileobj:
+        fileobj.write(text)
+
+
+def make_watcher(tmp_path, **options):
+    return watcher.FolderWatcher(str(tmp_path), {'.txt': '.md'}, poll=True,
+                                 settle=0.0, backend='serial', **options)
+
+
+def test_target_ignores_partial_and_hidden_files(tmp_path):
+    folder_watcher = make_watcher(tmp_path)
+    assert folder_watcher.target(str(tmp_path / 'a.txt')) == str(tmp_path / 'a.md')
+    assert folder_watcher.target(str(tmp_path / 'a.txt.partial')) is None
+    assert folder_watcher.target(str(tmp_path / '.a.txt')) is None
+    assert folder_watcher.target(str(tmp_path / 'a.png')) is None
+
+
+def test_polling_source_reports_new_entries(tmp_path):
+    write(tmp_path / 'old.txt')
+    source = watcher.PollingSource(str(tmp_path), recursive=True, interval=0.0)
+    assert source.start() == [str(tmp_path / 'old.txt')]
+    write(tmp_path / 'new.txt')
+    os.mkdir(tmp_path / 'sub')
+    # Make the change visible even on file systems with coarse timestamps
+    os.utime(tmp_path, ns=(0, 0))
+    events = source.read(0.0)
+    assert sorted(events) == [watcher.WatchEvent(str(tmp_path / 'new.txt'), False),
+                              watcher.WatchEvent(str(tmp_path / 'sub'), True)]
+    assert source.read(0.0) == []
+
+
+def test_convert_renames_settled_files(tmp_path):
+    write(tmp_path / 'a.txt', 'a')
+    batches = []
+    folder_watcher = make_watcher(tmp_path, on_batch=lambda plan, report: batches.append(report))
+    report = folder_watcher.convert([str(tmp_path / 'a.txt')])
+    assert report.success_count == 1
+    assert batches == [report]
+    assert (tmp_path / 'a.md').read_text() == 'a'
+
+
+def test_conflicts_are_requeued_and_left_out_of_the_report(tmp_path, monkeypatch):
+    write(tmp_path / 'a.txt', 'a')
+    write(tmp_path / 'b.txt', 'b')
+    build_plan = planner.build_plan
+
+    def build_then_race(*args, **kwargs):
+        plan = build_plan(*args, **kwargs)
+        # The target appears after planning, before the rename
+        write(tmp_path / 'a.md', 'other')
+        return plan
+
+    monkeypatch.setattr(planner, 'build_plan', build_then_race)
+    folder_watcher = make_watcher(tmp_path)
+    plan_reports = []
+    folder_watcher.on_batch = lambda plan, report: plan_reports.append((plan, report))
+    report = folder_watcher.convert([str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt')])
+
+    assert (tmp_path / 'a.md').read_text() == 'other'
+    assert (tmp_path / 'a.txt').exists()
+    assert report.total_count == 1
+    assert report.success_count == 1
+    assert report.failures == []
+    assert len(report.results) == 1
+    assert report.results.errors == {}
+    assert report.metrics.files == 1
+    assert report.metrics.failed == 0
+    assert report.metrics.errors == []
+    assert report.summary().startswith("Completed - 1/1 files")
+    plan = plan_reports[0][0]
+    assert plan.statuses[0] == planner.STATUS_SKIP_EXISTS
+    assert list(folder_watcher._pending) == [str(tmp_path / 'a.txt')]
+
+
+@pytest.mark.parametrize('option', [['--journal', 'job.journal'], ['--report', 'run.jsonl'],
+                                    ['--scan-cache']])
+def test_watch_rejects_one_shot_options(tmp_path, capsys, option):
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main([str(tmp_path), '--from', 'txt', '--to', 'md', '--watch'] + option)
+    assert exc_info.value.code == 2
+    assert f"--watch cannot be combined with {option[0]}" in capsys.readouterr().err